@@ -0,0 +1,137 @@
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import get_db
+from app.repositories.analytics import AnalyticsRepository
+from app.schemas.analytics import (
+    AnalyticsBatchError,
+    AnalyticsBatchResult,
+    AnalyticsEventBatchItem,
+    AnalyticsEventCreate,
+)
+
+router = APIRouter()
+
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """The request body, rejected with 413 as soon as it exceeds ``limit`` bytes"""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Batch too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def decode_body(body: bytes, content_encoding: Optional[str], limit: int) -> bytes:
+    """Undo a gzip Content-Encoding, stopping at ``limit`` decompressed bytes"""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding != "gzip":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported Content-Encoding '{encoding}', use gzip or none",
+        )
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, limit + 1)
+    except zlib.error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid gzip")
+    if len(data) > limit:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Batch too large")
+    if not decompressor.eof:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Truncated gzip body")
+    return data
+
+
+def describe_errors(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+    )
+
+
+def parse_events(
+    data: bytes, max_events: int, now: datetime
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[AnalyticsBatchError]]:
+    """
+    Validate every NDJSON line in one pass. Returns the rows to insert with
+    their line numbers and the errors of the rejected lines. Blank lines
+    are skipped.
+    """
+    events: List[Tuple[int, Dict[str, Any]]] = []
+    errors: List[AnalyticsBatchError] = []
+    for number, line in enumerate(data.splitlines(), start=1):
+        if not line.strip():
+            continue
+        if len(events) + len(errors) >= max_events:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"More than {max_events} events in one batch",
+            )
+        try:
+            item = AnalyticsEventBatchItem.parse_raw(line)
+        except ValidationError as exc:
+            errors.append(AnalyticsBatchError(line=number, error=describe_errors(exc)))
+            continue
+        timestamp = item.timestamp or now
+        if timestamp.tzinfo is not None:
+            # Stored as naive UTC, like datetime.utcnow()
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        events.append((number, {
+            "event_type": item.event_type,
+            "user_id": item.user_id,
+            "event_data": item.event_data,
+            "timestamp": timestamp,
+        }))
+    return events, errors
+
+
+def ingest_events(db: Session, body: bytes, content_encoding: Optional[str]) -> AnalyticsBatchResult:
+    data = decode_body(body, content_encoding, settings.ANALYTICS_BATCH_MAX_BYTES)
+    events, errors = parse_events(data, settings.ANALYTICS_BATCH_MAX_EVENTS, datetime.utcnow())
+
+    # Unknown users would fail the whole insert on the foreign key
+    user_ids = {event["user_id"] for _, event in events if event["user_id"] is not None}
+    known = AnalyticsRepository.existing_user_ids(db, user_ids)
+    rows = []
+    for number, event in events:
+        if event["user_id"] is not None and event["user_id"] not in known:
+            errors.append(AnalyticsBatchError(line=number, error=f"user_id: unknown user {event['user_id']}"))
+        else:
+            rows.append(event)
+
+    accepted = AnalyticsRepository.create_events(db, events=rows)
+    errors.sort(key=lambda error: error.line)
+    return AnalyticsBatchResult(accepted=accepted, rejected=len(errors), errors=errors)
+
+
+@router.post("/events:batch", response_model=AnalyticsBatchResult)
+async def ingest_event_batch(request: Request, db: Session = Depends(get_db)) -> AnalyticsBatchResult:
+    """
+    Record a batch of analytics events sent as NDJSON, one AnalyticsEventCreate
+    object per line with an optional timestamp, plain or with
+    ``Content-Encoding: gzip``. Valid lines are inserted in one transaction;
+    invalid ones are reported by line number without failing the batch.
+    """
+    body = await read_body(request, settings.ANALYTICS_BATCH_MAX_BYTES)
+    # Decompressing and parsing thousands of lines would hold up the event loop
+    return await run_in_threadpool(ingest_events, db, body, request.headers.get("content-encoding"))
+
+
+@router.post("/events", status_code=status.HTTP_202_ACCEPTED)
+def record_event(event_in: AnalyticsEventCreate) -> None:
+    """
+    Record one analytics event through the write-behind buffer. The event is
+    inserted with others in the next flush; a full buffer answers 429.
+    """
+    AnalyticsRepository.queue_event(obj_in=event_in)
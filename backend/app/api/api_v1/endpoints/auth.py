@@ -1,49 +1,55 @@
 from datetime import timedelta
-from typing import Any
+from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db_session, get_current_user
-from app.core.auth import create_access_token, verify_password
+from app.api.deps import get_current_user
+from app.core.auth import create_access_token
 from app.core.config import settings
+from app.core.login_guard import login_guard
+from app.core.revocation import expires_at_from_claims, revocation_list
+from app.db.session import get_db
+from app.middleware.rate_limit_policies import client_ip
+from app.repositories.token import RevokedTokenRepository
+from app.repositories.user import UserRepository
 from app.schemas.auth import TokenResponse, User, LoginRequest
 
 router = APIRouter()
 
 
-@router.post("/login", response_model=TokenResponse)
-async def login_access_token(
-    db: Session = Depends(get_db_session),
-    form_data: OAuth2PasswordRequestForm = Depends()
-) -> Any:
+async def _login(
+    request: Request, db: Session, email: str, password: str, headers: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
     """
-    OAuth2 compatible token login, get an access token for future requests.
-    This endpoint follows the OAuth2 specification.
+    Authenticate against the users table and issue an access token.
+    UserRepository.authenticate rehashes passwords stored with another cost
+    than BCRYPT_ROUNDS; it runs in the threadpool since it commits on the
+    sync session, and verifies through the bounded password hashing pool.
     """
-    # In a real application, you would authenticate against your database
-    # For now, we'll just use a hardcoded test user
-    
-    # Mock authentication - replace with actual DB authentication
-    if form_data.username != "testuser" or not verify_password(form_data.password, "$2b$12$6HbRlKZQFqRYKQX6NOUKvepN0w0Y3gXBw32nNqXnNkcfnO5Q8r34q"):
+    # Locked out usernames and IPs are rejected before bcrypt runs
+    ip = client_ip(request)
+    await login_guard.check(email, ip)
+
+    user = await run_in_threadpool(UserRepository.authenticate, db, email=email, password=password)
+    if user is None:
+        await login_guard.failure(email, ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
+            headers=headers,
         )
-    
+    await login_guard.success(email, ip)
+
     # Create access token with a specified expiry time
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    # Get user ID (in a real app, this would come from your user database)
-    user_id = "1"  # Mock user ID
-    
-    # Create the JWT token
+    user_id = str(user.id)
     access_token = create_access_token(
         subject=user_id, expires_delta=access_token_expires
     )
-    
+
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -52,41 +58,33 @@ async def login_access_token(
     }
 
 
+@router.post("/login", response_model=TokenResponse)
+async def login_access_token(
+    request: Request,
+    db: Session = Depends(get_db),
+    form_data: OAuth2PasswordRequestForm = Depends()
+) -> Any:
+    """
+    OAuth2 compatible token login, get an access token for future requests.
+    This endpoint follows the OAuth2 specification; users sign in with their
+    email address as the username.
+    """
+    return await _login(
+        request, db, form_data.username, form_data.password,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 @router.post("/login/json", response_model=TokenResponse)
 async def login_json(
+    request: Request,
     login_request: LoginRequest,
-    db: Session = Depends(get_db_session)
+    db: Session = Depends(get_db)
 ) -> Any:
     """
     JSON login endpoint, alternative to the OAuth2 flow.
     """
-    # In a real application, you would authenticate against your database
-    # This is similar to the OAuth endpoint but accepts JSON instead of form data
-    
-    # Mock authentication - replace with actual DB authentication
-    if login_request.username != "testuser" or not verify_password(login_request.password, "$2b$12$6HbRlKQFqRYKQX6NOUKvepN0w0Y3gXBw32nNqXnNkcfnO5Q8r34q"):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-        )
-    
-    # Create access token with a specified expiry time
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    # Get user ID (in a real app, this would come from your user database)
-    user_id = "1"  # Mock user ID
-    
-    # Create the JWT token
-    access_token = create_access_token(
-        subject=user_id, expires_delta=access_token_expires
-    )
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,  # in seconds
-        "user_id": user_id
-    }
+    return await _login(request, db, login_request.username, login_request.password)
 
 
 @router.get("/me", response_model=User)
@@ -94,11 +92,35 @@ async def read_users_me(current_user: dict = Depends(get_current_user)) -> Any:
     """
     Get current user information.
     """
-    # Convert dict to User object
-    # In a real application, you would return the actual user from the database
+    # Users sign in with their email address
     return User(
-        id=int(current_user["id"]),
-        email="test@example.com",
-        username=current_user["username"],
-        is_active=True
+        id=current_user["id"],
+        email=current_user["email"],
+        username=current_user["email"],
+        is_active=current_user["is_active"]
+    )
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> None:
+    """
+    Revoke the presented access token until it expires.
+    Other workers reject it after their next revocation refresh.
+    A plain def, so the commit on the sync session runs in the threadpool.
+    """
+    # Decoded and verified by get_current_user
+    claims = request.state.token_claims
+    if "jti" not in claims:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token cannot be revoked",
+        )
+    expires_at = expires_at_from_claims(claims)
+    RevokedTokenRepository.revoke(
+        db, jti=claims["jti"], expires_at=expires_at, user_id=current_user["id"]
     )
+    revocation_list.add(claims["jti"], float(claims["exp"]))
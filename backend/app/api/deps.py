@@ -1,11 +1,17 @@
-from typing import Generator, Optional, Dict, Any
+from contextlib import contextmanager
+from typing import Generator, Iterator, Optional, Dict, Any
 
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
 from app.core.config import settings
-from app.core.auth import get_current_user as auth_get_current_user
+from app.core.auth import decode_access_token, oauth2_scheme
+from app.core.principal_cache import principal_cache, user_snapshot
+from app.core.revocation import revocation_list
+from app.repositories.user import UserRepository
 
 # Database dependency - will be used in routes that need database access
 def get_db_session() -> Generator[Session, None, None]:
@@ -15,16 +21,61 @@ def get_db_session() -> Generator[Session, None, None]:
     """
     return get_db()
 
+@contextmanager
+def _db_session(request: Request) -> Iterator[Session]:
+    """Open a session through get_db, honouring dependency overrides"""
+    sessions = request.app.dependency_overrides.get(get_db, get_db)()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+
+
+def _load_principal(request: Request, user_id: int) -> Optional[Dict[str, Any]]:
+    with _db_session(request) as db:
+        user = UserRepository.get(db, user_id=user_id)
+        return user_snapshot(user) if user is not None else None
+
+
 # Security dependencies for protected routes
-async def get_current_user(db: Session = Depends(get_db_session)) -> Dict[str, Any]:
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     """
     Get the current authenticated user using JWT.
+    Returns a snapshot (id, email, is_active, is_superuser, role) from the
+    principal cache; a database session is only opened on a cache miss.
+    Revoked tokens are rejected, see app.core.revocation. The verified
+    claims are kept on ``request.state.token_claims``.
     """
-    # Use the core auth function
-    current_user = await auth_get_current_user()
-    
-    # In a real app, you might want to verify the user exists in the database
-    # and fetch the complete user object
+    # Resolved once per request, however many dependencies ask for it
+    current_user = getattr(request.state, "user", None)
+    if current_user is not None:
+        return current_user
+
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        claims = decode_access_token(token)
+        user_id = int(claims["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise credentials_exception
+
+    # Tokens issued before revocation support carry no jti
+    jti = claims.get("jti")
+    if jti is not None and await revocation_list.is_revoked(jti, lambda: _db_session(request)):
+        raise credentials_exception
+
+    current_user = principal_cache.get(user_id)
+    if current_user is None:
+        current_user = await run_in_threadpool(_load_principal, request, user_id)
+        if current_user is None:
+            raise credentials_exception
+        principal_cache.set(user_id, current_user)
+
+    request.state.user = current_user
+    request.state.token_claims = claims
     return current_user
 
 # Role-based dependencies
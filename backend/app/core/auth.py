@@ -1,18 +1,26 @@
-from datetime import datetime, timedelta
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Dict, Any
 
-from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import jwt
 from pydantic import BaseModel
 
 from app.core.config import settings
+from app.core.token_cache import VerifiedTokenCache
+from app.core.security import (  # noqa: F401 - re-exported for existing imports
+    create_access_token,
+    get_password_hash,
+    get_password_hash_async,
+    pwd_context,
+    verify_password,
+    verify_password_async,
+)
 
 # Security utility classes
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+# Claims of recently verified tokens, see decode_access_token
+token_cache = VerifiedTokenCache(max_entries=settings.JWT_CACHE_SIZE)
+
 
 class Token(BaseModel):
     """Schema for token response."""
@@ -27,58 +35,14 @@ class TokenPayload(BaseModel):
 
 
 # Authentication functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a plain password against a hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """Generate a hash for a password."""
-    return pwd_context.hash(password)
-
-
-def create_access_token(
-    subject: Union[str, Any], expires_delta: Optional[timedelta] = None
-) -> str:
-    """Create a JWT access token."""
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(
-            minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
-        )
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
-
-
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+def decode_access_token(token: str) -> Dict[str, Any]:
     """
-    Get the current user from the JWT token.
-    This is a placeholder - in a real application, you would fetch the user from the database.
+    Verify a JWT and return its claims, raising JWTError if it is invalid.
+    Claims of valid tokens are cached until the token expires.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        token_payload = TokenPayload(**payload)
-        if datetime.fromtimestamp(token_payload.exp) < datetime.utcnow():
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    # In a real application, you would fetch the user from the database
-    # For now, we'll just return a mock user based on the user_id
-    user = {"id": user_id, "username": "testuser", "email": "test@example.com"}
-    
-    if user is None:
-        raise credentials_exception
-    return user
+    claims = token_cache.get(token, settings.SECRET_KEY, settings.ALGORITHM)
+    if claims is None:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        token_cache.set(token, claims, settings.SECRET_KEY, settings.ALGORITHM)
+    return claims
+
@@ -0,0 +1,24 @@
+"""
+Cache invalidation for data-layer write paths.
+
+Repositories call invalidate_cache_tags after a write without depending on
+the HTTP response cache. The response cache registers itself as the
+invalidator when it is created; until then invalidations are no-ops.
+"""
+from typing import Callable, Optional
+
+Invalidator = Callable[..., None]
+
+_invalidator: Optional[Invalidator] = None
+
+
+def set_cache_invalidator(invalidator: Optional[Invalidator]) -> None:
+    """Route invalidate_cache_tags to ``invalidator``, or nowhere with None"""
+    global _invalidator
+    _invalidator = invalidator
+
+
+def invalidate_cache_tags(*tags: str) -> None:
+    """Invalidate cached responses tagged with any of the tags, e.g. "user:42"."""
+    if _invalidator is not None:
+        _invalidator(*tags)
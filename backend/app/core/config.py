@@ -24,6 +24,33 @@ class Settings(BaseSettings):
     DB_NAME: str = os.getenv("DB_NAME", "pravis_collection_raw_data")
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
+    # Connection pool per worker: pool_size kept open, up to max_overflow more
+    # under load; checkouts fail after DB_POOL_TIMEOUT seconds waiting
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Seconds before a connection is replaced, below server or proxy idle timeouts
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Server-side limit per statement in milliseconds (PostgreSQL), 0 disables it
+    DB_STATEMENT_TIMEOUT: int = int(os.getenv("DB_STATEMENT_TIMEOUT", "30000"))
+    # PREPARE hot point lookups once per connection (PostgreSQL with psycopg2).
+    # Not behind PgBouncer in transaction mode.
+    DB_PREPARED_STATEMENTS: bool = os.getenv("DB_PREPARED_STATEMENTS", "false").lower() == "true"
+    # Statements slower than this (ms) are written to the app.db.slow_queries
+    # logger, with their EXPLAIN plan if DB_SLOW_QUERY_EXPLAIN; 0 disables
+    DB_SLOW_QUERY_MS: float = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+    DB_SLOW_QUERY_EXPLAIN: bool = os.getenv("DB_SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    # Runs of one statement shape within a request logged as a suspected N+1; 0 disables
+    DB_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "10"))
+    # Read replicas for get_read_db as a JSON list in the env, e.g.
+    # [{"url": "postgresql://...", "weight": 2, "name": "replica-a"}]. Replicas
+    # more than DB_REPLICA_MAX_LAG seconds behind are skipped until they catch up.
+    DB_REPLICAS: List[Dict[str, Any]] = []
+    DB_REPLICA_MAX_LAG: float = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+    DB_REPLICA_CHECK_INTERVAL: float = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+    # Seconds a client reads from the primary after it wrote (read-your-writes)
+    DB_READ_YOUR_WRITES_WINDOW: float = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
     
     # If DATABASE_URL is not provided, construct it
     @property
@@ -36,11 +63,128 @@ class Settings(BaseSettings):
     AZURE_STORAGE_CONNECTION_STRING: Optional[str] = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
     AZURE_STORAGE_CONTAINER_NAME: str = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "backups")
     
+    # Redis Configuration
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+    # Rate Limiting
+    # "memory" keeps limits per worker, "redis" shares them through REDIS_URL
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_STORE_TIMEOUT: float = float(os.getenv("RATE_LIMIT_STORE_TIMEOUT", "0.05"))
+    # Default policy for paths without a more specific rule
+    RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+    RATE_LIMIT_DEFAULT_KEY: str = os.getenv("RATE_LIMIT_DEFAULT_KEY", "api_key")
+    # Route prefix policies: limit per period (0 disables limiting), burst and
+    # key ("ip", "api_key" or "jwt_sub"). Override with a JSON list in the env.
+    RATE_LIMIT_POLICIES: List[Dict[str, Any]] = [
+        {"prefix": "/api/v1/health", "limit": 0},
+        {"prefix": "/docs", "limit": 0},
+        {"prefix": "/redoc", "limit": 0},
+        {"prefix": "/openapi.json", "limit": 0},
+        {"prefix": "/api/v1/openapi.json", "limit": 0},
+        {"prefix": "/metrics", "limit": 0},
+        {"prefix": "/api/v1/auth/login", "limit": 10, "burst": 5, "key": "ip"},
+    ]
+    # Failed logins allowed per window before the account or source IP is
+    # locked out, for LOGIN_BACKOFF seconds doubling per further failure
+    LOGIN_MAX_FAILURES_PER_USER: int = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+    LOGIN_MAX_FAILURES_PER_IP: int = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+    LOGIN_FAILURE_WINDOW: int = int(os.getenv("LOGIN_FAILURE_WINDOW", "900"))
+    LOGIN_BACKOFF: float = float(os.getenv("LOGIN_BACKOFF", "1"))
+    LOGIN_MAX_BACKOFF: float = float(os.getenv("LOGIN_MAX_BACKOFF", "900"))
+    
+    # Response Cache
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    # "memory" keeps responses per worker, "redis" adds a tier shared through REDIS_URL
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_STORE_TIMEOUT: float = float(os.getenv("CACHE_STORE_TIMEOUT", "0.05"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    # Larger responses are streamed through without being buffered or cached
+    CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("CACHE_MAX_ENTRY_BYTES", str(100 * 1024)))
+    # Defaults for GET responses that do not send max-age themselves
+    CACHE_DEFAULT_TTL: int = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+    CACHE_STALE_WHILE_REVALIDATE: int = int(os.getenv("CACHE_STALE_WHILE_REVALIDATE", "30"))
+    # Seconds concurrent misses wait for the request already filling their key
+    CACHE_COALESCE_TIMEOUT: float = float(os.getenv("CACHE_COALESCE_TIMEOUT", "10"))
+    # Route prefix rules: ttl, stale_while_revalidate and bypass. Override with
+    # a JSON list in the env.
+    CACHE_RULES: List[Dict[str, Any]] = [
+        {"prefix": "/api/v1/health", "bypass": True},
+        {"prefix": "/api/v1/auth", "bypass": True},
+        {"prefix": "/metrics", "bypass": True},
+    ]
+    
+    # Logging: "text" or "json" (one object per line with request fields)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    # Records queued for the writer thread beyond this are dropped and counted
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    
+    # Metrics (set PROMETHEUS_MULTIPROC_DIR to aggregate across workers)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    
+    # Tail-based sampling of request logs and telemetry. Errors, 429s and
+    # requests above the route's latency percentile are always kept.
+    SAMPLING_RATE: float = float(os.getenv("SAMPLING_RATE", "1.0"))
+    SAMPLING_LATENCY_PERCENTILE: float = float(os.getenv("SAMPLING_LATENCY_PERCENTILE", "99"))
+    # Per-route prefix overrides of the rate, e.g. {"prefix": "/api/v1/health", "rate": 0.01}.
+    # Override with a JSON list in the env.
+    SAMPLING_RULES: List[Dict[str, Any]] = []
+    
+    # Analytics ingestion: events and decompressed bytes per NDJSON batch
+    ANALYTICS_BATCH_MAX_EVENTS: int = int(os.getenv("ANALYTICS_BATCH_MAX_EVENTS", "5000"))
+    ANALYTICS_BATCH_MAX_BYTES: int = int(os.getenv("ANALYTICS_BATCH_MAX_BYTES", str(10 * 1024 * 1024)))
+    
+    # Write-behind buffer for analytics events, voice interactions and user
+    # sessions: flushed every WRITE_BEHIND_FLUSH_INTERVAL_MS or as soon as
+    # WRITE_BEHIND_FLUSH_ROWS rows wait, writes rejected with 429 beyond
+    # WRITE_BEHIND_MAX_ROWS. Accepted rows are journaled to WRITE_BEHIND_SPILL_DIR
+    # and replayed at startup after a crash; empty keeps them in memory only.
+    WRITE_BEHIND_MAX_ROWS: int = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "10000"))
+    WRITE_BEHIND_FLUSH_ROWS: int = int(os.getenv("WRITE_BEHIND_FLUSH_ROWS", "500"))
+    WRITE_BEHIND_FLUSH_INTERVAL_MS: int = int(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "200"))
+    WRITE_BEHIND_SPILL_DIR: str = os.getenv("WRITE_BEHIND_SPILL_DIR", "")
+    # Failed flushes are retried after WRITE_BEHIND_RETRY_BACKOFF_MS, doubling per
+    # consecutive failure; after WRITE_BEHIND_MAX_RETRIES failures in a row, rows
+    # without a spill file are dropped
+    WRITE_BEHIND_MAX_RETRIES: int = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+    WRITE_BEHIND_RETRY_BACKOFF_MS: int = int(os.getenv("WRITE_BEHIND_RETRY_BACKOFF_MS", "500"))
+    
+    # Telemetry Export
+    # Records queued beyond this are dropped, oldest first
+    TELEMETRY_QUEUE_SIZE: int = int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000"))
+    TELEMETRY_BATCH_RECORDS: int = int(os.getenv("TELEMETRY_BATCH_RECORDS", "500"))
+    TELEMETRY_BATCH_BYTES: int = int(os.getenv("TELEMETRY_BATCH_BYTES", str(1024 * 1024)))
+    # Seconds between flushes of a queue that has not filled a batch
+    TELEMETRY_FLUSH_INTERVAL: float = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))
+    # Retries for batches the endpoint did not accept, backoff doubles per attempt
+    TELEMETRY_MAX_RETRIES: int = int(os.getenv("TELEMETRY_MAX_RETRIES", "3"))
+    TELEMETRY_RETRY_BACKOFF: float = float(os.getenv("TELEMETRY_RETRY_BACKOFF", "0.5"))
+    
     # Authentication Settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "devsecretkey")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Verified token claims kept in memory until the token expires
+    JWT_CACHE_SIZE: int = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+    # Seconds a resolved user is trusted before it is read again; changes made
+    # through UserRepository in this worker take effect immediately
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    # Revoked token IDs are mirrored in a Bloom filter sized for this many
+    # entries; at 0.1% about 1 in 1000 valid tokens costs a database lookup
+    REVOCATION_CAPACITY: int = int(os.getenv("REVOCATION_CAPACITY", "1000000"))
+    REVOCATION_ERROR_RATE: float = float(os.getenv("REVOCATION_ERROR_RATE", "0.001"))
+    # Seconds between incremental loads and full rebuilds of the mirror
+    REVOCATION_REFRESH_INTERVAL: float = float(os.getenv("REVOCATION_REFRESH_INTERVAL", "5"))
+    REVOCATION_REBUILD_INTERVAL: float = float(os.getenv("REVOCATION_REBUILD_INTERVAL", "900"))
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
+    # bcrypt runs in this many threads; operations beyond workers + queue get a 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+    # bcrypt cost factor, each step doubles hashing time. Stored hashes with a
+    # different cost are rehashed on the next successful login. Pick a value
+    # with benchmarks/bcrypt_calibration.py
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,284 @@
+"""
+In-process application metrics exposed in Prometheus text format.
+
+Request latency is recorded per route template, method and status class.
+When ``PROMETHEUS_MULTIPROC_DIR`` is set before the workers start, every
+worker writes its values to files in that directory and ``/metrics``
+aggregates them, so any worker can answer a scrape for the whole server.
+"""
+import os
+import time
+from typing import Optional
+
+from fastapi import FastAPI, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.middleware.pipeline import RequestContext, get_request_pipeline
+
+# Buckets in seconds, from sub-millisecond cache hits to slow upstream calls
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter",
+    ["policy"],
+)
+LOGIN_THROTTLED = Counter(
+    "login_throttled_total",
+    "Login attempts rejected before password verification",
+    ["scope"],
+)
+LOGIN_LOCKOUTS = Counter(
+    "login_lockouts_total",
+    "Accounts or source IPs locked after repeated failed logins",
+    ["scope"],
+)
+CACHE_RESPONSES = Counter(
+    "cache_responses_total",
+    "Responses served by the response cache, by X-Cache state",
+    ["state"],
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Database connections checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond pool_size, negative while the pool is not full",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total",
+    "Database connection checkouts",
+    ["pool"],
+)
+DB_POOL_CONNECTIONS = Counter(
+    "db_pool_connections_created_total",
+    "Database connections opened by the pool",
+    ["pool"],
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after pool_timeout because every connection was in use",
+    ["pool"],
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag at the last check, -1 when the check failed",
+    ["replica"],
+    multiprocess_mode="max",
+)
+DB_READ_ROUTES = Counter(
+    "db_read_routes_total",
+    "Read sessions by target engine; reason is replica, sticky (recent write) or lagging (no replica within the lag limit)",
+    ["target", "reason"],
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Statements slower than DB_SLOW_QUERY_MS",
+)
+DB_SUSPECTED_N_PLUS_ONE = Counter(
+    "db_suspected_n_plus_one_total",
+    "Requests running one statement shape at least DB_N_PLUS_ONE_THRESHOLD times",
+    ["route"],
+)
+WRITE_BEHIND_DEPTH = Gauge(
+    "write_behind_rows_buffered",
+    "Rows accepted by the write-behind buffer and not yet written",
+    multiprocess_mode="livesum",
+)
+WRITE_BEHIND_FLUSH_SECONDS = Histogram(
+    "write_behind_flush_seconds",
+    "Time to write one write-behind flush to the database",
+    buckets=LATENCY_BUCKETS,
+)
+WRITE_BEHIND_ROWS = Counter(
+    "write_behind_rows_total",
+    "Write-behind rows by outcome: written, replayed (from a spill file), spilled "
+    "(kept in a spill file after a failed flush), dropped or rejected (buffer full)",
+    ["outcome"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+)
+TELEMETRY_BATCHES = Counter(
+    "telemetry_batches_total",
+    "Telemetry batches by sink and result (exported or failed)",
+    ["sink", "result"],
+)
+TELEMETRY_RECORDS = Counter(
+    "telemetry_records_total",
+    "Telemetry records by sink and result: exported, failed, or dropped because the queue was full",
+    ["sink", "result"],
+)
+TELEMETRY_BYTES = Counter(
+    "telemetry_bytes_total",
+    "Encoded bytes of exported telemetry batches",
+    ["sink"],
+)
+TELEMETRY_RETRIES = Counter(
+    "telemetry_retries_total",
+    "Telemetry batch export attempts retried after a retryable failure",
+    ["sink"],
+)
+TELEMETRY_EXPORT_SECONDS = Histogram(
+    "telemetry_export_seconds",
+    "Time to export one telemetry batch, retries included",
+    ["sink"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time password hashing operations wait for a worker",
+    ["operation"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Password hashing operations running or queued",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTIONS = Counter(
+    "password_hash_rejections_total",
+    "Password hashing operations rejected because the queue was full",
+    ["operation"],
+)
+PASSWORD_REHASHES = Counter(
+    "password_rehashes_total",
+    "Stored password hashes upgraded to the configured cost on login",
+    ["from_cost"],
+)
+JWT_CACHE_REQUESTS = Counter(
+    "jwt_cache_requests_total",
+    "Verified token cache lookups",
+    ["result"],
+)
+PRINCIPAL_CACHE_REQUESTS = Counter(
+    "principal_cache_requests_total",
+    "Authenticated user snapshot cache lookups",
+    ["result"],
+)
+TOKEN_REVOCATION_CHECKS = Counter(
+    "token_revocation_checks_total",
+    "Token revocation checks by how they were answered",
+    ["result"],
+)
+
+
+def record_request_latency(context: RequestContext) -> None:
+    """Request pipeline hook observing the request latency histogram"""
+    REQUEST_LATENCY.labels(
+        context.method,
+        context.route,
+        f"{context.status_code // 100}xx",
+    ).observe(context.duration_ms / 1000)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how often they time out"""
+
+    metrics_name = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            DB_POOL_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+        DB_POOL_OVERFLOW.labels(self.metrics_name).set(self.overflow())
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        # After the pool has closed any connection beyond pool_size
+        DB_POOL_OVERFLOW.labels(self.metrics_name).set(self.overflow())
+
+    def recreate(self) -> "TimedQueuePool":
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for engines created with create_async_engine"""
+
+
+def instrument_engine(engine: Engine, name: str = "primary") -> None:
+    """
+    Track connection pool usage of a SQLAlchemy engine, labelled with ``name``.
+    Wait times, timeouts and overflow are only recorded by TimedQueuePool.
+    """
+    engine.pool.metrics_name = name
+    in_use = DB_POOL_IN_USE.labels(name)
+    checkouts = DB_POOL_CHECKOUTS.labels(name)
+    connections = DB_POOL_CONNECTIONS.labels(name)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        connections.inc()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.inc()
+        in_use.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        in_use.dec()
+
+
+def render_metrics(multiproc_dir: Optional[str] = None) -> bytes:
+    """Render all metrics, aggregated across workers in multiprocess mode."""
+    multiproc_dir = multiproc_dir or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not multiproc_dir:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+    return generate_latest(registry)
+
+
+def setup_metrics(app: FastAPI, path: str = "/metrics") -> None:
+    """Record request latency through the request pipeline and serve the metrics."""
+    get_request_pipeline(app).on_response.append(record_request_latency)
+
+    @app.get(path, include_in_schema=False)
+    def metrics() -> Response:
+        return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Drop this worker's live gauges from the aggregate when it exits
+        app.add_event_handler("shutdown", lambda: multiprocess.mark_process_dead(os.getpid()))
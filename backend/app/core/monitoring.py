@@ -1,17 +1,23 @@
 import os
 import logging
 from typing import Dict, Any, Optional
-import json
 from datetime import datetime
-import requests
-import time
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.telemetry import (
+    AppInsightsSink,
+    LogAnalyticsSink,
+    TelemetrySink,
+    get_telemetry_exporter,
+    shutdown_telemetry_exporter,
+)
+from app.middleware.pipeline import RequestContext, get_request_pipeline
 
 # Configure Azure Application Insights if enabled
 AZURE_APP_INSIGHTS_KEY = os.getenv("AZURE_APP_INSIGHTS_KEY", "")
 AZURE_APP_INSIGHTS_ENABLED = bool(AZURE_APP_INSIGHTS_KEY)
+AZURE_APP_INSIGHTS_ENDPOINT = os.getenv("AZURE_APP_INSIGHTS_ENDPOINT", "https://dc.services.visualstudio.com/v2/track")
 
 # Configure Azure Log Analytics if enabled
 AZURE_LOG_ANALYTICS_WORKSPACE_ID = os.getenv("AZURE_LOG_ANALYTICS_WORKSPACE_ID", "")
@@ -21,102 +27,65 @@ AZURE_LOG_ANALYTICS_ENABLED = bool(AZURE_LOG_ANALYTICS_WORKSPACE_ID and AZURE_LO
 # Configure logger
 logger = logging.getLogger("app.monitoring")
 
+def build_telemetry_sinks() -> Dict[str, TelemetrySink]:
+    """Create exporter sinks for the enabled Azure services"""
+    sinks: Dict[str, TelemetrySink] = {}
+    if AZURE_APP_INSIGHTS_ENABLED:
+        sinks["app_insights"] = AppInsightsSink(AZURE_APP_INSIGHTS_ENDPOINT)
+    if AZURE_LOG_ANALYTICS_ENABLED:
+        sinks["log_analytics"] = LogAnalyticsSink(
+            AZURE_LOG_ANALYTICS_WORKSPACE_ID, AZURE_LOG_ANALYTICS_SHARED_KEY
+        )
+    return sinks
+
+
 class AzureMonitoring:
     """Azure monitoring integration for Application Insights and Log Analytics"""
     
     @staticmethod
     def send_to_app_insights(event_name: str, properties: Dict[str, Any]):
-        """Send telemetry data to Azure Application Insights"""
+        """Queue telemetry data for Azure Application Insights"""
         if not AZURE_APP_INSIGHTS_ENABLED:
             return
         
-        try:
-            # App Insights REST API endpoint
-            url = f"https://dc.services.visualstudio.com/v2/track"
-            
-            # Prepare the telemetry data
-            telemetry_data = {
-                "name": event_name,
-                "time": datetime.utcnow().isoformat() + "Z",
-                "iKey": AZURE_APP_INSIGHTS_KEY,
-                "tags": {
-                    "ai.cloud.role": "pravis-boutique-api",
-                    "ai.cloud.roleInstance": os.getenv("HOSTNAME", "local"),
-                    "ai.application.ver": "1.0.0"
-                },
-                "data": {
-                    "baseType": "EventData",
-                    "baseData": {
-                        "ver": 2,
-                        "name": event_name,
-                        "properties": properties
-                    }
+        # Prepare the telemetry data
+        telemetry_data = {
+            "name": event_name,
+            "time": datetime.utcnow().isoformat() + "Z",
+            "iKey": AZURE_APP_INSIGHTS_KEY,
+            "tags": {
+                "ai.cloud.role": "pravis-boutique-api",
+                "ai.cloud.roleInstance": os.getenv("HOSTNAME", "local"),
+                "ai.application.ver": "1.0.0"
+            },
+            "data": {
+                "baseType": "EventData",
+                "baseData": {
+                    "ver": 2,
+                    "name": event_name,
+                    "properties": properties
                 }
             }
-            
-            # Send the telemetry data
-            response = requests.post(url, json=telemetry_data, timeout=1.0)
-            response.raise_for_status()
-        except Exception as e:
-            logger.error(f"Error sending data to Application Insights: {str(e)}")
+        }
+        
+        # Shipped in batches by the exporter thread
+        get_telemetry_exporter(build_telemetry_sinks).submit("app_insights", "", telemetry_data)
 
     @staticmethod
     def send_to_log_analytics(log_type: str, log_data: Dict[str, Any]):
-        """Send logs to Azure Log Analytics workspace"""
+        """Queue logs for Azure Log Analytics workspace"""
         if not AZURE_LOG_ANALYTICS_ENABLED:
             return
         
-        try:
-            # Build the API signature
-            workspace_id = AZURE_LOG_ANALYTICS_WORKSPACE_ID
-            shared_key = AZURE_LOG_ANALYTICS_SHARED_KEY
-            
-            # Prepare the log entry
-            log_entry = json.dumps(log_data)
-            
-            # Build the API URL
-            url = f"https://{workspace_id}.ods.opinsights.azure.com/api/logs?api-version=2016-04-01"
-            
-            # Build the headers with authentication
-            import base64
-            import hmac
-            import hashlib
-            import datetime
-            
-            # Create the signature
-            rfc1123date = datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-            content_length = len(log_entry)
-            signature_string = f"POST\n{content_length}\napplication/json\nx-ms-date:{rfc1123date}\n/api/logs"
-            
-            # Create the HMAC signature
-            signature = base64.b64encode(
-                hmac.new(
-                    base64.b64decode(shared_key),
-                    signature_string.encode('utf-8'),
-                    digestmod=hashlib.sha256
-                ).digest()
-            ).decode('utf-8')
-            
-            # Create the authorization header
-            authorization = f"SharedKey {workspace_id}:{signature}"
-            
-            # Set the headers
-            headers = {
-                'content-type': 'application/json',
-                'Authorization': authorization,
-                'Log-Type': log_type,
-                'x-ms-date': rfc1123date
-            }
-            
-            # Send the log data
-            response = requests.post(url, data=log_entry, headers=headers, timeout=3.0)
-            response.raise_for_status()
-        except Exception as e:
-            logger.error(f"Error sending logs to Log Analytics: {str(e)}")
+        # Shipped in batches by the exporter thread
+        get_telemetry_exporter(build_telemetry_sinks).submit("log_analytics", log_type, log_data)
 
     @staticmethod
     def log_api_request(request_id: str, method: str, path: str, status_code: int,
-                      duration_ms: float, user_id: Optional[str] = None):
+                      duration_ms: float, user_id: Optional[str] = None,
+                      route: Optional[str] = None, sample_weight: float = 1.0,
+                      db_queries: int = 0, db_time_ms: float = 0.0,
+                      db_slowest_statement: Optional[str] = None):
         """Log API request metrics to Azure monitoring"""
         # Prepare the log data
         log_data = {
@@ -124,8 +93,14 @@ class AzureMonitoring:
             "timestamp": datetime.utcnow().isoformat(),
             "method": method,
             "path": path,
+            "route": route,
             "status_code": status_code,
             "duration_ms": duration_ms,
+            # Number of requests this record stands for after sampling
+            "sample_weight": sample_weight,
+            "db_queries": db_queries,
+            "db_time_ms": db_time_ms,
+            "db_slowest_statement": db_slowest_statement,
             "environment": settings.ENVIRONMENT,
             "user_id": user_id,
             "service": "pravis-boutique-api"
@@ -180,68 +155,53 @@ class AzureMonitoring:
         AzureMonitoring.send_to_log_analytics("PravisBoutiqueAPI_VoiceRequests", log_data)
 
 
-class AzureMonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware to log all API requests to Azure monitoring"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Generate a unique request ID
-        request_id = os.urandom(8).hex()
-        
-        # Attach request ID to request state
-        request.state.request_id = request_id
-        
-        # Get the start time
-        start_time = time.time()
-        
-        try:
-            # Process the request
-            response = await call_next(request)
-            
-            # Calculate request duration
-            duration_ms = (time.time() - start_time) * 1000
-            
-            # Extract user ID if present
-            user_id = None
-            if hasattr(request.state, "user") and request.state.user:
-                user_id = str(request.state.user.id)
-            
-            # Log the request
-            AzureMonitoring.log_api_request(
-                request_id=request_id,
-                method=request.method,
-                path=request.url.path,
-                status_code=response.status_code,
-                duration_ms=duration_ms,
-                user_id=user_id
-            )
-            
-            return response
-            
-        except Exception as e:
-            # Log the exception
-            AzureMonitoring.log_exception(
-                request_id=request_id,
-                exception_type=type(e).__name__,
-                exception_message=str(e),
-                path=request.url.path,
-                method=request.method,
-                user_id=None  # We may not have a user at this point
-            )
-            
-            # Re-raise the exception
-            raise
+def log_request_telemetry(context: RequestContext) -> None:
+    """Request pipeline hook logging sampled API requests to Azure monitoring"""
+    if context.sample_weight is None:
+        return
+    if context.error is not None:
+        # Log the exception
+        AzureMonitoring.log_exception(
+            request_id=context.request_id,
+            exception_type=type(context.error).__name__,
+            exception_message=str(context.error),
+            path=context.path,
+            method=context.method,
+            user_id=context.user_id
+        )
+        return
+
+    # Log the request
+    AzureMonitoring.log_api_request(
+        request_id=context.request_id,
+        method=context.method,
+        path=context.path,
+        status_code=context.status_code,
+        duration_ms=context.duration_ms,
+        user_id=context.user_id,
+        route=context.route,
+        sample_weight=context.sample_weight,
+        db_queries=context.db_queries,
+        db_time_ms=context.db_time_ms,
+        db_slowest_statement=context.db_slowest_statement
+    )
+
+
+async def shutdown_telemetry() -> None:
+    """
+    Flush and stop the telemetry exporter from the threadpool: the final
+    upload may take up to the exporter's join timeout.
+    """
+    await run_in_threadpool(shutdown_telemetry_exporter)
 
 
 def setup_azure_monitoring(app: FastAPI):
     """Setup Azure monitoring middleware and logging for FastAPI app"""
-    # Add middleware for request/response monitoring
-    app.add_middleware(AzureMonitoringMiddleware)
+    # Add a request pipeline hook for request/response monitoring
+    get_request_pipeline(app).on_response.append(log_request_telemetry)
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
+    # Flush queued telemetry before the process exits
+    app.add_event_handler("shutdown", shutdown_telemetry)
     
     # Log application startup
     app_startup_data = {
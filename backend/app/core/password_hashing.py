@@ -0,0 +1,141 @@
+"""
+Password hashing off the event loop.
+
+bcrypt deliberately costs hundreds of milliseconds of CPU. Hashing and
+verification run in a dedicated thread pool (bcrypt releases the GIL while
+hashing) with a cap on running plus queued operations. Requests beyond the
+cap fail fast with PasswordHashingBusy, answered with a 503, instead of
+queueing behind a login burst.
+
+The bcrypt cost (BCRYPT_ROUNDS) is chosen with calibrate_rounds, which times
+hashing on the current hardware.
+"""
+import asyncio
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
+
+from app.core.metrics import (
+    PASSWORD_HASH_IN_FLIGHT,
+    PASSWORD_HASH_QUEUE_WAIT,
+    PASSWORD_HASH_REJECTIONS,
+)
+
+T = TypeVar("T")
+
+# Modular crypt prefix of a bcrypt hash, e.g. "$2b$12$"
+BCRYPT_PREFIX = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+class PasswordHasher:
+    """Runs CryptContext operations in a bounded worker pool"""
+
+    def __init__(self, context: CryptContext, max_workers: int = 2, max_queue: int = 32):
+        self.context = context
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Operations running or waiting for a worker"""
+        return self._pending
+
+    def _submit(self, operation: str, fn: Callable[..., T], *args) -> "Future[T]":
+        with self._lock:
+            if self._pending >= self.capacity:
+                PASSWORD_HASH_REJECTIONS.labels(operation).inc()
+                raise PasswordHashingBusy(f"Password hashing queue is full ({self.capacity})")
+            self._pending += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        submitted = time.perf_counter()
+
+        def run() -> T:
+            PASSWORD_HASH_QUEUE_WAIT.labels(operation).observe(time.perf_counter() - submitted)
+            return fn(*args)
+
+        def done(_: Future) -> None:
+            with self._lock:
+                self._pending -= 1
+            PASSWORD_HASH_IN_FLIGHT.dec()
+
+        future = self._executor.submit(run)
+        future.add_done_callback(done)
+        return future
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify a password without blocking the event loop"""
+        return await asyncio.wrap_future(
+            self._submit("verify", self.context.verify, password, hashed_password)
+        )
+
+    async def hash(self, password: str) -> str:
+        """Hash a password without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit("hash", self.context.hash, password))
+
+    def verify_sync(self, password: str, hashed_password: str) -> bool:
+        """Verify a password from a worker thread, subject to the same cap"""
+        return self._submit("verify", self.context.verify, password, hashed_password).result()
+
+    def hash_sync(self, password: str) -> str:
+        """Hash a password from a worker thread, subject to the same cap"""
+        return self._submit("hash", self.context.hash, password).result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def hash_cost(hashed_password: Optional[str]) -> str:
+    """Scheme and cost of a stored hash, e.g. "bcrypt:12", without verifying it"""
+    match = BCRYPT_PREFIX.match(hashed_password or "")
+    if match is None:
+        return "unknown"
+    return f"bcrypt:{int(match.group(1))}"
+
+
+def measure_hash_time(rounds: int, samples: int = 3, password: str = "calibration-password") -> float:
+    """Median seconds to hash a password with bcrypt at a cost"""
+    handler = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash(password)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def calibrate_rounds(
+    target: float,
+    min_rounds: int = 4,
+    max_rounds: int = 16,
+    samples: int = 3,
+    measure: Callable[[int, int], float] = measure_hash_time,
+) -> Tuple[int, Dict[int, float]]:
+    """
+    Recommend the highest bcrypt cost that hashes within ``target`` seconds.
+    Costs are timed upwards from ``min_rounds`` until one exceeds the target,
+    each step doubles the time. Returns the cost and every timing taken; the
+    cost is never below ``min_rounds``.
+    """
+    # The first hash loads the bcrypt backend, keep it out of the timings
+    measure(min_rounds, 1)
+    timings: Dict[int, float] = {}
+    recommended = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        timings[rounds] = measure(rounds, samples)
+        if timings[rounds] > target:
+            break
+        recommended = rounds
+    return recommended, timings
@@ -0,0 +1,85 @@
+"""
+Process-local cache of authenticated user snapshots.
+
+Resolving the principal of a request needs only a handful of user columns.
+They are cached per user ID for a short TTL so most authenticated requests
+never touch the database. UserRepository invalidates an entry whenever it
+changes or deletes that user; other workers see the change once their
+entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import PRINCIPAL_CACHE_REQUESTS
+
+
+def user_snapshot(user: Any) -> Dict[str, Any]:
+    """Compact, immutable-by-convention view of a User row"""
+    return {
+        "id": user.id,
+        "email": user.email,
+        "is_active": bool(user.is_active),
+        "is_superuser": bool(user.is_superuser),
+        "role": "admin" if user.is_superuser else "user",
+    }
+
+
+class PrincipalCache:
+    """Bounded TTL cache of user snapshots keyed by user ID"""
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                PRINCIPAL_CACHE_REQUESTS.labels("hit").inc()
+                return entry[0]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+        PRINCIPAL_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    def set(self, user_id: int, snapshot: Dict[str, Any], now: Optional[float] = None) -> None:
+        if self.ttl <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries[user_id] = (snapshot, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL, max_entries=settings.PRINCIPAL_CACHE_SIZE
+)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop a user's cached snapshot after it changed"""
+    principal_cache.invalidate(user_id)
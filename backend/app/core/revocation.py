@@ -0,0 +1,243 @@
+"""
+Revoked token checks without a database lookup per request.
+
+Revoked JWT IDs live in the ``revoked_tokens`` table until the token would
+have expired. Every worker mirrors the table into a Bloom filter, so checking
+a token that was not revoked, the common case, costs one hash and a few bit
+probes. Revocations loaded since the last full rebuild are also kept in an
+exact dict, so recent revocations are answered without the database. An
+older entry that the Bloom filter reports is confirmed with one primary-key
+lookup, which catches false positives.
+
+Workers pull new revocations incrementally every ``refresh_interval`` seconds
+and rebuild the filter from the active rows every ``rebuild_interval``
+seconds, which drops expired tokens. Memory is about 1.8 MB per million
+revoked tokens at a 0.1% false positive rate.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import AbstractContextManager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import TOKEN_REVOCATION_CHECKS
+from app.repositories.token import RevokedTokenRepository
+
+logger = logging.getLogger(__name__)
+
+SessionScope = Callable[[], AbstractContextManager]
+
+# Delta queries look back this far past the last sync, so rows committed late
+# or stamped by a worker with a slightly slow clock are not missed
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    Sized for ``capacity`` items at ``error_rate`` false positives; it never
+    reports a false negative.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def expected_false_positive_rate(self, count: Optional[int] = None) -> float:
+        """(1 - e^(-kn/m))^k for n items in m bits with k hashes"""
+        count = self.count if count is None else count
+        return (1 - math.exp(-self.hashes * count / self.size)) ** self.hashes
+
+
+class RevocationList:
+    """
+    Process-local mirror of the revoked_tokens table.
+    The database is only read during refreshes and to confirm Bloom filter hits
+    on entries older than the last rebuild.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        refresh_interval: float = 5.0,
+        rebuild_interval: float = 900.0,
+        max_confirmed: int = 10_000,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.max_confirmed = max_confirmed
+        self.bloom = BloomFilter(capacity, error_rate)
+        # Exact entries loaded since the last rebuild: jti -> exp timestamp
+        self.recent: Dict[str, float] = {}
+        # Database answers for Bloom hits on older entries
+        self._confirmed: "OrderedDict[str, bool]" = OrderedDict()
+        self.last_sync: Optional[datetime] = None
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+        self._refresh_lock = threading.Lock()
+        # Guards add() against the swap at the end of a rebuild
+        self._add_lock = threading.Lock()
+        # Entries added while a rebuild reads its snapshot, or None
+        self._added_during_rebuild: Optional[Dict[str, float]] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(self, jti: str, exp: float) -> None:
+        """Mirror a revocation locally"""
+        with self._add_lock:
+            self.bloom.add(jti)
+            self.recent[jti] = exp
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild[jti] = exp
+
+    def check(self, jti: str, now: Optional[float] = None) -> Optional[bool]:
+        """
+        Answer from memory: False if certainly not revoked, True if revoked,
+        None when the database has to confirm a Bloom filter hit.
+        """
+        if jti not in self.bloom:
+            return False
+        exp = self.recent.get(jti)
+        if exp is not None:
+            return exp > (time.time() if now is None else now)
+        return self._confirmed.get(jti)
+
+    def _remember(self, jti: str, revoked: bool) -> None:
+        self._confirmed[jti] = revoked
+        while len(self._confirmed) > self.max_confirmed:
+            self._confirmed.popitem(last=False)
+
+    def refresh(self, db: Session, full: bool = False) -> None:
+        """Pull new revocations, or rebuild from every active one"""
+        with self._refresh_lock:
+            started = datetime.utcnow()
+            if full or self.last_sync is None:
+                # Only the filter holds the full set; keeping every jti exactly
+                # would cost far more memory than the filter itself
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                with self._add_lock:
+                    self._added_during_rebuild = {}
+                try:
+                    for jti in RevokedTokenRepository.iter_active_jtis(db, now=started):
+                        bloom.add(jti)
+                    with self._add_lock:
+                        # A logout on this worker may have committed after the
+                        # snapshot was read; keep its revocation exactly
+                        recent = self._added_during_rebuild
+                        for jti in recent:
+                            bloom.add(jti)
+                        # Swap in whole so concurrent readers never see a partial filter
+                        self.bloom, self.recent, self._confirmed = bloom, recent, OrderedDict()
+                finally:
+                    self._added_during_rebuild = None
+                self._rebuilt_at = time.monotonic()
+            else:
+                for row in RevokedTokenRepository.get_since(db, since=self.last_sync - SYNC_OVERLAP):
+                    self.add(row.jti, _timestamp(row.expires_at))
+                    self._confirmed.pop(row.jti, None)
+            self.last_sync = started
+            self._synced_at = time.monotonic()
+
+    def _refresh_due(self) -> Optional[bool]:
+        """None if no refresh is due, else whether a full rebuild is"""
+        now = time.monotonic()
+        if now - self._rebuilt_at >= self.rebuild_interval:
+            return True
+        if now - self._synced_at >= self.refresh_interval:
+            return False
+        return None
+
+    def _refresh_with(self, session_scope: SessionScope, full: bool) -> None:
+        with session_scope() as db:
+            self.refresh(db, full=full)
+
+    async def is_revoked(self, jti: str, session_scope: SessionScope) -> bool:
+        """Check a token ID, refreshing the mirror in the background when due"""
+        if self.last_sync is None:
+            # Nothing loaded yet: this request waits for the first full load
+            await run_in_threadpool(self._refresh_with, session_scope, True)
+        else:
+            full = self._refresh_due()
+            if full is not None and not self._tasks:
+                self._synced_at = time.monotonic()
+                task = asyncio.ensure_future(run_in_threadpool(self._refresh_with, session_scope, full))
+                self._tasks.add(task)
+                task.add_done_callback(self._refresh_done)
+
+        revoked = self.check(jti)
+        if revoked is None:
+            TOKEN_REVOCATION_CHECKS.labels("confirmed").inc()
+            revoked = await run_in_threadpool(self._confirm, jti, session_scope)
+        else:
+            TOKEN_REVOCATION_CHECKS.labels("revoked" if revoked else "memory").inc()
+        return revoked
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # Retry on the next interval; until then the current mirror is used
+            logger.error("Revocation list refresh failed: %s", task.exception())
+
+    def _confirm(self, jti: str, session_scope: SessionScope) -> bool:
+        with session_scope() as db:
+            revoked = RevokedTokenRepository.is_revoked(db, jti=jti)
+        self._remember(jti, revoked)
+        return revoked
+
+
+def _timestamp(value: datetime) -> float:
+    """Epoch seconds of a naive UTC datetime"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def expires_at_from_claims(claims: Dict) -> datetime:
+    """Naive UTC expiry of a token from its exp claim"""
+    return datetime(1970, 1, 1) + timedelta(seconds=int(claims["exp"]))
+
+
+revocation_list = RevocationList(
+    capacity=settings.REVOCATION_CAPACITY,
+    error_rate=settings.REVOCATION_ERROR_RATE,
+    refresh_interval=settings.REVOCATION_REFRESH_INTERVAL,
+    rebuild_interval=settings.REVOCATION_REBUILD_INTERVAL,
+)
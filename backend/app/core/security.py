@@ -3,21 +3,34 @@ Security utilities for password hashing and token generation
 """
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional
+from uuid import uuid4
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.password_hashing import PasswordHasher
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context. Hashes with a different cost report needs_update,
+# so changing BCRYPT_ROUNDS takes effect on each user's next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# Worker pool running pwd_context off the event loop
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
 
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: Optional[timedelta] = None
 ) -> str:
     """
-    Create a JWT token
+    Create a JWT token.
+    Each token gets a unique ``jti`` claim so it can be revoked on its own.
     """
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -25,20 +38,44 @@ def create_access_token(
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {"exp": expire, "sub": str(subject), "jti": uuid4().hex}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    Verify a password against a hash
+    Verify a password against a hash.
+    Blocks the calling thread; use verify_password_async in async code.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify_sync(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """
-    Hash a password
+    Hash a password.
+    Blocks the calling thread; use get_password_hash_async in async code.
+    """
+    return password_hasher.hash_sync(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Check whether a hash uses a deprecated scheme or another cost than
+    BCRYPT_ROUNDS. Only parses the hash, no hashing is done.
+    """
+    return pwd_context.needs_update(hashed_password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password against a hash without blocking the event loop
+    """
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password without blocking the event loop
     """
-    return pwd_context.hash(password)
+    return await password_hasher.hash(password)
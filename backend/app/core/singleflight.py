@@ -0,0 +1,58 @@
+"""
+Request coalescing for concurrent computations of the same key.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class FlightAbandoned(Exception):
+    """Raised to waiters when the computation they joined was cancelled."""
+
+
+class SingleFlight:
+    """
+    Run at most one in-flight computation per key in this process.
+
+    Callers arriving while a computation for their key is running wait for
+    it and share its result, or its exception. Waiters may give up after a
+    timeout, which does not cancel the running computation.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` for a key, or join the computation already running.
+        Returns a tuple of (result, shared) where shared is True for waiters.
+        Raises asyncio.TimeoutError if a waiter's timeout expires.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                e = FlightAbandoned(key)
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
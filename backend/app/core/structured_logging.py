@@ -0,0 +1,132 @@
+"""
+Application logging configuration.
+
+Handlers on the request path only put records on a bounded queue. A
+QueueListener thread formats them, as plain text or one JSON object per
+line, and writes them out, so the event loop never blocks on log I/O.
+Records are dropped and counted when the queue is full.
+"""
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED
+from app.middleware.pipeline import get_request_context
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Request fields copied onto records, in JSON output order
+REQUEST_FIELDS = ("request_id", "method", "route", "status_code", "latency_ms", "sample_weight", "user_id")
+
+# Attributes every LogRecord has, anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in REQUEST_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and name not in data:
+                data[name] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks: records are dropped and counted when
+    the queue is full. Request context fields are captured when the record
+    is queued, since the listener thread has no request context.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        # SimpleQueue is implemented in C and much cheaper per put than Queue
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = get_request_context()
+        if context is not None:
+            defaults = {
+                "request_id": context.request_id,
+                "method": context.method,
+                "route": context.route,
+                "user_id": context.user_id,
+            }
+            for name, value in defaults.items():
+                if getattr(record, name, None) is None:
+                    setattr(record, name, value)
+        # Merge the arguments now, they may change before the listener runs.
+        # Formatting and I/O are left to the listener.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+            return
+        self.queue.put_nowait(record)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+    queue_size: Optional[int] = None,
+    stream=None,
+) -> BoundedQueueHandler:
+    """
+    Route all logging through a bounded queue to a background writer thread.
+    Replaces any handlers on the root logger, so it is safe to call again.
+    """
+    global _listener
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if (log_format or settings.LOG_FORMAT) == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = BoundedQueueHandler(queue_size or settings.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level or settings.LOG_LEVEL)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return handler
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
@@ -0,0 +1,356 @@
+"""
+Background exporter for telemetry records.
+
+Records are put on a bounded in-memory queue and shipped by a dedicated
+worker thread in batches, so request handling never waits on outbound HTTP.
+When the queue is full the oldest records are dropped and counted.
+"""
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from app.core.config import settings
+from app.core.metrics import (
+    TELEMETRY_BATCHES,
+    TELEMETRY_BYTES,
+    TELEMETRY_EXPORT_SECONDS,
+    TELEMETRY_RECORDS,
+    TELEMETRY_RETRIES,
+)
+
+logger = logging.getLogger("app.monitoring")
+
+
+# Status codes meaning the batch was not accepted and may be sent again
+RETRYABLE_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a failed export can be retried without duplicating records.
+    Read timeouts are not retried since the batch may already have been ingested.
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, requests.ReadTimeout):
+        return False
+    return isinstance(error, requests.ConnectionError)
+
+
+@dataclass
+class ExportStats:
+    """Per-sink export counters, also published as telemetry_* metrics"""
+    batches: int = 0
+    records: int = 0
+    bytes: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    failed_records: int = 0
+    dropped: int = 0
+    latency_ms_total: float = 0.0
+    last_latency_ms: float = 0.0
+
+
+class TelemetrySink(ABC):
+    """Destination for batches of encoded telemetry records"""
+
+    # Sink specific caps applied on top of the exporter's batch limits
+    max_batch_records: Optional[int] = None
+    max_batch_bytes: Optional[int] = None
+
+    def encode(self, records: List[bytes]) -> bytes:
+        """Build the payload for one batch, newline-delimited JSON by default"""
+        return b"\n".join(records)
+
+    @abstractmethod
+    def post(self, stream: str, payload: bytes) -> None:
+        """Ship one payload, raising on failure. ``stream`` names the record type."""
+
+    def close(self) -> None:
+        pass
+
+
+class AppInsightsSink(TelemetrySink):
+    """Ships envelopes to Application Insights as gzipped newline-delimited JSON"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def encode(self, records: List[bytes]) -> bytes:
+        return gzip.compress(b"\n".join(records))
+
+    def post(self, stream: str, payload: bytes) -> None:
+        response = self.session.post(
+            self.endpoint,
+            data=payload,
+            headers={
+                "Content-Type": "application/x-json-stream",
+                "Content-Encoding": "gzip",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class LogAnalyticsSink(TelemetrySink):
+    """
+    Ships records to the Log Analytics Data Collector API as one JSON array per batch.
+    The shared key is decoded once and each attempt is signed with a fresh date.
+    """
+
+    # Data Collector API limit per post
+    max_batch_bytes = 30 * 1024 * 1024
+
+    def __init__(
+        self,
+        workspace_id: str,
+        shared_key: str,
+        endpoint: Optional[str] = None,
+        timeout: float = 5.0,
+    ):
+        self.workspace_id = workspace_id
+        self.url = endpoint or f"https://{workspace_id}.ods.opinsights.azure.com/api/logs?api-version=2016-04-01"
+        self.key = base64.b64decode(shared_key)
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def sign(self, content_length: int, rfc1123date: str) -> str:
+        signature_string = f"POST\n{content_length}\napplication/json\nx-ms-date:{rfc1123date}\n/api/logs"
+        signature = base64.b64encode(
+            hmac.new(self.key, signature_string.encode("utf-8"), digestmod=hashlib.sha256).digest()
+        ).decode("utf-8")
+        return f"SharedKey {self.workspace_id}:{signature}"
+
+    def encode(self, records: List[bytes]) -> bytes:
+        return b"[" + b",".join(records) + b"]"
+
+    def post(self, stream: str, payload: bytes) -> None:
+        rfc1123date = formatdate(usegmt=True)
+        response = self.session.post(
+            self.url,
+            data=payload,
+            headers={
+                "content-type": "application/json",
+                "Authorization": self.sign(len(payload), rfc1123date),
+                "Log-Type": stream,
+                "x-ms-date": rfc1123date,
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class TelemetryExporter:
+    """
+    Bounded queue drained by a worker thread.
+
+    Batches are cut per sink and stream at ``max_batch_records`` records or
+    ``max_batch_bytes`` encoded bytes, and the queue is flushed at least every
+    ``flush_interval`` seconds and on shutdown. Failed batches are retried
+    with exponential backoff when the failure means they were not ingested.
+    """
+
+    def __init__(
+        self,
+        sinks: Dict[str, TelemetrySink],
+        max_queue: int = 10_000,
+        max_batch_records: int = 500,
+        max_batch_bytes: int = 1024 * 1024,
+        flush_interval: float = 5.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self.sinks = sinks
+        self.max_batch_records = max_batch_records
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.stats: Dict[str, ExportStats] = {name: ExportStats() for name in sinks}
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+        self._queue: Deque[Tuple[str, str, Any]] = deque(maxlen=max_queue)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(self, sink: str, stream: str, record: Any) -> None:
+        """Queue a record without blocking, dropping the oldest when full."""
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                # The oldest record is displaced
+                displaced = self._queue[0][0]
+                self.dropped += 1
+                if displaced in self.stats:
+                    self.stats[displaced].dropped += 1
+                TELEMETRY_RECORDS.labels(displaced, "dropped").inc()
+            self._queue.append((sink, stream, record))
+            if self._thread is None and not self._stopping:
+                self._start()
+            if len(self._queue) >= self.max_batch_records:
+                self._wakeup.notify()
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="telemetry-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._queue) < self.max_batch_records:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            self._drain()
+            if stopping:
+                return
+
+    def _drain(self) -> None:
+        """Export everything currently queued."""
+        with self._lock:
+            items = list(self._queue)
+            self._queue.clear()
+        if not items:
+            return
+
+        batches: Dict[Tuple[str, str], List[bytes]] = {}
+        for sink, stream, record in items:
+            encoded = record if isinstance(record, bytes) else json.dumps(record, default=str).encode()
+            batches.setdefault((sink, stream), []).append(encoded)
+
+        for (sink, stream), records in batches.items():
+            for batch in self._split(self.sinks[sink], records):
+                self._export(sink, stream, batch)
+
+    def _split(self, sink: TelemetrySink, records: List[bytes]):
+        max_records = min(self.max_batch_records, sink.max_batch_records or self.max_batch_records)
+        max_bytes = min(self.max_batch_bytes, sink.max_batch_bytes or self.max_batch_bytes)
+        batch: List[bytes] = []
+        size = 0
+        for record in records:
+            if batch and (len(batch) >= max_records or size + len(record) > max_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(record)
+            size += len(record)
+        if batch:
+            yield batch
+
+    def _export(self, name: str, stream: str, batch: List[bytes]) -> None:
+        """Send one batch, retrying the same payload on retryable failures"""
+        sink = self.sinks[name]
+        stats = self.stats[name]
+        payload = sink.encode(batch)
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                sink.post(stream, payload)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failed += len(batch)
+                    stats.failed_batches += 1
+                    stats.failed_records += len(batch)
+                    TELEMETRY_BATCHES.labels(name, "failed").inc()
+                    TELEMETRY_RECORDS.labels(name, "failed").inc(len(batch))
+                    TELEMETRY_EXPORT_SECONDS.labels(name).observe(time.perf_counter() - start)
+                    logger.error("Error exporting %d telemetry records to %s: %s", len(batch), name, e)
+                    return
+                attempt += 1
+                stats.retries += 1
+                TELEMETRY_RETRIES.labels(name).inc()
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.exported += len(batch)
+        stats.batches += 1
+        stats.records += len(batch)
+        stats.bytes += len(payload)
+        stats.latency_ms_total += latency_ms
+        stats.last_latency_ms = latency_ms
+        TELEMETRY_BATCHES.labels(name, "exported").inc()
+        TELEMETRY_RECORDS.labels(name, "exported").inc(len(batch))
+        TELEMETRY_BYTES.labels(name).inc(len(payload))
+        TELEMETRY_EXPORT_SECONDS.labels(name).observe(latency_ms / 1000)
+        logger.debug(
+            "Exported %d telemetry records (%d bytes) to %s/%s in %.1fms",
+            len(batch), len(payload), name, stream, latency_ms,
+        )
+
+    def flush(self) -> None:
+        """Export everything queued so far from the calling thread."""
+        self._drain()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Stop the worker after a final flush."""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            self._drain()
+        for sink in self.sinks.values():
+            sink.close()
+
+
+_exporter: Optional[TelemetryExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_telemetry_exporter(
+    sink_factory: Optional[Callable[[], Dict[str, TelemetrySink]]] = None,
+) -> TelemetryExporter:
+    """Get or create the process-wide telemetry exporter"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = TelemetryExporter(
+                    sink_factory() if sink_factory else {},
+                    max_queue=settings.TELEMETRY_QUEUE_SIZE,
+                    max_batch_records=settings.TELEMETRY_BATCH_RECORDS,
+                    max_batch_bytes=settings.TELEMETRY_BATCH_BYTES,
+                    flush_interval=settings.TELEMETRY_FLUSH_INTERVAL,
+                    max_retries=settings.TELEMETRY_MAX_RETRIES,
+                    retry_backoff=settings.TELEMETRY_RETRY_BACKOFF,
+                )
+    return _exporter
+
+
+def shutdown_telemetry_exporter() -> None:
+    """Flush and stop the telemetry exporter"""
+    global _exporter
+    with _exporter_lock:
+        exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.shutdown()
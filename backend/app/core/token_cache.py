@@ -0,0 +1,81 @@
+"""
+Cache of verified JWT claims.
+
+A token is presented on every request during its lifetime, but its
+signature only needs checking once. Verified claims are kept in a bounded
+LRU keyed by a SHA-256 digest of the token, so raw tokens are never held
+and a forged token cannot collide with a cached one. Entries expire at the
+token's ``exp``, and the whole cache is dropped when the signing key or
+algorithm changes.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.metrics import JWT_CACHE_REQUESTS
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token claims"""
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._key_id: Optional[Tuple[str, str]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def _check_key(self, secret_key: str, algorithm: str) -> None:
+        # Tokens verified with a previous key must be verified again
+        key_id = (secret_key, algorithm)
+        if self._key_id != key_id:
+            self._entries.clear()
+            self._key_id = key_id
+
+    def get(
+        self, token: str, secret_key: str, algorithm: str, now: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached claims of a token, or None if not cached or expired."""
+        digest = self._digest(token)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._check_key(secret_key, algorithm)
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                JWT_CACHE_REQUESTS.labels("hit").inc()
+                # A copy: callers may change the claims they are handed
+                return dict(entry[0])
+            if entry is not None:
+                del self._entries[digest]
+            self.misses += 1
+        JWT_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    def set(self, token: str, claims: Dict[str, Any], secret_key: str, algorithm: str) -> None:
+        """Cache the claims of a verified token until its expiry."""
+        exp = claims.get("exp")
+        if exp is None:
+            return
+        digest = self._digest(token)
+        with self._lock:
+            self._check_key(secret_key, algorithm)
+            self._entries[digest] = (dict(claims), float(exp))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,153 @@
+"""
+Per-request SQL instrumentation.
+
+Cursor execution events on every engine count the statements of the
+request being handled and their time, keep the slowest one and count
+statement shapes (the SQL with literals and parameters replaced by ``?``)
+on its RequestContext. After the response, a shape run at least
+``DB_N_PLUS_ONE_THRESHOLD`` times is logged as a suspected N+1 query.
+Statements slower than ``DB_SLOW_QUERY_MS`` go to the
+``app.db.slow_queries`` logger whether or not a request is active.
+"""
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import DB_SLOW_QUERIES, DB_SUSPECTED_N_PLUS_ONE
+from app.middleware.pipeline import RequestContext, get_request_context, get_request_pipeline
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.db.slow_queries")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+# pyformat, format, numeric and named placeholders; not PostgreSQL :: casts
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# EXPLAIN prefix per dialect, statements of other dialects are logged without a plan
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN ", "mysql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """The statement's shape: literals and parameters become ``?``, whitespace is collapsed"""
+    shape = _STRING.sub("?", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def explain(connection, statement: str, parameters) -> Optional[str]:
+    """
+    The query plan of a statement, from a raw DBAPI cursor so it is not
+    instrumented itself. EXPLAIN without ANALYZE does not run the statement.
+    """
+    prefix = EXPLAIN_PREFIXES.get(connection.dialect.name)
+    if prefix is None or not statement.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(str(row[-1]) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def record_statement(context: RequestContext, shape: str, elapsed_ms: float) -> None:
+    context.db_queries += 1
+    context.db_time_ms += elapsed_ms
+    context.db_statement_counts[shape] = context.db_statement_counts.get(shape, 0) + 1
+    if elapsed_ms > context.db_slowest_ms:
+        context.db_slowest_ms = elapsed_ms
+        context.db_slowest_statement = shape
+
+
+def log_slow_statement(connection, statement: str, parameters, elapsed_ms: float, executemany: bool) -> None:
+    DB_SLOW_QUERIES.inc()
+    plan = None
+    if settings.DB_SLOW_QUERY_EXPLAIN and not executemany:
+        try:
+            plan = explain(connection, statement, parameters)
+        except Exception as exc:
+            plan = f"EXPLAIN failed: {exc}"
+    shape = normalize_statement(statement)
+    message = "Slow query (%.1f ms): %s"
+    args = [elapsed_ms, shape]
+    if plan:
+        message += "\n%s"
+        args.append(plan)
+    slow_query_logger.warning(
+        message, *args, extra={"db_time_ms": round(elapsed_ms, 3), "statement": shape, "plan": plan}
+    )
+
+
+def instrument_queries(engine: Engine) -> None:
+    """Time every statement run through ``engine``"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - connection.info["query_started"].pop()) * 1000
+        request = get_request_context()
+        if request is not None:
+            record_statement(request, normalize_statement(statement), elapsed_ms)
+        if 0 < settings.DB_SLOW_QUERY_MS <= elapsed_ms:
+            log_slow_statement(connection, statement, parameters, elapsed_ms, executemany)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute does not run for failed statements
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+def db_response_headers(context: RequestContext) -> List[tuple]:
+    """X-DB-Queries and X-DB-Time (seconds, like X-Process-Time) for the response"""
+    return [
+        (b"x-db-queries", str(context.db_queries).encode("latin-1")),
+        (b"x-db-time", str(context.db_time_ms / 1000).encode("latin-1")),
+    ]
+
+
+def detect_n_plus_one(context: RequestContext) -> None:
+    """Request pipeline hook logging statement shapes repeated within the request"""
+    threshold = settings.DB_N_PLUS_ONE_THRESHOLD
+    if threshold <= 0:
+        return
+    repeated = [(count, shape) for shape, count in context.db_statement_counts.items() if count >= threshold]
+    if not repeated:
+        return
+    DB_SUSPECTED_N_PLUS_ONE.labels(context.route).inc()
+    for count, shape in sorted(repeated, reverse=True):
+        logger.warning(
+            "Suspected N+1 query: %s %s ran %d times: %s",
+            context.method, context.route, count, shape,
+            extra={"db_queries": context.db_queries, "statement": shape},
+        )
+
+
+def setup_sql_instrumentation(app: FastAPI) -> None:
+    """
+    Report per-request SQL statistics. Engines are instrumented by
+    app.db.session when they are created; outside production the counts are
+    also sent as response headers.
+    """
+    pipeline = get_request_pipeline(app)
+    pipeline.on_response.append(detect_n_plus_one)
+    if settings.ENVIRONMENT != "production":
+        pipeline.response_headers.append(db_response_headers)
@@ -0,0 +1,64 @@
+"""
+Point lookups on the hot path, built once instead of per call.
+
+``db.query(Model).filter(...).first()`` builds a new Query, derives its
+cache key and looks up the compiled SQL on every call. A PointLookup holds
+one ``select()`` with a bound parameter, so a call only binds the value.
+With ``DB_PREPARED_STATEMENTS`` on PostgreSQL (psycopg2), each lookup is
+also PREPAREd once per connection and run with EXECUTE, so the server
+skips parsing and planning as well. Leave it off behind PgBouncer in
+transaction mode, where a connection's prepared statements do not follow
+the client. asyncpg prepares and caches statements by itself.
+"""
+from typing import Any, Dict, Generic, Optional, Type, TypeVar
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+ModelType = TypeVar("ModelType")
+
+# Renders PostgreSQL's $n placeholders, as PREPARE requires
+_POSTGRES_PREPARE_DIALECT = postgresql.dialect(paramstyle="numeric_dollar")
+
+
+class PointLookup(Generic[ModelType]):
+    """``SELECT ... FROM model WHERE column = :value LIMIT 1``"""
+
+    def __init__(self, model: Type[ModelType], column: Any):
+        self.model = model
+        self.name = f"{model.__tablename__}_by_{column.key}"
+        self.statement = select(model).where(column == bindparam("value")).limit(1)
+
+        compiled = self.statement.compile(dialect=_POSTGRES_PREPARE_DIALECT)
+        self.prepare_sql = f"PREPARE {self.name} AS {compiled}"
+        # EXECUTE takes every parameter positionally; only "value" varies
+        self._prepared_params: Dict[str, Any] = {}
+        placeholders = []
+        for position, key in enumerate(compiled.positiontup):
+            placeholders.append(":value" if key == "value" else f":p{position}")
+            if key != "value":
+                self._prepared_params[f"p{position}"] = compiled.params[key]
+        self.prepared_statement = select(model).from_statement(
+            text(f"EXECUTE {self.name}({', '.join(placeholders)})")
+        )
+
+    def _use_prepared(self, db: Session) -> bool:
+        connection = db.connection()
+        if connection.dialect.driver != "psycopg2":
+            return False
+        prepared = connection.info.setdefault("prepared_lookups", set())
+        if self.name not in prepared:
+            # Connection.info lives as long as the DBAPI connection
+            connection.exec_driver_sql(self.prepare_sql)
+            prepared.add(self.name)
+        return True
+
+    def __call__(self, db: Session, value: Any) -> Optional[ModelType]:
+        if settings.DB_PREPARED_STATEMENTS and self._use_prepared(db):
+            result = db.execute(self.prepared_statement, {"value": value, **self._prepared_params})
+        else:
+            result = db.execute(self.statement, {"value": value})
+        return result.scalar_one_or_none()
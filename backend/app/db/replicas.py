@@ -0,0 +1,128 @@
+"""
+Routing of read-only sessions across read replicas.
+
+Reads are spread over the replicas by smooth weighted round-robin. Each
+replica's replication lag is measured every ``check_interval`` seconds by
+the first read that finds the last measurement stale; replicas behind by
+more than ``max_lag`` seconds, or whose probe failed, are skipped until the
+next measurement. Reads go to the primary when no replica qualifies or the
+caller asks for it, e.g. right after the same client wrote something.
+"""
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.metrics import DB_READ_ROUTES, DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+# Seconds since the last replayed transaction, 0 while nothing is pending
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replication_lag(connection: Connection) -> float:
+    """
+    Replication lag of the database behind ``connection`` in seconds.
+    Backends without streaming replication report 0.
+    """
+    if connection.dialect.name != "postgresql":
+        return 0.0
+    lag = connection.execute(POSTGRES_LAG_QUERY).scalar()
+    return float(lag or 0.0)
+
+
+class Replica:
+    def __init__(self, name: str, engine: Engine, weight: int = 1):
+        if weight < 1:
+            raise ValueError("Replica weight must be at least 1")
+        self.name = name
+        self.engine = engine
+        self.weight = weight
+        # Seconds behind the primary at the last check, None if unknown
+        self.lag: Optional[float] = None
+        # Smooth weighted round-robin state
+        self.current_weight = 0
+
+
+class ReplicaRouter:
+    """Chooses the engine for a read-only session"""
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: List[Replica],
+        max_lag: float = 5.0,
+        check_interval: float = 5.0,
+        probe: Callable[[Connection], float] = replication_lag,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.probe = probe
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def check_lag(self, now: Optional[float] = None) -> None:
+        """Measure every replica's lag"""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    replica.lag = self.probe(connection)
+            except Exception as exc:
+                if replica.lag is not None:
+                    logger.warning("Replica %s failed its lag check: %s", replica.name, exc)
+                replica.lag = None
+            DB_REPLICA_LAG.labels(replica.name).set(-1 if replica.lag is None else replica.lag)
+        self._next_check = (time.monotonic() if now is None else now) + self.check_interval
+
+    def _maybe_check_lag(self, now: float) -> None:
+        if now < self._next_check:
+            return
+        # One thread measures; the others route on the previous measurement
+        if self._check_lock.acquire(blocking=False):
+            try:
+                if now >= self._next_check:
+                    self.check_lag(now)
+            finally:
+                self._check_lock.release()
+
+    def choose(self, use_primary: bool = False, now: Optional[float] = None) -> Engine:
+        """
+        The engine for the next read. ``use_primary`` forces the primary,
+        for reads that must see the caller's own recent writes.
+        """
+        if not self.replicas:
+            return self.primary
+        if use_primary:
+            DB_READ_ROUTES.labels("primary", "sticky").inc()
+            return self.primary
+
+        self._maybe_check_lag(time.monotonic() if now is None else now)
+        with self._lock:
+            eligible = [r for r in self.replicas if r.lag is not None and r.lag <= self.max_lag]
+            if not eligible:
+                chosen = None
+            else:
+                total = 0
+                chosen = eligible[0]
+                for replica in eligible:
+                    replica.current_weight += replica.weight
+                    total += replica.weight
+                    if replica.current_weight > chosen.current_weight:
+                        chosen = replica
+                chosen.current_weight -= total
+
+        if chosen is None:
+            DB_READ_ROUTES.labels("primary", "lagging").inc()
+            return self.primary
+        DB_READ_ROUTES.labels(chosen.name, "replica").inc()
+        return chosen.engine
@@ -1,15 +1,146 @@
-from sqlalchemy import create_engine
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+from app.db.instrumentation import instrument_queries
+from app.db.replicas import Replica, ReplicaRouter
+
+# asyncio drivers used for the sync database URL's backend
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def _engine_options(url: URL, is_async: bool = False) -> dict:
+    """create_engine options from the pool and timeout settings"""
+    options: dict = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    connect_args: dict = {}
+    backend = url.get_backend_name()
+
+    if backend == "sqlite" and not is_async:
+        # Sessions move between threadpool threads
+        connect_args["check_same_thread"] = False
+    if backend != "sqlite" or url.database not in (None, "", ":memory:"):
+        # In-memory SQLite keeps its default single-connection pool
+        options.update(
+            poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    if backend == "postgresql" and settings.DB_STATEMENT_TIMEOUT > 0:
+        if url.get_driver_name() == "asyncpg":
+            connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}"
+
+    options["connect_args"] = connect_args
+    return options
+
+
+def create_db_engine(url: Optional[str] = None, name: str = "primary", **overrides: Any) -> Engine:
+    """
+    Create an instrumented engine with the pool settings from Settings.
+    Every engine of the application is created here; keyword arguments
+    override the create_engine options.
+    """
+    url = make_url(url or settings.sqlalchemy_database_uri)
+    options = _engine_options(url)
+    options["connect_args"].update(overrides.pop("connect_args", {}))
+    options.update(overrides)
+    engine = create_engine(url, **options)
+    instrument_engine(engine, name=name)
+    instrument_queries(engine)
+    return engine
+
+
+def async_database_url(url: Optional[str] = None) -> URL:
+    """The database URL with the backend's asyncio driver"""
+    url = make_url(url or settings.sqlalchemy_database_uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for '{backend}' databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def create_async_db_engine(
+    url: Optional[str] = None, name: str = "primary-async", **overrides: Any
+) -> AsyncEngine:
+    """Async counterpart of create_db_engine, for the same database by default"""
+    url = async_database_url(url)
+    options = _engine_options(url, is_async=True)
+    options["connect_args"].update(overrides.pop("connect_args", {}))
+    options.update(overrides)
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine.sync_engine, name=name)
+    instrument_queries(engine.sync_engine)
+    return engine
+
 
 # Create SQLAlchemy engine
-engine = create_engine(settings.sqlalchemy_database_uri)
+engine = create_db_engine()
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replicas, see app.db.replicas
+read_router = ReplicaRouter(
+    engine,
+    [
+        Replica(
+            name=replica.get("name", f"replica-{index}"),
+            engine=create_db_engine(replica["url"], name=replica.get("name", f"replica-{index}")),
+            weight=int(replica.get("weight", 1)),
+        )
+        for index, replica in enumerate(settings.DB_REPLICAS)
+    ],
+    max_lag=settings.DB_REPLICA_MAX_LAG,
+    check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+)
+
+# Set on responses to requests that committed through get_write_db; holds
+# the time until which the client's reads go to the primary
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+
+# The async engine is created on first use, so processes that never use it
+# do not need the asyncio driver installed
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_db_engine()
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Open an AsyncSession on the application's async engine"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        # Objects stay readable after commit without an implicit (awaitable) refresh
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory()
+
+
+async def dispose_async_engine() -> None:
+    """Close the async engine's connections, on shutdown"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_session_factory = None
+
+
 # Create Base class for declarative models
 Base = declarative_base()
 
@@ -20,3 +151,57 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _start_read_your_writes(session: Session) -> None:
+    request: Optional[Request] = session.info.get("request")
+    if request is None or settings.DB_READ_YOUR_WRITES_WINDOW <= 0:
+        return
+    window = settings.DB_READ_YOUR_WRITES_WINDOW
+    request.state.db_wrote = True
+    session.info["response"].set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        f"{time.time() + window:.3f}",
+        max_age=max(1, int(window)),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def _reads_own_writes(request: Request) -> bool:
+    """Whether this client wrote within DB_READ_YOUR_WRITES_WINDOW"""
+    if getattr(request.state, "db_wrote", False):
+        return True
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+# Dependency for routes that write: a primary session whose commits send the
+# client's reads to the primary for DB_READ_YOUR_WRITES_WINDOW seconds
+def get_write_db(request: Request, response: Response) -> Iterator[Session]:
+    db = SessionLocal()
+    db.info.update(request=request, response=response)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dependency for read-only routes: a session on a replica within the lag
+# limit, or on the primary if there is none or the client just wrote.
+# Meant for report routes, e.g. over AnalyticsRepository.get_analytics_report
+def get_read_db(request: Request) -> Iterator[Session]:
+    db = SessionLocal(bind=read_router.choose(use_primary=_reads_own_writes(request)))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dependency to get an async database session, for async def endpoints
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
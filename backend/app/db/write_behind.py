@@ -0,0 +1,377 @@
+"""
+Write-behind buffer for append-only rows: analytics events, voice
+interactions and user sessions.
+
+Rows are accepted into a bounded in-memory queue and written by a worker
+thread in bulk, every ``flush_interval`` seconds or as soon as
+``flush_rows`` are waiting, so the request that produced them does not wait
+on the database. A full buffer raises BufferFull, answered with 429.
+
+When a flush fails for any reason other than the database rejecting a row,
+the worker backs off exponentially, ``retry_backoff`` seconds doubling per
+consecutive failure. Without a spill directory the rows go back to the head
+of the queue; once ``max_retries`` consecutive writes have failed, the rows
+of a failed flush are dropped.
+
+With a spill directory every accepted row is first appended to this
+process's journal segment (one JSON line). A segment is deleted once its
+rows are committed. If the flush fails, the segment stays behind as a spill
+file. Spill files, and the segments of processes that crashed, are replayed
+at startup and by the worker on every interval. Rows are delivered at least
+once: a crash between the commit and deleting the segment writes that
+flush's rows again. The journal survives a process crash, not a host crash,
+as it is not fsynced.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from itertools import count
+from typing import IO, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import DateTime, Table, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.cache_invalidation import invalidate_cache_tags
+from app.core.config import settings
+from app.core.metrics import WRITE_BEHIND_DEPTH, WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_ROWS
+from app.models.analytics import AnalyticsEvent, UserSession, VoiceInteraction
+
+logger = logging.getLogger(__name__)
+
+# Kind of row -> table it is inserted into and cache tag invalidated after a flush
+TABLES: Dict[str, Tuple[Table, str]] = {
+    "analytics_event": (AnalyticsEvent.__table__, "analytics_events"),
+    "voice_interaction": (VoiceInteraction.__table__, "voice_interactions"),
+    "user_session": (UserSession.__table__, "user_sessions"),
+}
+
+Item = Tuple[str, Dict[str, Any]]
+
+
+class BufferFull(Exception):
+    """Raised when the write-behind buffer holds max_rows rows"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"write-behind buffer full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def decode_item(line: str) -> Item:
+    """A journal line back into (kind, row), with datetime columns parsed"""
+    record = json.loads(line)
+    kind, row = record["kind"], record["row"]
+    table, _ = TABLES[kind]
+    for column in table.columns:
+        if isinstance(column.type, DateTime) and isinstance(row.get(column.name), str):
+            row[column.name] = datetime.fromisoformat(row[column.name])
+    return kind, row
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_rows: int = 10_000,
+        flush_rows: int = 500,
+        flush_interval: float = 0.2,
+        spill_dir: Optional[str] = None,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir or None
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # Consecutive failed writes, and when the worker may write again
+        self._failures = 0
+        self._retry_at = 0.0
+        self._queue: Deque[Item] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Serializes flushes of the worker, flush() and shutdown()
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._journal: Optional[IO[str]] = None
+        self._segments = count()
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(self, kind: str, row: Dict[str, Any]) -> None:
+        """Accept a row for ``kind``'s table, raising BufferFull when the buffer is full"""
+        if kind not in TABLES:
+            raise ValueError(f"Unknown write-behind kind '{kind}'")
+        with self._lock:
+            if len(self._queue) >= self.max_rows:
+                WRITE_BEHIND_ROWS.labels("rejected").inc()
+                raise BufferFull(retry_after=max(1, round(self.flush_interval)))
+            if self.spill_dir:
+                self._append_to_journal(kind, row)
+            self._queue.append((kind, row))
+            WRITE_BEHIND_DEPTH.inc()
+            self._start()
+            # Once per crossing, so a worker backing off is not woken per row
+            if len(self._queue) == self.flush_rows:
+                self._wakeup.notify()
+
+    def _append_to_journal(self, kind: str, row: Dict[str, Any]) -> None:
+        if self._journal is None:
+            path = os.path.join(self.spill_dir, f"{os.getpid()}-{time.time_ns()}-{next(self._segments)}.ndjson")
+            self._journal = open(path, "a", encoding="utf-8")
+            # Held while the segment is live, so replay skips it
+            fcntl.flock(self._journal, fcntl.LOCK_EX)
+        self._journal.write(json.dumps({"kind": kind, "row": row}, default=_encode) + "\n")
+        # Into the OS page cache, so the row survives a crash of this process
+        self._journal.flush()
+
+    def _start(self) -> None:
+        """Start the worker thread, with the lock held"""
+        if self._thread is None and not self._stopping:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def start(self) -> None:
+        """Start the worker before the first row, so it replays spill files"""
+        with self._lock:
+            self._start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._stopping:
+                    backoff = self._retry_at - time.monotonic()
+                    if backoff > 0:
+                        self._wakeup.wait(backoff)
+                    elif len(self._queue) < self.flush_rows:
+                        self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            if not stopping and time.monotonic() < self._retry_at:
+                continue
+            self.flush()
+            if stopping:
+                return
+            if self.spill_dir and time.monotonic() >= self._retry_at:
+                self.replay()
+
+    def _succeeded(self) -> None:
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _failed(self) -> None:
+        """Back off before the next write, doubling per consecutive failure"""
+        self._failures += 1
+        delay = self.retry_backoff * 2 ** (min(self._failures, self.max_retries) - 1)
+        self._retry_at = time.monotonic() + delay
+
+    def flush(self) -> None:
+        """Write everything accepted so far, from the calling thread"""
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._queue)
+                self._queue.clear()
+                journal, self._journal = self._journal, None
+            if not items:
+                return
+
+            started = time.perf_counter()
+            try:
+                self._write(items)
+            except Exception as exc:
+                self._failed()
+                if journal is not None:
+                    # The segment stays behind as a spill file
+                    journal.close()
+                    WRITE_BEHIND_DEPTH.dec(len(items))
+                    WRITE_BEHIND_ROWS.labels("spilled").inc(len(items))
+                    logger.error("Write-behind flush of %d rows failed, kept in %s: %s", len(items), journal.name, exc)
+                elif self._failures <= self.max_retries:
+                    with self._lock:
+                        self._queue.extendleft(reversed(items))
+                    logger.warning(
+                        "Write-behind flush of %d rows failed (attempt %d), retrying: %s",
+                        len(items), self._failures, exc,
+                    )
+                else:
+                    WRITE_BEHIND_DEPTH.dec(len(items))
+                    WRITE_BEHIND_ROWS.labels("dropped").inc(len(items))
+                    logger.error(
+                        "Write-behind flush of %d rows failed %d times, rows lost: %s",
+                        len(items), self._failures, exc,
+                    )
+                return
+            finally:
+                WRITE_BEHIND_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+            self._succeeded()
+            WRITE_BEHIND_DEPTH.dec(len(items))
+            if journal is not None:
+                os.unlink(journal.name)
+                journal.close()
+
+    def _write(self, items: List[Item]) -> None:
+        """
+        Insert the items, one executemany per table in one transaction. If
+        the database rejects a row, the rows are inserted one at a time and
+        the rejected ones are dropped.
+        """
+        rows_by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        for kind, row in items:
+            rows_by_kind.setdefault(kind, []).append(row)
+
+        db = self.session_factory()
+        try:
+            try:
+                for kind, rows in rows_by_kind.items():
+                    db.execute(insert(TABLES[kind][0]), rows)
+                db.commit()
+                written = len(items)
+            except (IntegrityError, DataError):
+                db.rollback()
+                written = 0
+                for kind, row in items:
+                    try:
+                        db.execute(insert(TABLES[kind][0]), row)
+                        db.commit()
+                        written += 1
+                    except (IntegrityError, DataError) as exc:
+                        db.rollback()
+                        WRITE_BEHIND_ROWS.labels("dropped").inc()
+                        logger.warning("Write-behind row for %s rejected by the database: %s", kind, exc)
+        finally:
+            db.close()
+
+        WRITE_BEHIND_ROWS.labels("written").inc(written)
+        invalidate_cache_tags(*(TABLES[kind][1] for kind in rows_by_kind))
+
+    def replay(self) -> int:
+        """
+        Write the rows of spill files and of segments left by dead processes,
+        deleting each file once written. Segments of running processes are
+        locked and skipped. Returns the number of rows replayed.
+        """
+        if not self.spill_dir:
+            return 0
+        replayed = 0
+        for name in sorted(os.listdir(self.spill_dir)):
+            path = os.path.join(self.spill_dir, name)
+            if not name.endswith(".ndjson"):
+                continue
+            with open(path, "r", encoding="utf-8") as segment:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    if os.stat(path).st_ino != os.fstat(segment.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    # Replayed by another process in the meantime
+                    continue
+                items = []
+                for line in segment:
+                    try:
+                        items.append(decode_item(line))
+                    except (ValueError, KeyError):
+                        # A line torn by a crash mid-write
+                        WRITE_BEHIND_ROWS.labels("dropped").inc()
+                if items:
+                    try:
+                        self._write(items)
+                    except Exception as exc:
+                        self._failed()
+                        logger.error("Replaying write-behind file %s failed: %s", path, exc)
+                        break
+                    self._succeeded()
+                os.unlink(path)
+            replayed += len(items)
+        if replayed:
+            WRITE_BEHIND_ROWS.labels("replayed").inc(replayed)
+            logger.info("Replayed %d write-behind rows", replayed)
+        return replayed
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Stop the worker after a final flush"""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        with self._lock:
+            # Requeued by a failed final flush: nothing is left to retry them
+            lost = len(self._queue)
+            self._queue.clear()
+        if lost:
+            WRITE_BEHIND_DEPTH.dec(lost)
+            WRITE_BEHIND_ROWS.labels("dropped").inc(lost)
+            logger.error("Write-behind buffer stopped with %d unwritten rows", lost)
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind_buffer() -> WriteBehindBuffer:
+    """Get or create the process-wide write-behind buffer"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                from app.db.session import SessionLocal
+
+                _buffer = WriteBehindBuffer(
+                    SessionLocal,
+                    max_rows=settings.WRITE_BEHIND_MAX_ROWS,
+                    flush_rows=settings.WRITE_BEHIND_FLUSH_ROWS,
+                    flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000,
+                    spill_dir=settings.WRITE_BEHIND_SPILL_DIR,
+                    max_retries=settings.WRITE_BEHIND_MAX_RETRIES,
+                    retry_backoff=settings.WRITE_BEHIND_RETRY_BACKOFF_MS / 1000,
+                )
+    return _buffer
+
+
+def _replay_and_start() -> None:
+    buffer = get_write_behind_buffer()
+    buffer.replay()
+    # Retries what could not be replayed yet, on every interval
+    buffer.start()
+
+
+async def replay_write_behind() -> None:
+    """Write rows left in spill files by earlier processes, at startup"""
+    if settings.WRITE_BEHIND_SPILL_DIR:
+        await run_in_threadpool(_replay_and_start)
+
+
+async def shutdown_write_behind_buffer() -> None:
+    """
+    Flush and stop the write-behind buffer. The flush runs in the threadpool:
+    its cache invalidations are scheduled on the event loop, which must not be
+    blocked while the worker is joined.
+    """
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        await run_in_threadpool(buffer.shutdown)
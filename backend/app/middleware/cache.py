@@ -1,179 +1,862 @@
-import os
-import json
-import hashlib
+"""
+Two-tier cache for GET responses.
+
+Responses are kept in a byte-size bounded in-process LRU in front of an
+optional Redis tier shared by all workers. The middleware honours
+Cache-Control, answers conditional requests with 304, serves stale entries
+while revalidating them in the background, and never buffers responses
+larger than CACHE_MAX_ENTRY_BYTES: those are streamed straight through.
+"""
 import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
 from functools import wraps
-from typing import Callable, Optional, Dict, Any, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
 from fastapi import Request, Response
-import aioredis
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache_invalidation import set_cache_invalidator
 from app.core.config import settings
+from app.core.metrics import CACHE_RESPONSES
+from app.core.singleflight import FlightAbandoned, SingleFlight
+from app.middleware.cache_keys import DEFAULT_VARY, build_cache_key
+from app.middleware.rate_limit_policies import PolicyTable
+
+logger = logging.getLogger(__name__)
+
+# Response headers that are never stored with a cached entry
+UNCACHED_HEADERS = frozenset([
+    b"connection", b"keep-alive", b"transfer-encoding", b"set-cookie",
+    b"x-cache", b"age", b"x-request-id", b"x-process-time", b"x-cache-tags",
+])
+
+# Response header handlers use to attach invalidation tags to an entry
+CACHE_TAGS_HEADER = b"x-cache-tags"
+
+# Request headers carrying credentials: responses to them are only cached on
+# routes whose key varies on that header
+CREDENTIAL_HEADERS = ("authorization", "cookie")
+
+
+@dataclass
+class CachedResponse:
+    """A stored response and its freshness information"""
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    stored_at: float
+    ttl: float
+    stale_while_revalidate: float = 0.0
+    tags: Tuple[str, ...] = ()
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.stored_at + self.ttl
+
+    def is_usable(self, now: float) -> bool:
+        """Fresh, or stale but still inside the stale-while-revalidate window."""
+        return now < self.stored_at + self.ttl + self.stale_while_revalidate
+
+    def to_bytes(self) -> bytes:
+        meta = {
+            "s": self.status_code,
+            "h": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in self.headers],
+            "e": self.etag,
+            "t": self.stored_at,
+            "ttl": self.ttl,
+            "swr": self.stale_while_revalidate,
+            "g": list(self.tags),
+        }
+        return json.dumps(meta, separators=(",", ":")).encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        meta, _, body = data.partition(b"\n")
+        meta = json.loads(meta)
+        return cls(
+            status_code=meta["s"],
+            headers=[(k.encode("latin-1"), v.encode("latin-1")) for k, v in meta["h"]],
+            body=body,
+            etag=meta["e"],
+            stored_at=meta["t"],
+            ttl=meta["ttl"],
+            stale_while_revalidate=meta["swr"],
+            tags=tuple(meta.get("g", ())),
+        )
+
+
+class LRUCacheTier:
+    """In-process LRU bounded by the total size of stored entries, indexed by tag"""
 
-# Redis connection
-redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-redis_pool = None
-
-async def get_redis_pool():
-    """Get or create Redis connection pool"""
-    global redis_pool
-    if redis_pool is None:
-        redis_pool = await aioredis.create_redis_pool(redis_url)
-    return redis_pool
-
-async def close_redis_pool():
-    """Close Redis connection pool"""
-    global redis_pool
-    if redis_pool is not None:
-        redis_pool.close()
-        await redis_pool.wait_closed()
-        redis_pool = None
-
-def generate_cache_key(request: Request, prefix: str = "api-cache") -> str:
-    """Generate a unique cache key based on request parameters"""
-    # Create a unique cache key based on:
-    # 1. Full URL path
-    # 2. Query parameters
-    # 3. Request body (if available)
-    key_parts = [request.url.path]
-    
-    # Add query parameters
-    if request.query_params:
-        key_parts.append(str(request.query_params))
-    
-    # Add request body if available and not too large
-    if hasattr(request, "body") and request.body:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        if entry.size > self.max_bytes:
+            return
+        self.delete(key)
+        self._entries[key] = entry
+        self.current_bytes += entry.size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.current_bytes > self.max_bytes:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._forget(evicted_key, evicted)
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._forget(key, entry)
+
+    def _forget(self, key: str, entry: CachedResponse) -> None:
+        self.current_bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Delete every entry carrying any of the tags. Returns the number deleted."""
+        deleted = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self.delete(key)
+                deleted += 1
+        return deleted
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.current_bytes = 0
+
+
+# Delete a fill lock only if it is still held by the caller
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# Store an entry and add its key to the set of every tag it carries
+SET_WITH_TAGS_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for i = 2, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    if redis.call('TTL', KEYS[i]) < tonumber(ARGV[2]) then
+        redis.call('EXPIRE', KEYS[i], ARGV[2])
+    end
+end
+return 1
+"""
+
+# Delete every entry whose key is in one of the tag sets, then the sets,
+# and tell every worker to drop the tags from its local tier
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = 0
+for i = 1, #KEYS do
+    local members = redis.call('SMEMBERS', KEYS[i])
+    for j = 1, #members do
+        deleted = deleted + redis.call('DEL', members[j])
+    end
+    redis.call('DEL', KEYS[i])
+end
+redis.call('PUBLISH', ARGV[1], ARGV[2])
+return deleted
+"""
+
+
+class RedisCacheTier:
+    """
+    Cache tier shared across workers through a Redis-protocol server.
+
+    Errors and timeouts are treated as misses, and the tier is skipped for
+    ``retry_interval`` seconds after a failure. Tag invalidations are
+    published on ``channel`` so every worker can clear its local tier.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "api-cache",
+        timeout: float = 0.05,
+        retry_interval: float = 5.0,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.channel = f"{prefix}:invalidations"
+        self._down_until = 0.0
+        self._release_lock = client.register_script(RELEASE_LOCK_SCRIPT)
+        self._set_with_tags = client.register_script(SET_WITH_TAGS_SCRIPT)
+        self._invalidate_tags = client.register_script(INVALIDATE_TAGS_SCRIPT)
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    async def _call(self, coro) -> Any:
         try:
-            # Only include body for smaller payloads
-            if len(request.body) < 1024:  # 1KB limit
-                key_parts.append(request.body.decode())
-        except:
-            pass
-    
-    # Create MD5 hash of the combined string
-    key_string = "".join(key_parts)
-    key_hash = hashlib.md5(key_string.encode()).hexdigest()
-    
-    return f"{prefix}:{key_hash}"
-
-async def cache_response(
-    request: Request,
-    response: Response,
-    ttl: int = 300,  # Default TTL: 5 minutes
-    prefix: str = "api-cache"
+            return await asyncio.wait_for(coro, timeout=self.timeout)
+        except Exception as e:
+            self._down_until = time.monotonic() + self.retry_interval
+            logger.warning("Response cache store unreachable: %s: %s", type(e).__name__, e)
+            return None
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if not self.available:
+            return None
+        data = await self._call(self.client.get(f"{self.prefix}:{key}"))
+        if data is None:
+            return None
+        try:
+            return CachedResponse.from_bytes(data)
+        except (ValueError, KeyError) as e:
+            logger.warning("Discarding unreadable cache entry %s: %s", key, e)
+            return None
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        if not self.available:
+            return
+        expire = max(1, int(entry.ttl + entry.stale_while_revalidate + 0.999))
+        if not entry.tags:
+            await self._call(self.client.set(f"{self.prefix}:{key}", entry.to_bytes(), ex=expire))
+            return
+        await self._call(self._set_with_tags(
+            keys=[f"{self.prefix}:{key}"] + [f"{self.prefix}:tag:{tag}" for tag in entry.tags],
+            args=[entry.to_bytes(), expire],
+        ))
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tags = list(tags)
+        if self.available:
+            await self._call(self._invalidate_tags(
+                keys=[f"{self.prefix}:tag:{tag}" for tag in tags],
+                args=[self.channel, json.dumps(tags)],
+            ))
+
+    async def listen_for_invalidations(
+        self, on_tags: Callable[[List[str]], None], on_subscribed: Callable[[], None]
+    ) -> None:
+        """
+        Call ``on_tags`` with the tags of every invalidation published by any
+        worker, resubscribing after errors. ``on_subscribed`` runs on every
+        (re)subscription: invalidations published while unsubscribed are lost.
+        """
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                on_subscribed()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        on_tags(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation channel lost: %s: %s", type(e).__name__, e)
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(self.retry_interval)
+
+    async def delete(self, key: str) -> None:
+        if self.available:
+            await self._call(self.client.delete(f"{self.prefix}:{key}"))
+
+    async def acquire_lock(self, key: str, token: str, ttl: float) -> bool:
+        """Try to become the only process filling a key."""
+        if not self.available:
+            return True
+        acquired = await self._call(
+            self.client.set(f"{self.prefix}:lock:{key}", token, nx=True, px=int(ttl * 1000))
+        )
+        # Fill locally if the shared store cannot arbitrate
+        return bool(acquired) or not self.available
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if self.available:
+            await self._call(self._release_lock(keys=[f"{self.prefix}:lock:{key}"], args=[token]))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class ResponseCache:
+    """In-process LRU tier in front of an optional shared tier"""
+
+    def __init__(self, local: LRUCacheTier, shared: Optional[RedisCacheTier] = None):
+        self.local = local
+        self.shared = shared
+        # Event loop the cache is used from, for invalidations from other threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Applies other workers' invalidations to the local tier
+        self._listener: Optional[asyncio.Task] = None
+        self.subscribed = False
+
+    def _attach(self) -> None:
+        """Remember the running loop and listen for invalidations on it"""
+        self._loop = asyncio.get_running_loop()
+        if self.shared is not None and (self._listener is None or self._listener.done()):
+            self._listener = self._loop.create_task(
+                self.shared.listen_for_invalidations(self.local.invalidate_tags, self._on_subscribed)
+            )
+
+    def _on_subscribed(self) -> None:
+        # Invalidations may have been missed while unsubscribed
+        self.local.clear()
+        self.subscribed = True
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        self._attach()
+        entry = self.local.get(key)
+        if self.shared is None or (entry is not None and entry.is_fresh(time.time())):
+            return entry
+        # Another worker may already have refreshed a stale local entry
+        shared_entry = await self.shared.get(key)
+        if shared_entry is not None:
+            self.local.set(key, shared_entry)
+            return shared_entry
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        self._attach()
+        self.local.set(key, entry)
+        if self.shared is not None:
+            await self.shared.set(key, entry)
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        """
+        Delete every entry carrying any of the tags from both tiers. Other
+        workers drop them from their local tiers when the shared tier
+        publishes the invalidation.
+        """
+        tags = list(tags)
+        self.local.invalidate_tags(tags)
+        if self.shared is not None:
+            await self.shared.invalidate_tags(tags)
+
+    def invalidate(self, *tags: str, timeout: float = 1.0) -> None:
+        """
+        Invalidate tags from synchronous code, such as repository write paths.
+
+        From the cache's event loop the local tier is cleared immediately
+        and the shared tier in the background. From worker threads the call
+        waits up to ``timeout`` for the loop to apply it.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self.local.invalidate_tags(tags)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.local.invalidate_tags(tags)
+            if self.shared is not None:
+                task = loop.create_task(self.shared.invalidate_tags(tags))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+            return
+        future = asyncio.run_coroutine_threadsafe(self.invalidate_tags(tags), loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.warning("Cache invalidation of %s did not complete: %s", tags, e)
+
+    async def wait_for_fill(
+        self, key: str, token: str, lock_ttl: float, poll_interval: float = 0.05
+    ) -> Optional[CachedResponse]:
+        """
+        Coordinate a cache fill with other processes.
+
+        Returns None once the caller holds the fill lock and should compute
+        the response, or the entry another process stored meanwhile.
+        """
+        if self.shared is None:
+            return None
+        deadline = time.monotonic() + lock_ttl
+        while not await self.shared.acquire_lock(key, token, lock_ttl):
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(poll_interval)
+            entry = await self.shared.get(key)
+            if entry is not None and entry.is_fresh(time.time()):
+                self.local.set(key, entry)
+                return entry
+        return None
+
+    async def release_fill(self, key: str, token: str) -> None:
+        if self.shared is not None:
+            await self.shared.release_lock(key, token)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self.shared is not None:
+            await self.shared.close()
+
+
+_response_cache: Optional[ResponseCache] = None
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the response cache configured in settings"""
+    global _response_cache
+    if _response_cache is None:
+        shared = None
+        if settings.CACHE_BACKEND == "redis":
+            import redis.asyncio as redis
+
+            shared = RedisCacheTier(
+                redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_connect_timeout=settings.CACHE_STORE_TIMEOUT,
+                    socket_timeout=settings.CACHE_STORE_TIMEOUT,
+                ),
+                timeout=settings.CACHE_STORE_TIMEOUT,
+            )
+        _response_cache = ResponseCache(LRUCacheTier(settings.CACHE_MAX_BYTES), shared)
+        # Repository writes invalidate through app.core.cache_invalidation
+        set_cache_invalidator(_response_cache.invalidate)
+    return _response_cache
+
+
+async def close_response_cache() -> None:
+    """Close the response cache's shared tier"""
+    global _response_cache
+    if _response_cache is not None:
+        set_cache_invalidator(None)
+        await _response_cache.close()
+        _response_cache = None
+
+
+def generate_cache_key(
+    request: Request, prefix: str = "api-cache", vary: Iterable[str] = ()
+) -> str:
+    """Generate a cache key from the path, canonical query and varied headers"""
+    return build_cache_key(request.scope, vary=vary, prefix=prefix)
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse a Cache-Control header into a dict of lower-cased directives"""
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in candidates
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """Caching behaviour for every GET path under a prefix"""
+    prefix: str
+    # Seconds a response stays fresh when it does not set max-age itself
+    ttl: int = 0
+    # Seconds a stale response may be served while it is refreshed
+    stale_while_revalidate: int = 0
+    # Never cache paths under this prefix
+    bypass: bool = False
+    # Request headers responses differ by, e.g. "authorization" for per-user responses
+    vary: Tuple[str, ...] = ()
+    # Invalidation tags attached to every entry stored for this prefix
+    tags: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        object.__setattr__(self, "vary", tuple(name.lower() for name in self.vary))
+        object.__setattr__(self, "tags", tuple(self.tags))
+
+
+def build_entry(
+    status_code: int,
+    raw_headers: Iterable[Tuple[bytes, bytes]],
+    chunks: List[bytes],
+    rule: CacheRule,
+) -> Optional[CachedResponse]:
+    """Build a cache entry from a captured response, or None if it may not be stored."""
+    if status_code != 200:
+        return None
+
+    headers = []
+    etag = None
+    cache_control = None
+    vary = None
+    tags = list(rule.tags)
+    for name, value in raw_headers:
+        name = name.lower()
+        if name == b"set-cookie":
+            return None
+        if name == b"cache-control":
+            cache_control = value.decode("latin-1")
+        elif name == b"etag":
+            etag = value.decode("latin-1")
+        elif name == b"vary":
+            vary = value.decode("latin-1")
+            continue
+        elif name == CACHE_TAGS_HEADER:
+            tags.extend(tag.strip() for tag in value.decode("latin-1").split(",") if tag.strip())
+        if name not in UNCACHED_HEADERS:
+            headers.append((name, value))
+
+    # The key only distinguishes the headers the rule varies on
+    keyed = set(DEFAULT_VARY).union(rule.vary)
+    if vary is not None:
+        varied = {name.strip().lower() for name in vary.split(",") if name.strip()}
+        if "*" in varied or not varied <= keyed:
+            return None
+    if rule.vary or vary is not None:
+        headers.append((b"vary", ", ".join(sorted(keyed)).encode("latin-1")))
+
+    directives = parse_cache_control(cache_control)
+    if "no-store" in directives or "no-cache" in directives:
+        return None
+    # Per-user responses may only be stored under keys that vary on the user
+    if "private" in directives and "authorization" not in rule.vary:
+        return None
+
+    ttl = rule.ttl
+    for directive in ("s-maxage", "max-age"):
+        if directives.get(directive):
+            try:
+                ttl = int(directives[directive])
+            except ValueError:
+                pass
+            break
+    if ttl <= 0:
+        return None
+
+    body = b"".join(chunks)
+    if etag is None:
+        etag = make_etag(body)
+        headers.append((b"etag", etag.encode("latin-1")))
+
+    return CachedResponse(
+        status_code=status_code,
+        headers=headers,
+        body=body,
+        etag=etag,
+        stored_at=time.time(),
+        ttl=ttl,
+        stale_while_revalidate=rule.stale_while_revalidate,
+        tags=tuple(dict.fromkeys(tags)),
+    )
+
+
+async def send_cached(
+    entry: CachedResponse,
+    send: Send,
+    cache_state: str,
+    if_none_match: Optional[str] = None,
+    now: Optional[float] = None,
 ) -> None:
-    """Store response in Redis cache"""
-    # Only cache successful responses
-    if response.status_code != 200:
-        return
-    
-    # Don't cache very large responses
-    response_body = b""
-    for chunk in response.body_iterator:
-        response_body += chunk
-    
-    if len(response_body) > 1024 * 100:  # 100KB limit
-        # Reset the response body
-        response.body = response_body
+    """Send a cached entry, or a 304 if the client already has it."""
+    now = time.time() if now is None else now
+    CACHE_RESPONSES.labels(cache_state).inc()
+    extra = [
+        (b"x-cache", cache_state.encode("latin-1")),
+        (b"age", str(max(0, int(now - entry.stored_at))).encode("latin-1")),
+    ]
+    if etag_matches(if_none_match, entry.etag):
+        headers = [
+            (k, v) for k, v in entry.headers
+            if k in (b"etag", b"cache-control", b"vary")
+        ]
+        await send({"type": "http.response.start", "status": 304, "headers": headers + extra})
+        await send({"type": "http.response.body", "body": b""})
         return
-    
-    # Generate cache key
-    cache_key = generate_cache_key(request, prefix)
-    
-    # Cache response with metadata
-    cache_data = {
-        "status_code": response.status_code,
-        "content_type": response.headers.get("content-type"),
-        "body": response_body.decode("utf-8") if response_body else "",
-    }
-    
-    # Store in Redis
-    pool = await get_redis_pool()
-    await pool.setex(cache_key, ttl, json.dumps(cache_data))
-    
-    # Reset the response body
-    response.body = response_body
+
+    await send({
+        "type": "http.response.start",
+        "status": entry.status_code,
+        "headers": entry.headers + extra,
+    })
+    await send({"type": "http.response.body", "body": entry.body})
+
 
 class CacheMiddleware:
-    """Middleware for caching API responses in Redis"""
-    
-    def __init__(self, app: Any, ttl: int = 300):
+    """ASGI middleware caching GET responses in the two-tier response cache"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        ttl: Optional[int] = None,
+        rules: Optional[List[Dict[str, Any]]] = None,
+        cache: Optional[ResponseCache] = None,
+        max_entry_bytes: Optional[int] = None,
+        coalesce_timeout: Optional[float] = None,
+    ):
         self.app = app
-        self.ttl = ttl
-    
-    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
-        if scope["type"] != "http" or scope["method"] != "GET":
+        self.cache = cache or get_response_cache()
+        self.coalesce_timeout = (
+            settings.CACHE_COALESCE_TIMEOUT if coalesce_timeout is None else coalesce_timeout
+        )
+        self.flights = SingleFlight()
+        self.max_entry_bytes = max_entry_bytes or settings.CACHE_MAX_ENTRY_BYTES
+        default = CacheRule(
+            prefix="/",
+            ttl=settings.CACHE_DEFAULT_TTL if ttl is None else ttl,
+            stale_while_revalidate=settings.CACHE_STALE_WHILE_REVALIDATE,
+        )
+        if rules is None:
+            rules = settings.CACHE_RULES
+        self.rules = PolicyTable((CacheRule(**rule) for rule in rules), default=default)
+        self._revalidating: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
-            
-        # Create a request object from scope
-        request = Request(scope)
-        
-        # Continue with middleware logic
-        async def _call_next(request):
-            # Workaround: we need to create a new scope with the request
-            _receive = receive
-            response_sent = [False]
-            response_body = []
-            
-            async def _send(message):
-                if message["type"] == "http.response.start":
-                    response_sent[0] = True
-                elif message["type"] == "http.response.body":
-                    response_body.append(message.get("body", b""))
-                await send(message)
-            
-            # Call the next middleware/app
-            await self.app(scope, _receive, _send)
-            
-            # Construct a response for our cache logic
-            return Response(b"".join(response_body))
-            
-        # The rest of the caching logic from the original implementation
-        # would go here, using the wrapped _call_next and our adapted scope
-        
-        # For now, just pass through without caching to fix the error
-        await self.app(scope, receive, send)
-        # Skip caching for non-GET requests
-        if request.method != "GET":
-            return await call_next(request)
-        
-        # Generate cache key
-        cache_key = generate_cache_key(request)
-        
-        # Try to get from cache
-        pool = await get_redis_pool()
-        cached = await pool.get(cache_key)
-        
-        if cached:
+        if scope["method"] != "GET":
+            await self.app(scope, receive, _without_cache_tags(send))
+            return
+
+        rule = self.rules.match(scope["path"])
+        request_headers = Headers(scope=scope)
+        request_cache_control = parse_cache_control(request_headers.get("cache-control"))
+        if (
+            rule.bypass
+            or any(name in request_headers and name not in rule.vary for name in CREDENTIAL_HEADERS)
+            or "no-store" in request_cache_control
+        ):
+            await self.app(scope, receive, _without_cache_tags(send))
+            return
+
+        key = build_cache_key(scope, vary=rule.vary)
+        if_none_match = request_headers.get("if-none-match")
+        now = time.time()
+
+        if "no-cache" not in request_cache_control:
+            entry = await self.cache.get(key)
+            if entry is not None and entry.is_fresh(now):
+                await send_cached(entry, send, "HIT", if_none_match, now)
+                return
+            if entry is not None and entry.is_usable(now):
+                await send_cached(entry, send, "STALE", if_none_match, now)
+                self._revalidate(scope, key, rule)
+                return
+
+        await self._fetch_coalesced(scope, receive, send, key, rule, if_none_match)
+
+    async def _fetch_coalesced(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        key: str,
+        rule: CacheRule,
+        if_none_match: Optional[str],
+    ) -> None:
+        """
+        Fetch a missed key once per process; concurrent requests for the
+        same key wait for that response instead of running the handler.
+        """
+        async def fill() -> Optional[CachedResponse]:
+            token = uuid.uuid4().hex
+            entry = await self.cache.wait_for_fill(key, token, self.coalesce_timeout)
+            if entry is not None:
+                await send_cached(entry, send, "HIT", if_none_match)
+                return entry
             try:
-                # Parse cached response
-                cache_data = json.loads(cached)
-                
-                # Create response from cache
-                response = Response(
-                    content=cache_data["body"],
-                    status_code=cache_data["status_code"],
-                    media_type=cache_data["content_type"]
-                )
-                
-                # Add cache header
-                response.headers["X-Cache"] = "HIT"
-                return response
-                
-            except Exception as e:
-                # Log the error but continue with normal request
-                print(f"Cache retrieval error: {str(e)}")
-        
-        # Process the request normally
-        response = await call_next(request)
-        
-        # Cache the response (only if it's a successful response)
-        if response.status_code == 200:
-            asyncio.create_task(cache_response(request, response, self.ttl))
-            
-            # Mark as cache miss
-            response.headers["X-Cache"] = "MISS"
-        
-        return response
+                return await self._fetch(scope, receive, send, key, rule, if_none_match)
+            finally:
+                await self.cache.release_fill(key, token)
+
+        try:
+            entry, shared = await self.flights.do(key, fill, timeout=self.coalesce_timeout)
+        except (asyncio.TimeoutError, FlightAbandoned):
+            entry, shared = None, True
+
+        if not shared:
+            return
+        if entry is None:
+            # The shared response could not be cached; fetch our own
+            await self._fetch(scope, receive, send, key, rule, if_none_match)
+            return
+        await send_cached(entry, send, "HIT", if_none_match)
+
+    async def _fetch(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        key: str,
+        rule: CacheRule,
+        if_none_match: Optional[str],
+    ) -> Optional[CachedResponse]:
+        """
+        Run the app, holding the response only while it fits in a cache entry.
+        Returns the stored entry, if any.
+        """
+        start: Optional[Message] = None
+        chunks: Optional[List[bytes]] = []
+        size = 0
+        entry: Optional[CachedResponse] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, chunks, size, entry
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or chunks is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            # Keep references to the chunks and join them once at the end
+            chunks.append(body)
+            size += len(body)
+
+            if size > self.max_entry_bytes:
+                # Too large to cache: flush what we held and stream the rest
+                await send(_with_cache_header(start, b"BYPASS"))
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": more_body})
+                chunks = None
+                return
+            if more_body:
+                return
+
+            held, chunks = chunks, None
+            entry = build_entry(start["status"], start.get("headers", []), held, rule)
+            if entry is None:
+                await send(_with_cache_header(start, b"BYPASS"))
+                await send({"type": "http.response.body", "body": b"".join(held)})
+                return
+            await send_cached(entry, send, "MISS", if_none_match)
+
+        await self.app(scope, receive, send_wrapper)
+        if entry is not None:
+            await self.cache.set(key, entry)
+        return entry
+
+    def _revalidate(self, scope: Scope, key: str, rule: CacheRule) -> None:
+        """Refresh a stale entry in the background, once per key."""
+        if key in self._revalidating:
+            return
+        self._revalidating.add(key)
+        # In an empty context: the refresh must not inherit the triggering
+        # request's context variables, e.g. its RequestContext
+        task = contextvars.Context().run(asyncio.create_task, self._refresh(scope, key, rule))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, scope: Scope, key: str, rule: CacheRule) -> None:
+        headers = [
+            (k, v) for k, v in scope["headers"]
+            if k not in (b"if-none-match", b"if-modified-since", b"cache-control")
+        ]
+        refresh_scope = {**scope, "headers": headers, "state": dict(scope.get("state", {}))}
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def receive() -> Message:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(refresh_scope, receive, capture)
+            if sum(map(len, chunks)) <= self.max_entry_bytes:
+                entry = build_entry(start.get("status", 500), start.get("headers", []), chunks, rule)
+                if entry is not None:
+                    await self.cache.set(key, entry)
+        except Exception:
+            logger.exception("Failed to revalidate cached response for %s", scope["path"])
+        finally:
+            self._revalidating.discard(key)
+
+
+def _public_headers(raw_headers: Iterable[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Response headers without the internal cache tags header"""
+    return [(name, value) for name, value in raw_headers if name.lower() != CACHE_TAGS_HEADER]
+
+
+def _without_cache_tags(send: Send) -> Send:
+    async def wrapper(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": _public_headers(message.get("headers", []))}
+        await send(message)
+
+    return wrapper
+
+
+def _with_cache_header(start: Message, state: bytes) -> Message:
+    CACHE_RESPONSES.labels(state.decode("latin-1")).inc()
+    return {**start, "headers": _public_headers(start.get("headers", [])) + [(b"x-cache", state)]}
+
+
+async def capture_body(response: Response) -> bytes:
+    """Return a response's body, draining streaming responses once."""
+    if hasattr(response, "body"):
+        return response.body
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode(response.charset))
+    return b"".join(chunks)
+
+
+_decorator_flights = SingleFlight()
+
 
 def cached(ttl: int = 300):
     """Decorator for caching endpoint responses"""
@@ -182,60 +865,56 @@ def cached(ttl: int = 300):
         async def wrapper(*args, **kwargs):
             # Find request object
             request = None
-            for arg in args:
+            for arg in list(args) + list(kwargs.values()):
                 if isinstance(arg, Request):
                     request = arg
                     break
-            
-            if not request:
-                for _, value in kwargs.items():
-                    if isinstance(value, Request):
-                        request = value
-                        break
-            
+
             if not request or request.method != "GET":
                 # If no request found or not a GET, just execute the function
                 return await func(*args, **kwargs)
-            
-            # Generate cache key
+
+            cache = get_response_cache()
             cache_key = generate_cache_key(request)
-            
-            # Try to get from cache
-            pool = await get_redis_pool()
-            cached = await pool.get(cache_key)
-            
-            if cached:
-                try:
-                    # Parse cached response
-                    cache_data = json.loads(cached)
-                    
-                    # Create response from cache
-                    response = Response(
-                        content=cache_data["body"],
-                        status_code=cache_data["status_code"],
-                        media_type=cache_data["content_type"]
-                    )
-                    
-                    # Add cache header
-                    response.headers["X-Cache"] = "HIT"
+            entry = await cache.get(cache_key)
+            if entry is not None and entry.is_fresh(time.time()):
+                return _entry_response(entry, "HIT")
+
+            async def compute():
+                response = await func(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
                     return response
-                    
-                except Exception as e:
-                    # Log the error but continue with normal execution
-                    print(f"Cache retrieval error: {str(e)}")
-            
-            # Execute the function
-            response = await func(*args, **kwargs)
-            
-            # Cache the response if possible
-            if hasattr(response, "status_code") and response.status_code == 200:
-                asyncio.create_task(cache_response(request, response, ttl))
-                
-                # Mark as cache miss
-                response.headers["X-Cache"] = "MISS"
-            
-            return response
-        
+
+                body = await capture_body(response)
+                entry = build_entry(
+                    response.status_code, response.raw_headers, [body], CacheRule(prefix="", ttl=ttl)
+                )
+                if entry is None or len(body) > settings.CACHE_MAX_ENTRY_BYTES:
+                    headers = dict(response.headers)
+                    headers.pop("content-length", None)
+                    headers.pop(CACHE_TAGS_HEADER.decode("latin-1"), None)
+                    return Response(content=body, status_code=response.status_code, headers=headers)
+                await cache.set(cache_key, entry)
+                return entry
+
+            # Concurrent misses share a single execution of the endpoint
+            result, shared = await _decorator_flights.do(
+                cache_key, compute, timeout=settings.CACHE_COALESCE_TIMEOUT
+            )
+            if isinstance(result, CachedResponse):
+                return _entry_response(result, "HIT" if shared else "MISS")
+            if shared and isinstance(result, Response):
+                # Response objects cannot be sent twice
+                return await func(*args, **kwargs)
+            return result
+
         return wrapper
-    
+
     return decorator
+
+
+def _entry_response(entry: CachedResponse, cache_state: str) -> Response:
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in entry.headers}
+    headers.pop("content-length", None)
+    headers["X-Cache"] = cache_state
+    return Response(content=entry.body, status_code=entry.status_code, headers=headers)
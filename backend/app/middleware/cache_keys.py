@@ -0,0 +1,60 @@
+"""
+Cache key construction for the response cache.
+
+Keys are built from the path, the query string with its parameters sorted
+and re-encoded, and the values of the request headers a route varies on.
+Accept-Encoding is always part of the key so compressed and uncompressed
+bodies are never mixed.
+"""
+import hashlib
+from typing import Iterable
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.types import Scope
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - optional speedup
+    xxhash = None
+
+# Headers every cache key varies on
+DEFAULT_VARY = ("accept-encoding",)
+
+
+def fast_hash(data: bytes) -> str:
+    """128-bit non-cryptographic hash, falling back to blake2b without xxhash."""
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def canonical_query(query_string: bytes) -> str:
+    """Sort and re-encode query parameters so their order does not matter."""
+    if not query_string:
+        return ""
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    return urlencode(sorted(params))
+
+
+def normalize_header(name: str, value: str) -> str:
+    """Reduce header values that differ only in formatting to one form."""
+    if name in ("accept-encoding", "accept", "accept-language"):
+        return ",".join(sorted(token.strip().lower() for token in value.split(",") if token.strip()))
+    return value.strip()
+
+
+def build_cache_key(
+    scope: Scope, vary: Iterable[str] = (), prefix: str = "api-cache"
+) -> str:
+    """Build the cache key for a request, varying on the given header names."""
+    names = sorted(set(DEFAULT_VARY).union(name.lower() for name in vary))
+    request_headers = {}
+    for key, value in scope["headers"]:
+        name = key.decode("latin-1")
+        if name in names:
+            request_headers[name] = value.decode("latin-1")
+
+    parts = [scope["path"], canonical_query(scope.get("query_string", b""))]
+    for name in names:
+        parts.append(f"{name}={normalize_header(name, request_headers.get(name, ''))}")
+    return f"{prefix}:{fast_hash(chr(0).join(parts).encode())}"
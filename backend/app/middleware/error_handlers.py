@@ -3,6 +3,9 @@ from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
+from app.core.login_guard import LoginThrottled
+from app.core.password_hashing import PasswordHashingBusy
+from app.db.write_behind import BufferFull
 from app.schemas.base import HTTPError, HTTPValidationError
 
 logger = logging.getLogger(__name__)
@@ -14,7 +17,7 @@ def register_exception_handlers(app: FastAPI) -> None:
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
         """Handle validation errors."""
-        logger.error(f"Validation error: {exc.errors()}")
+        logger.error("Validation error: %s", exc.errors())
         return JSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             content=HTTPValidationError(detail=exc.errors()).dict(),
@@ -23,8 +26,7 @@ def register_exception_handlers(app: FastAPI) -> None:
     @app.exception_handler(SQLAlchemyError)
     async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
         """Handle database errors."""
-        error_msg = str(exc)
-        logger.error(f"Database error: {error_msg}")
+        logger.error("Database error: %s", exc)
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content=HTTPError(
@@ -33,11 +35,49 @@ def register_exception_handlers(app: FastAPI) -> None:
             ).dict(),
         )
     
+    @app.exception_handler(PasswordHashingBusy)
+    async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+        """Shed load when the password hashing pool is saturated."""
+        logger.warning("Password hashing saturated: %s", exc)
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=HTTPError(
+                detail="Authentication is temporarily overloaded, please retry",
+                code="password_hashing_busy"
+            ).dict(),
+            headers={"Retry-After": "1"},
+        )
+    
+    @app.exception_handler(LoginThrottled)
+    async def login_throttled_handler(request: Request, exc: LoginThrottled):
+        """Reject throttled logins without revealing whether the account exists."""
+        logger.warning("Login throttled: %s", exc)
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=HTTPError(
+                detail="Too many failed login attempts, please retry later",
+                code="login_throttled"
+            ).dict(),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    
+    @app.exception_handler(BufferFull)
+    async def write_behind_full_handler(request: Request, exc: BufferFull):
+        """Push back on writers while the write-behind buffer catches up."""
+        logger.warning("Write-behind buffer full: %s", exc)
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=HTTPError(
+                detail="Too many writes queued, please retry later",
+                code="write_behind_full"
+            ).dict(),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
         """Handle general exceptions."""
-        error_msg = str(exc)
-        logger.error(f"Unexpected error: {error_msg}")
+        logger.error("Unexpected error: %s", exc)
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content=HTTPError(
@@ -0,0 +1,385 @@
+"""
+Storage backends for rate limiter state.
+
+The in-process backend keeps state per worker. The Redis backend shares it
+across workers and pods, doing the GCRA check-and-increment in a single
+atomic round trip, and degrades to the in-process backend when the shared
+store is unreachable.
+
+Besides request rates, stores track failed attempts for the login guard: a
+GCRA over failures whose overflow locks the key with an exponential backoff.
+"""
+import asyncio
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LimiterStore(ABC):
+    """Interface for rate limiter storage backends"""
+
+    @abstractmethod
+    async def hit(
+        self, key: str, emission_interval: float, delay_tolerance: float
+    ) -> Tuple[bool, int]:
+        """
+        Apply one GCRA step for a key.
+        Returns a tuple of (is_rate_limited, retry_after).
+        """
+
+    @abstractmethod
+    async def blocked(self, key: str) -> int:
+        """Seconds until a locked key may try again, 0 if it is not locked."""
+
+    @abstractmethod
+    async def fail(
+        self,
+        key: str,
+        emission_interval: float,
+        delay_tolerance: float,
+        backoff: float,
+        max_backoff: float,
+    ) -> int:
+        """
+        Record a failed attempt for a key.
+        Failures leak out at one per ``emission_interval``. Once they fill
+        ``delay_tolerance`` the key is locked for ``backoff`` seconds, doubling
+        with every further failure up to ``max_backoff``, until the failures
+        have leaked out. Returns the lock duration, 0 if not locked.
+        """
+
+    @abstractmethod
+    async def clear(self, key: str) -> None:
+        """Forget the failures of a key."""
+
+    async def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+def _lock_duration(strikes: int, backoff: float, max_backoff: float) -> float:
+    return min(max_backoff, backoff * 2 ** strikes)
+
+
+class MemoryLimiterStore(LimiterStore):
+    """
+    In-process limiter store.
+
+    Each key is tracked by a single float, its theoretical arrival time
+    (TAT), in LRU order. Entries whose TAT is in the past carry no state and
+    are evicted lazily, and the number of tracked keys is hard capped.
+    """
+
+    def __init__(self, max_clients: int = 100_000):
+        self.max_clients = max_clients
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        # Failure state per key: (TAT, locked until, strikes)
+        self._failures: "OrderedDict[str, Tuple[float, float, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def gcra(
+        self,
+        key: str,
+        emission_interval: float,
+        delay_tolerance: float,
+        now: Optional[float] = None,
+    ) -> Tuple[bool, int]:
+        """Synchronous GCRA step, see LimiterStore.hit."""
+        if now is None:
+            now = time.monotonic()
+
+        tat = self._tat.get(key)
+        if tat is None or tat < now:
+            tat = now
+
+        new_tat = tat + emission_interval
+        allow_at = new_tat - delay_tolerance
+        if allow_at > now:
+            self._tat.move_to_end(key)
+            return True, math.ceil(allow_at - now)
+
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        self._evict(now)
+        return False, 0
+
+    async def hit(
+        self, key: str, emission_interval: float, delay_tolerance: float
+    ) -> Tuple[bool, int]:
+        return self.gcra(key, emission_interval, delay_tolerance)
+
+    def _evict(self, now: float) -> None:
+        """Drop idle keys from the LRU end and enforce the key cap."""
+        tat = self._tat
+        while tat:
+            key, oldest = next(iter(tat.items()))
+            if oldest <= now or len(tat) > self.max_clients:
+                tat.popitem(last=False)
+            else:
+                break
+
+    def blocked_for(self, key: str, now: Optional[float] = None) -> int:
+        """Synchronous lock check, see LimiterStore.blocked."""
+        if now is None:
+            now = time.monotonic()
+        state = self._failures.get(key)
+        if state is None or state[1] <= now:
+            return 0
+        return math.ceil(state[1] - now)
+
+    def record_failure(
+        self,
+        key: str,
+        emission_interval: float,
+        delay_tolerance: float,
+        backoff: float,
+        max_backoff: float,
+        now: Optional[float] = None,
+    ) -> int:
+        """Synchronous failure step, see LimiterStore.fail."""
+        if now is None:
+            now = time.monotonic()
+
+        tat, locked_until, strikes = self._failures.get(key, (now, 0.0, 0))
+        if tat < now:
+            # Every earlier failure has leaked out, start over
+            tat, strikes = now, 0
+        tat = min(tat + emission_interval, now + delay_tolerance)
+
+        lock = 0.0
+        # Half an interval of slack keeps float error from counting one short
+        if tat - now > delay_tolerance - emission_interval / 2:
+            lock = _lock_duration(strikes, backoff, max_backoff)
+            locked_until = now + lock
+            strikes += 1
+
+        self._failures[key] = (tat, locked_until, strikes)
+        self._failures.move_to_end(key)
+        self._evict_failures(now)
+        return math.ceil(lock)
+
+    async def blocked(self, key: str) -> int:
+        return self.blocked_for(key)
+
+    async def fail(
+        self,
+        key: str,
+        emission_interval: float,
+        delay_tolerance: float,
+        backoff: float,
+        max_backoff: float,
+    ) -> int:
+        return self.record_failure(key, emission_interval, delay_tolerance, backoff, max_backoff)
+
+    async def clear(self, key: str) -> None:
+        self._failures.pop(key, None)
+
+    def _evict_failures(self, now: float) -> None:
+        """Drop keys with no failures left and enforce the key cap."""
+        failures = self._failures
+        while failures:
+            key, (tat, locked_until, _) = next(iter(failures.items()))
+            if max(tat, locked_until) <= now or len(failures) > self.max_clients:
+                failures.popitem(last=False)
+            else:
+                break
+
+    def reset(self) -> None:
+        """Forget all tracked keys."""
+        self._tat.clear()
+        self._failures.clear()
+
+
+# GCRA step executed atomically on the Redis server. Uses the server clock so
+# that workers with skewed clocks agree on the TAT.
+GCRA_SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local delay_tolerance = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission_interval
+local allow_at = new_tat - delay_tolerance
+if allow_at > now then
+    return {1, math.ceil(allow_at - now)}
+end
+
+local ttl = math.ceil((new_tat - now) * 1000)
+redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', ttl)
+return {0, 0}
+"""
+
+
+# Failure step of the login guard, see LimiterStore.fail. State is a hash of
+# the failure TAT, the lock expiry and the number of locks so far.
+FAIL_SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local delay_tolerance = tonumber(ARGV[2])
+local backoff = tonumber(ARGV[3])
+local max_backoff = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tat', 'until', 'strikes')
+local tat = tonumber(state[1])
+local locked_until = tonumber(state[2]) or 0
+local strikes = tonumber(state[3]) or 0
+if not tat or tat < now then
+    tat = now
+    strikes = 0
+end
+tat = math.min(tat + emission_interval, now + delay_tolerance)
+
+local lock = 0
+if tat - now > delay_tolerance - emission_interval / 2 then
+    lock = math.min(max_backoff, backoff * 2 ^ strikes)
+    locked_until = now + lock
+    strikes = strikes + 1
+end
+
+redis.call('HSET', KEYS[1], 'tat', string.format('%.6f', tat),
+    'until', string.format('%.6f', locked_until), 'strikes', strikes)
+redis.call('PEXPIRE', KEYS[1], math.ceil((math.max(tat, locked_until) - now) * 1000))
+return math.ceil(lock)
+"""
+
+BLOCKED_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local locked_until = tonumber(redis.call('HGET', KEYS[1], 'until'))
+if not locked_until or locked_until <= now then
+    return 0
+end
+return math.ceil(locked_until - now)
+"""
+
+
+class RedisLimiterStore(LimiterStore):
+    """
+    Limiter store shared across workers through a Redis-protocol server.
+
+    Any client exposing redis-py's asyncio ``register_script`` API can be
+    used. When a call fails or exceeds ``timeout`` the store switches to its
+    local fallback for ``retry_interval`` seconds instead of waiting on the
+    shared store for every request.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        fallback: Optional[LimiterStore] = None,
+        prefix: str = "ratelimit",
+        timeout: float = 0.05,
+        retry_interval: float = 5.0,
+    ):
+        self.client = client
+        self.fallback = fallback or MemoryLimiterStore()
+        self.prefix = prefix
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._fail_script = client.register_script(FAIL_SCRIPT)
+        self._blocked_script = client.register_script(BLOCKED_SCRIPT)
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        """Whether the shared store is currently being used."""
+        return time.monotonic() >= self._down_until
+
+    async def _run(self, script: Any, key: str, args: List[Any]) -> Any:
+        """
+        Run a script for a key on the shared store.
+        Returns None when the store is unavailable, the caller then uses the fallback.
+        """
+        if not self.available:
+            return None
+
+        try:
+            return await asyncio.wait_for(
+                script(keys=[f"{self.prefix}:{key}"], args=args),
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            self._down_until = time.monotonic() + self.retry_interval
+            logger.warning(
+                "Rate limit store unreachable, using local limits for %ss: %s: %s",
+                self.retry_interval, type(e).__name__, e,
+            )
+            return None
+
+    async def hit(
+        self, key: str, emission_interval: float, delay_tolerance: float
+    ) -> Tuple[bool, int]:
+        result = await self._run(self._script, key, [emission_interval, delay_tolerance])
+        if result is None:
+            return await self.fallback.hit(key, emission_interval, delay_tolerance)
+        limited, retry_after = result
+        return bool(int(limited)), int(retry_after)
+
+    async def blocked(self, key: str) -> int:
+        result = await self._run(self._blocked_script, f"fail:{key}", [])
+        if result is None:
+            return await self.fallback.blocked(key)
+        return int(result)
+
+    async def fail(
+        self,
+        key: str,
+        emission_interval: float,
+        delay_tolerance: float,
+        backoff: float,
+        max_backoff: float,
+    ) -> int:
+        args = [emission_interval, delay_tolerance, backoff, max_backoff]
+        result = await self._run(self._fail_script, f"fail:{key}", args)
+        if result is None:
+            return await self.fallback.fail(key, *args)
+        return int(result)
+
+    async def clear(self, key: str) -> None:
+        if self.available:
+            try:
+                await asyncio.wait_for(
+                    self.client.delete(f"{self.prefix}:fail:{key}"), timeout=self.timeout
+                )
+            except Exception as e:
+                # Earlier failures keep counting until they leak out
+                logger.warning("Could not clear failures for %s: %s: %s", key, type(e).__name__, e)
+        await self.fallback.clear(key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_limiter_store(max_clients: int = 100_000) -> LimiterStore:
+    """Create the limiter store configured in settings."""
+    local = MemoryLimiterStore(max_clients=max_clients)
+    if settings.RATE_LIMIT_BACKEND != "redis":
+        return local
+
+    import redis.asyncio as redis
+
+    client = redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.RATE_LIMIT_STORE_TIMEOUT,
+        socket_timeout=settings.RATE_LIMIT_STORE_TIMEOUT,
+    )
+    return RedisLimiterStore(
+        client,
+        fallback=local,
+        timeout=settings.RATE_LIMIT_STORE_TIMEOUT,
+    )
@@ -1,71 +1,60 @@
-import time
 import logging
-import uuid
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.middleware.pipeline import RequestContext, get_request_pipeline
 
 logger = logging.getLogger(__name__)
 
+# Common endpoints that are not logged when they succeed
+QUIET_PATHS = frozenset(["/", "/api/v1/health/", "/metrics"])
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware for logging request and response details.
-    Adds a unique request ID to each request for traceability.
-    """
-    
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
-    
-    async def dispatch(self, request: Request, call_next):
-        # Generate unique request ID
-        request_id = str(uuid.uuid4())
-        
-        # Add request ID to request state
-        request.state.request_id = request_id
-        
-        # Start timer
-        start_time = time.time()
-        
-        # Log request details (skip for common endpoints that return 200)
-        if not (request.url.path in ["/", "/api/v1/health/"] and request.method == "GET"):
-            logger.info(
-                f"Request started: {request.method} {request.url.path} "
-                f"(ID: {request_id})"
-            )
-        
-        # Process request and get response
-        try:
-            response = await call_next(request)
-            
-            # Calculate processing time
-            process_time = time.time() - start_time
-            
-            # Add custom headers
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Process-Time"] = str(process_time)
-            
-            # Log response details (skip 200 OK responses, highlight errors)
-            if response.status_code != 200:
-                log_level = logger.error if response.status_code >= 500 else logger.info
-                log_level(
-                    f"Request completed: {request.method} {request.url.path} "
-                    f"- Status: {response.status_code} - Time: {process_time:.4f}s "
-                    f"(ID: {request_id})"
-                )
-            
-            return response
-        except Exception as e:
-            # Log exceptions
-            process_time = time.time() - start_time
-            logger.error(
-                f"Request failed: {request.method} {request.url.path} "
-                f"- Error: {str(e)} - Time: {process_time:.4f}s "
-                f"(ID: {request_id})"
-            )
-            raise
+
+def log_request_started(context: RequestContext) -> None:
+    """Log request details (skip for common endpoints)."""
+    if context.method == "GET" and context.path in QUIET_PATHS:
+        return
+    logger.info(
+        "Request started: %s %s (ID: %s)",
+        context.method, context.path, context.request_id,
+    )
+
+
+def log_request_completed(context: RequestContext) -> None:
+    """Log response details (skip 200 OK and sampled-out responses, highlight errors)."""
+    if context.sample_weight is None:
+        return
+    process_time = context.duration_ms / 1000
+    extra = {
+        "latency_ms": context.duration_ms,
+        "status_code": context.status_code,
+        "db_queries": context.db_queries,
+        "db_time_ms": round(context.db_time_ms, 3),
+        # Kept records stand for 1 / rate requests
+        "sample_weight": context.sample_weight,
+    }
+    if context.error is not None:
+        logger.error(
+            "Request failed: %s %s - Error: %s - Time: %.4fs (ID: %s)",
+            context.method, context.path, context.error, process_time, context.request_id,
+            extra=extra,
+        )
+    elif context.status_code != 200:
+        log_level = logger.error if context.status_code >= 500 else logger.info
+        log_level(
+            "Request completed: %s %s - Status: %s - Time: %.4fs (ID: %s)",
+            context.method, context.path, context.status_code, process_time,
+            context.request_id, extra=extra,
+        )
 
 
 def setup_logging(app: FastAPI) -> None:
-    """Set up request logging middleware."""
-    app.add_middleware(RequestLoggingMiddleware)
+    """
+    Set up request logging.
+    The request pipeline adds a unique request ID to each request for traceability.
+    """
+    pipeline = get_request_pipeline(app)
+    # With sampling, a request is only logged once its outcome is known
+    if settings.SAMPLING_RATE >= 1.0 and not settings.SAMPLING_RULES:
+        pipeline.on_request.append(log_request_started)
+    pipeline.on_response.append(log_request_completed)
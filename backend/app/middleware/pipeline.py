@@ -0,0 +1,172 @@
+"""
+Fused, pure-ASGI request pipeline.
+
+A single middleware assigns the request ID, times the request, applies rate
+limiting and runs telemetry hooks. It wraps ``send`` directly instead of
+going through Starlette's BaseHTTPMiddleware, so there is no extra task or
+memory stream per request and streaming responses pass through untouched.
+"""
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestContext:
+    """Per-request data shared by the pipeline and its hooks"""
+    request_id: str
+    method: str
+    path: str
+    scope: Scope = field(repr=False)
+    start_ns: int = 0
+    status_code: int = 0
+    duration_ms: float = 0.0
+    user_id: Optional[str] = None
+    error: Optional[BaseException] = None
+    # Path template of the matched route, set once the response is sent
+    route: Optional[str] = None
+    # Weight of a kept record, None when the sampler dropped the request
+    sample_weight: Optional[float] = 1.0
+    # SQL statements run for the request, see app.db.instrumentation
+    db_queries: int = 0
+    db_time_ms: float = 0.0
+    db_slowest_ms: float = 0.0
+    # Normalized, without parameters
+    db_slowest_statement: Optional[str] = None
+    db_statement_counts: Dict[str, int] = field(default_factory=dict, repr=False)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar(
+    "request_context", default=None
+)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    """Return the context of the request being handled, if any."""
+    return _request_context.get()
+
+
+# Label for requests that matched no route, so unknown paths cannot grow label sets
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(routes: List[BaseRoute], scope: Scope) -> str:
+    """Return the path template of the route handling a request."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Responses that never reached the router, e.g. cache hits or rejections
+    for candidate in routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return getattr(candidate, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+RequestHook = Callable[[RequestContext], None]
+ResponseHeaderHook = Callable[[RequestContext], List[tuple]]
+
+
+class RequestPipeline:
+    """Rate limiter and hooks run by RequestPipelineMiddleware"""
+
+    def __init__(self, routes: Optional[List[BaseRoute]] = None):
+        self.routes = routes if routes is not None else []
+        self.rate_limiter: Optional[Any] = None
+        # Decides after the response whether the request is logged, see app.middleware.sampling
+        self.sampler: Optional[Any] = None
+        # Called before the request is handled
+        self.on_request: List[RequestHook] = []
+        # Called once the response has been sent, or the request failed
+        self.on_response: List[RequestHook] = []
+        # Return extra raw headers to add to the response
+        self.response_headers: List[ResponseHeaderHook] = []
+
+
+class RequestPipelineMiddleware:
+    """Pure ASGI middleware running a RequestPipeline for every HTTP request"""
+
+    def __init__(self, app: ASGIApp, pipeline: RequestPipeline):
+        self.app = app
+        self.pipeline = pipeline
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pipeline = self.pipeline
+        request_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        context = RequestContext(
+            request_id=request_id,
+            method=scope["method"],
+            path=scope["path"],
+            scope=scope,
+            start_ns=time.perf_counter_ns(),
+        )
+        token = _request_context.set(context)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                context.status_code = message["status"]
+                process_time = (time.perf_counter_ns() - context.start_ns) / 1e9
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"x-process-time", str(process_time).encode("latin-1")))
+                for hook in pipeline.response_headers:
+                    headers.extend(hook(context))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            for hook in pipeline.on_request:
+                hook(context)
+
+            if pipeline.rate_limiter is not None:
+                rejection = await pipeline.rate_limiter.check(scope)
+                if rejection is not None:
+                    await rejection(scope, receive, send_wrapper)
+                    return
+
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            context.error = e
+            if not context.status_code:
+                context.status_code = 500
+            raise
+        finally:
+            context.duration_ms = (time.perf_counter_ns() - context.start_ns) / 1e6
+            user = scope["state"].get("user")
+            if user is not None:
+                user_id = user.get("id") if isinstance(user, dict) else getattr(user, "id", user)
+                context.user_id = str(user_id)
+            context.route = route_template(pipeline.routes, scope)
+            if pipeline.sampler is not None:
+                context.sample_weight = pipeline.sampler.decide(context)
+            for hook in pipeline.on_response:
+                try:
+                    hook(context)
+                except Exception:
+                    logger.exception("Request pipeline hook failed")
+            _request_context.reset(token)
+
+
+def get_request_pipeline(app: FastAPI) -> RequestPipeline:
+    """Return the app's request pipeline, installing its middleware on first use."""
+    pipeline = getattr(app.state, "request_pipeline", None)
+    if pipeline is None:
+        pipeline = RequestPipeline(app.router.routes)
+        app.state.request_pipeline = pipeline
+        app.add_middleware(RequestPipelineMiddleware, pipeline=pipeline)
+    return pipeline
@@ -0,0 +1,134 @@
+"""
+Per-route rate limit policies.
+
+A policy table maps route prefixes to a limit, a burst and the function used
+to identify the caller. The table is compiled once into a trie over path
+segments, so matching a request costs one dict lookup per path segment no
+matter how many rules are configured.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from jose import JWTError
+from starlette.requests import Request
+
+from app.core.auth import decode_access_token
+from app.core.config import settings
+
+
+def client_ip(request: Request) -> str:
+    """Identify the caller by source IP address."""
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def api_key(request: Request) -> str:
+    """Identify the caller by X-API-Key, falling back to the source IP."""
+    key = request.headers.get("X-API-Key")
+    if key:
+        return f"apikey:{key}"
+    return client_ip(request)
+
+
+def jwt_subject(request: Request) -> str:
+    """Identify the caller by the subject of a valid bearer token, falling back to the source IP."""
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            payload = decode_access_token(token)
+        except JWTError:
+            payload = {}
+        subject = payload.get("sub")
+        if subject:
+            return f"sub:{subject}"
+    return client_ip(request)
+
+
+KEY_FUNCTIONS: Dict[str, Callable[[Request], str]] = {
+    "ip": client_ip,
+    "api_key": api_key,
+    "jwt_sub": jwt_subject,
+}
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Rate limit applied to every path under a prefix. A limit of 0 disables limiting."""
+    prefix: str
+    limit: int
+    burst: Optional[int] = None
+    key: str = "ip"
+    period: int = 60
+    emission_interval: float = field(init=False, repr=False, compare=False)
+    delay_tolerance: float = field(init=False, repr=False, compare=False)
+    key_func: Callable[[Request], str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.key not in KEY_FUNCTIONS:
+            raise ValueError(
+                f"Unknown rate limit key '{self.key}' for '{self.prefix}', "
+                f"expected one of {sorted(KEY_FUNCTIONS)}"
+            )
+        emission_interval = self.period / self.limit if self.limit else 0.0
+        object.__setattr__(self, "emission_interval", emission_interval)
+        object.__setattr__(self, "delay_tolerance", emission_interval * (self.burst or self.limit))
+        object.__setattr__(self, "key_func", KEY_FUNCTIONS[self.key])
+
+    @property
+    def exempt(self) -> bool:
+        return self.limit <= 0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RateLimitPolicy":
+        return cls(**data)
+
+
+def _segments(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+class PolicyTable:
+    """Policies compiled into a trie keyed by path segment."""
+
+    def __init__(self, policies: Iterable[RateLimitPolicy], default: RateLimitPolicy):
+        self.default = default
+        self._root: Dict[str, Any] = {}
+        for policy in policies:
+            node = self._root
+            for segment in _segments(policy.prefix):
+                node = node.setdefault(segment, {})
+            # The policy for a node is stored under a key no segment can equal
+            node[None] = policy
+
+    def match(self, path: str) -> RateLimitPolicy:
+        """Return the policy with the longest prefix matching the path."""
+        node = self._root
+        policy = node.get(None, self.default)
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.get(segment)
+            if node is None:
+                break
+            policy = node.get(None, policy)
+        return policy
+
+
+def load_policy_table(
+    rate_limit_per_minute: Optional[int] = None,
+    policies: Optional[Iterable[Dict[str, Any]]] = None,
+) -> PolicyTable:
+    """Build the policy table from settings."""
+    default = RateLimitPolicy(
+        prefix="/",
+        limit=rate_limit_per_minute if rate_limit_per_minute is not None else settings.RATE_LIMIT_PER_MINUTE,
+        key=settings.RATE_LIMIT_DEFAULT_KEY,
+    )
+    if policies is None:
+        policies = settings.RATE_LIMIT_POLICIES
+    return PolicyTable(
+        (RateLimitPolicy.from_dict(policy) for policy in policies), default=default
+    )
@@ -1,42 +1,74 @@
-import time
-from typing import Dict, Tuple, Callable
+from typing import Any, Dict, List, Optional
 from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Receive, Scope, Send
 from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.core.metrics import RATE_LIMIT_REJECTIONS
+from app.middleware.limiter_store import (
+    LimiterStore,
+    MemoryLimiterStore,
+    create_limiter_store,
+)
+from app.middleware.pipeline import get_request_pipeline
+from app.middleware.rate_limit_policies import load_policy_table
 from app.schemas.base import HTTPError
 
 
-class RateLimiter(BaseHTTPMiddleware):
+class RateLimiter:
     """
-    Rate limiting middleware to prevent abuse of the API.
-    Uses a simple sliding window algorithm.
+    Rate limiting to prevent abuse of the API.
+    Applies the GCRA policy matching each request path.
+
+    Runs inside the request pipeline through ``check``, and can also be
+    mounted on its own as a pure ASGI middleware.
     """
-    
+
     def __init__(
         self,
-        app: ASGIApp,
+        app: Optional[ASGIApp] = None,
         rate_limit_per_minute: int = 60,
-        exclude_paths: list = None
+        exclude_paths: list = None,
+        max_clients: int = 100_000,
+        store: Optional[LimiterStore] = None,
+        policies: Optional[List[Dict[str, Any]]] = None,
     ):
-        super().__init__(app)
+        self.app = app
         self.rate_limit = rate_limit_per_minute
-        self.window_size = 60  # 1 minute in seconds
-        self.clients: Dict[str, list] = {}  # Store client request timestamps
-        self.exclude_paths = exclude_paths or ["/api/v1/health", "/docs", "/redoc", "/openapi.json"]
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Skip rate limiting for excluded paths
-        if any(request.url.path.startswith(path) for path in self.exclude_paths):
-            return await call_next(request)
-        
-        # Get client identifier (IP address or API key if available)
-        client_id = self._get_client_id(request)
-        
+        self.store = store or MemoryLimiterStore(max_clients=max_clients)
+        if exclude_paths is not None:
+            policies = list(policies or []) + [
+                {"prefix": path, "limit": 0} for path in exclude_paths
+            ]
+        self.policies = load_policy_table(rate_limit_per_minute, policies)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            rejection = await self.check(scope)
+            if rejection is not None:
+                await rejection(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    async def check(self, scope: Scope) -> Optional[Response]:
+        """Return a 429 response if the request is over its limit, else None."""
+        policy = self.policies.match(scope["path"])
+
+        # Skip rate limiting for exempt paths
+        if policy.exempt:
+            return None
+
+        # Get client identifier as configured for the policy
+        client_id = policy.key_func(Request(scope))
+
         # Check if client is rate limited
-        is_rate_limited, retry_after = self._is_rate_limited(client_id)
-        
+        is_rate_limited, retry_after = await self.store.hit(
+            f"{policy.prefix}|{client_id}",
+            policy.emission_interval,
+            policy.delay_tolerance,
+        )
+
         if is_rate_limited:
+            RATE_LIMIT_REJECTIONS.labels(policy.prefix).inc()
             return JSONResponse(
                 status_code=429,
                 content=HTTPError(
@@ -45,53 +77,22 @@ class RateLimiter(BaseHTTPMiddleware):
                 ).dict(),
                 headers={"Retry-After": str(retry_after)}
             )
-        
+
         # Client is not rate limited, proceed with the request
-        return await call_next(request)
-    
-    def _get_client_id(self, request: Request) -> str:
-        """Get a unique identifier for the client."""
-        # First try to get API key from header if authentication is used
-        api_key = request.headers.get("X-API-Key")
-        if api_key:
-            return f"apikey:{api_key}"
-        
-        # Otherwise use client IP address
-        forwarded = request.headers.get("X-Forwarded-For")
-        if forwarded:
-            return forwarded.split(",")[0].strip()
-        
-        return request.client.host
-    
-    def _is_rate_limited(self, client_id: str) -> Tuple[bool, int]:
-        """
-        Check if a client is rate limited.
-        Returns a tuple of (is_rate_limited, retry_after).
-        """
-        current_time = time.time()
-        
-        # Initialize client record if it doesn't exist
-        if client_id not in self.clients:
-            self.clients[client_id] = []
-        
-        # Remove timestamps outside the current window
-        self.clients[client_id] = [
-            ts for ts in self.clients[client_id]
-            if ts > current_time - self.window_size
-        ]
-        
-        # Check if client has exceeded rate limit
-        if len(self.clients[client_id]) >= self.rate_limit:
-            # Calculate retry after time
-            oldest_timestamp = min(self.clients[client_id])
-            retry_after = int(oldest_timestamp + self.window_size - current_time)
-            return True, retry_after
-        
-        # Client is not rate limited, add current timestamp
-        self.clients[client_id].append(current_time)
-        return False, 0
+        return None
 
 
-def add_rate_limiter(app: FastAPI, rate_limit: int = 60) -> None:
-    """Add rate limiting middleware to the FastAPI app."""
-    app.add_middleware(RateLimiter, rate_limit_per_minute=rate_limit)
+def add_rate_limiter(
+    app: FastAPI,
+    rate_limit: Optional[int] = None,
+    max_clients: int = 100_000,
+    store: Optional[LimiterStore] = None,
+) -> None:
+    """Add rate limiting to the FastAPI app's request pipeline."""
+    store = store or create_limiter_store(max_clients=max_clients)
+    get_request_pipeline(app).rate_limiter = RateLimiter(
+        rate_limit_per_minute=rate_limit or settings.RATE_LIMIT_PER_MINUTE,
+        max_clients=max_clients,
+        store=store,
+    )
+    app.add_event_handler("shutdown", store.close)
@@ -0,0 +1,110 @@
+"""
+Tail-based sampling of request logs and telemetry.
+
+The decision is made once the response is known: errors, rate-limited
+requests and requests slower than a latency percentile of their route are
+always kept, the rest are kept at a configurable rate with per-route
+overrides. Kept records carry ``sample_weight`` (1 / rate) so dashboards can
+scale counts back up.
+"""
+import random
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.middleware.pipeline import RequestContext, get_request_pipeline
+from app.middleware.rate_limit_policies import PolicyTable
+
+
+@dataclass(frozen=True)
+class SamplingRule:
+    """Sampling rate for requests under a path prefix"""
+    prefix: str
+    rate: float
+
+
+class LatencyWindow:
+    """
+    Latencies of the most recent requests on one route.
+    The percentile threshold is recomputed every ``refresh_every`` observations
+    instead of on every request.
+    """
+
+    def __init__(self, size: int = 1024, refresh_every: int = 128, min_samples: int = 100):
+        self.size = size
+        self.refresh_every = refresh_every
+        self.min_samples = min_samples
+        self.values = array("d")
+        self.count = 0
+        self.threshold: Optional[float] = None
+
+    def add(self, value: float, percentile: float) -> None:
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            self.values[self.count % self.size] = value
+        self.count += 1
+        if self.count >= self.min_samples and self.count % self.refresh_every == 0:
+            ordered = sorted(self.values)
+            index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+            self.threshold = ordered[index]
+
+
+class TailSampler:
+    """Decides after the response whether a request's records are kept"""
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        latency_percentile: float = 99.0,
+        rules: Optional[Iterable[Dict[str, Any]]] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.latency_percentile = latency_percentile
+        self.rules = PolicyTable(
+            (SamplingRule(**rule) for rule in rules or []),
+            default=SamplingRule(prefix="/", rate=rate),
+        )
+        self.windows: Dict[str, LatencyWindow] = {}
+        self.random = (rng or random.Random()).random
+        self.kept = 0
+        self.dropped = 0
+
+    def decide(self, context: RequestContext) -> Optional[float]:
+        """Return the sample weight of a kept request, or None to drop it."""
+        window = self.windows.get(context.route)
+        if window is None:
+            window = self.windows[context.route] = LatencyWindow()
+        # Compare against the threshold before this request moves it
+        threshold = window.threshold
+        window.add(context.duration_ms, self.latency_percentile)
+
+        if (
+            context.error is not None
+            or context.status_code >= 500
+            or context.status_code == 429
+            or (threshold is not None and context.duration_ms > threshold)
+        ):
+            self.kept += 1
+            return 1.0
+
+        rate = self.rules.match(context.path).rate
+        if rate >= 1.0 or (rate > 0 and self.random() < rate):
+            self.kept += 1
+            return 1.0 / rate
+        self.dropped += 1
+        return None
+
+
+def setup_sampling(app: FastAPI, rules: Optional[List[Dict[str, Any]]] = None) -> TailSampler:
+    """Install tail-based sampling for request logs and telemetry."""
+    sampler = TailSampler(
+        rate=settings.SAMPLING_RATE,
+        latency_percentile=settings.SAMPLING_LATENCY_PERCENTILE,
+        rules=settings.SAMPLING_RULES if rules is None else rules,
+    )
+    get_request_pipeline(app).sampler = sampler
+    return sampler
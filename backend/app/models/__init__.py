@@ -1,5 +1,6 @@
 # Import all models here for Alembic to detect them
 from app.models.analytics import AnalyticsEvent, VoiceInteraction, UserSession
 from app.models.user import User
+from app.models.token import RevokedToken
 
 # Make sure to import any other models you create
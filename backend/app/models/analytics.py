@@ -47,6 +47,10 @@ class VoiceAgentInteraction(Base):
         return f"<VoiceAgentInteraction(id={self.id}, user_id={self.user_id}, session_id='{self.session_id}')>"
 
 
+# Name used by the repositories, schemas and db_utils
+VoiceInteraction = VoiceAgentInteraction
+
+
 class UserSession(Base):
     """Model for tracking user sessions"""
     __tablename__ = "user_sessions"
@@ -0,0 +1,22 @@
+"""
+Token revocation models
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+
+from app.db.session import Base
+
+
+class RevokedToken(Base):
+    """JWT ID of a revoked access token, kept until the token would have expired"""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    # Workers load revocations incrementally by this column
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<RevokedToken(jti='{self.jti}', user_id={self.user_id}, expires_at={self.expires_at})>"
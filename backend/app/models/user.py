@@ -26,6 +26,7 @@ class User(Base):
     # Relationships
     analytics_events = relationship("AnalyticsEvent", back_populates="user")
     sessions = relationship("UserSession", back_populates="user")
+    voice_interactions = relationship("VoiceAgentInteraction", back_populates="user")
     
     def __repr__(self):
         return f"<User(id={self.id}, email='{self.email}', is_active={self.is_active})>"
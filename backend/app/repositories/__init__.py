@@ -1,9 +1,13 @@
 """
 Repositories module for database operations.
 """
-from app.repositories.user import UserRepository
+from app.repositories.user import UserRepository, AsyncUserRepository
+from app.repositories.token import RevokedTokenRepository
 from app.repositories.analytics import (
     AnalyticsRepository, 
     VoiceInteractionRepository,
-    UserSessionRepository
+    UserSessionRepository,
+    AsyncAnalyticsRepository,
+    AsyncVoiceInteractionRepository,
+    AsyncUserSessionRepository,
 )
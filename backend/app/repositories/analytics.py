@@ -1,13 +1,20 @@
 """
 Repository for analytics models to handle database operations
 """
+import csv
+import io
+import json
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Set, Tuple
 
-from sqlalchemy import func, desc, cast, Date
+from sqlalchemy import func, desc, cast, Date, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.db.lookups import PointLookup
+from app.db.write_behind import get_write_behind_buffer
 from app.models.analytics import AnalyticsEvent, VoiceInteraction, UserSession
+from app.models.user import User
 from app.schemas.analytics import (
     AnalyticsEventCreate, 
     VoiceInteractionCreate,
@@ -16,6 +23,35 @@ from app.schemas.analytics import (
     AnalyticsReport,
     VoiceInteractionMetrics
 )
+from app.core.cache_invalidation import invalidate_cache_tags
+
+session_by_session_id = PointLookup(UserSession, UserSession.session_id)
+
+# Columns written by AnalyticsRepository.create_events, in COPY order
+EVENT_COLUMNS = ("event_type", "user_id", "event_data", "timestamp")
+
+
+def _copy_events(db: Session, events: List[Dict[str, Any]]) -> None:
+    """Stream events into analytics_events with PostgreSQL COPY (psycopg2)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for event in events:
+        # An unquoted empty field is NULL in COPY's csv format
+        writer.writerow([
+            event["event_type"],
+            "" if event["user_id"] is None else event["user_id"],
+            json.dumps(event["event_data"]),
+            event["timestamp"].isoformat(),
+        ])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {AnalyticsEvent.__tablename__} ({', '.join(EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
 
 
 class AnalyticsRepository:
@@ -33,8 +69,46 @@ class AnalyticsRepository:
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        invalidate_cache_tags("analytics_events")
         return db_obj
     
+    @staticmethod
+    def queue_event(*, obj_in: AnalyticsEventCreate) -> None:
+        """
+        Accept an event for the write-behind buffer, which inserts it within
+        WRITE_BEHIND_FLUSH_INTERVAL_MS. Raises BufferFull when the buffer is full.
+        """
+        get_write_behind_buffer().submit("analytics_event", {
+            "event_type": obj_in.event_type,
+            "user_id": obj_in.user_id,
+            "event_data": obj_in.event_data,
+            "timestamp": datetime.utcnow(),
+        })
+    
+    @staticmethod
+    def create_events(db: Session, *, events: List[Dict[str, Any]]) -> int:
+        """
+        Insert many events in one transaction. Each dict has every key of
+        EVENT_COLUMNS. Uses COPY on PostgreSQL with psycopg2, otherwise one
+        executemany, which SQLAlchemy sends as multi-row INSERTs.
+        """
+        if not events:
+            return 0
+        if db.get_bind().dialect.driver == "psycopg2":
+            _copy_events(db, events)
+        else:
+            db.execute(insert(AnalyticsEvent.__table__), events)
+        db.commit()
+        invalidate_cache_tags("analytics_events")
+        return len(events)
+    
+    @staticmethod
+    def existing_user_ids(db: Session, user_ids: Set[int]) -> Set[int]:
+        """The subset of user_ids that belong to a user"""
+        if not user_ids:
+            return set()
+        return set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+    
     @staticmethod
     def get_events(
         db: Session, 
@@ -145,7 +219,7 @@ class VoiceInteractionRepository:
             user_id=obj_in.user_id,
             query=obj_in.query,
             response=obj_in.response,
-            metadata=obj_in.metadata,
+            interaction_metadata=obj_in.metadata,
             is_successful=obj_in.is_successful,
             session_id=obj_in.session_id,
             timestamp=datetime.utcnow()
@@ -153,8 +227,22 @@ class VoiceInteractionRepository:
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        invalidate_cache_tags("voice_interactions")
         return db_obj
     
+    @staticmethod
+    def queue_interaction(*, obj_in: VoiceInteractionCreate) -> None:
+        """Accept a voice interaction for the write-behind buffer"""
+        get_write_behind_buffer().submit("voice_interaction", {
+            "user_id": obj_in.user_id,
+            "query": obj_in.query,
+            "response": obj_in.response,
+            "interaction_metadata": obj_in.metadata,
+            "is_successful": obj_in.is_successful,
+            "session_id": obj_in.session_id,
+            "timestamp": datetime.utcnow(),
+        })
+    
     @staticmethod
     def get_interactions(
         db: Session, 
@@ -244,8 +332,25 @@ class UserSessionRepository:
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        invalidate_cache_tags("user_sessions")
         return db_obj
     
+    @staticmethod
+    def queue_session(*, obj_in: UserSessionCreate) -> None:
+        """
+        Accept a new session for the write-behind buffer. end_session does
+        not find it until the buffer has flushed.
+        """
+        get_write_behind_buffer().submit("user_session", {
+            "session_id": obj_in.session_id,
+            "user_id": obj_in.user_id,
+            "is_active": True,
+            "device_info": obj_in.device_info,
+            "ip_address": obj_in.ip_address,
+            "started_at": datetime.utcnow(),
+            "ended_at": None,
+        })
+    
     @staticmethod
     def end_session(db: Session, *, session_id: str, obj_in: UserSessionUpdate) -> Optional[UserSession]:
         """End a user session"""
@@ -259,6 +364,7 @@ class UserSessionRepository:
         db.add(session)
         db.commit()
         db.refresh(session)
+        invalidate_cache_tags("user_sessions")
         return session
     
     @staticmethod
@@ -276,7 +382,7 @@ class UserSessionRepository:
     @staticmethod
     def get_session_by_id(db: Session, *, session_id: str) -> Optional[UserSession]:
         """Get a session by its ID"""
-        return db.query(UserSession).filter(UserSession.session_id == session_id).first()
+        return session_by_session_id(db, session_id)
     
     @staticmethod
     def get_user_sessions(
@@ -317,3 +423,302 @@ class UserSessionRepository:
         avg_duration = sum(durations) / len(durations) if durations else 0
         
         return total_sessions, active_sessions, avg_duration
+
+
+def _day(column):
+    """Calendar day of a timestamp column, as "YYYY-MM-DD" on SQLite and a date elsewhere"""
+    return func.date(column)
+
+
+def _day_key(value: Any) -> str:
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
+
+
+class AsyncAnalyticsRepository:
+    """AnalyticsRepository for AsyncSession"""
+    
+    @staticmethod
+    async def create_event(db: AsyncSession, *, obj_in: AnalyticsEventCreate) -> AnalyticsEvent:
+        """Create a new analytics event"""
+        db_obj = AnalyticsEvent(
+            event_type=obj_in.event_type,
+            user_id=obj_in.user_id,
+            event_data=obj_in.event_data,
+            timestamp=datetime.utcnow()
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_cache_tags("analytics_events")
+        return db_obj
+    
+    @staticmethod
+    async def get_events(
+        db: AsyncSession, 
+        *, 
+        skip: int = 0, 
+        limit: int = 100,
+        event_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[AnalyticsEvent]:
+        """Get analytics events with filtering and pagination"""
+        query = select(AnalyticsEvent)
+        
+        if event_type:
+            query = query.where(AnalyticsEvent.event_type == event_type)
+        if user_id:
+            query = query.where(AnalyticsEvent.user_id == user_id)
+        if start_date:
+            query = query.where(AnalyticsEvent.timestamp >= start_date)
+        if end_date:
+            query = query.where(AnalyticsEvent.timestamp <= end_date)
+        
+        result = await db.scalars(
+            query.order_by(desc(AnalyticsEvent.timestamp)).offset(skip).limit(limit)
+        )
+        return list(result)
+    
+    @staticmethod
+    async def get_event_counts_by_type(
+        db: AsyncSession, 
+        *, 
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """Get event counts grouped by event_type"""
+        query = select(AnalyticsEvent.event_type, func.count(AnalyticsEvent.id))
+        
+        if start_date:
+            query = query.where(AnalyticsEvent.timestamp >= start_date)
+        if end_date:
+            query = query.where(AnalyticsEvent.timestamp <= end_date)
+        
+        result = await db.execute(query.group_by(AnalyticsEvent.event_type))
+        return {event_type: count for event_type, count in result}
+    
+    @staticmethod
+    async def get_event_counts_by_day(
+        db: AsyncSession, 
+        *, 
+        days: int = 7,
+        event_type: Optional[str] = None
+    ) -> Dict[str, int]:
+        """Get event counts grouped by day for the last N days"""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        day = _day(AnalyticsEvent.timestamp)
+        
+        query = select(day, func.count(AnalyticsEvent.id)).where(AnalyticsEvent.timestamp >= start_date)
+        if event_type:
+            query = query.where(AnalyticsEvent.event_type == event_type)
+        
+        result = await db.execute(query.group_by(day))
+        return {_day_key(day): count for day, count in result}
+    
+    @staticmethod
+    async def get_analytics_report(
+        db: AsyncSession, 
+        *, 
+        days: int = 30
+    ) -> AnalyticsReport:
+        """Generate an analytics report"""
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        total_events = await db.scalar(
+            select(func.count(AnalyticsEvent.id)).where(AnalyticsEvent.timestamp >= start_date)
+        ) or 0
+        events_by_type = await AsyncAnalyticsRepository.get_event_counts_by_type(
+            db, start_date=start_date, end_date=end_date
+        )
+        events_by_day = await AsyncAnalyticsRepository.get_event_counts_by_day(db, days=days)
+        
+        return AnalyticsReport(
+            total_events=total_events,
+            events_by_type=events_by_type,
+            events_by_day=events_by_day
+        )
+
+
+class AsyncVoiceInteractionRepository:
+    """VoiceInteractionRepository for AsyncSession"""
+    
+    @staticmethod
+    async def create_interaction(db: AsyncSession, *, obj_in: VoiceInteractionCreate) -> VoiceInteraction:
+        """Create a new voice interaction record"""
+        db_obj = VoiceInteraction(
+            user_id=obj_in.user_id,
+            query=obj_in.query,
+            response=obj_in.response,
+            interaction_metadata=obj_in.metadata,
+            is_successful=obj_in.is_successful,
+            session_id=obj_in.session_id,
+            timestamp=datetime.utcnow()
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_cache_tags("voice_interactions")
+        return db_obj
+    
+    @staticmethod
+    async def get_interactions(
+        db: AsyncSession, 
+        *, 
+        skip: int = 0, 
+        limit: int = 100,
+        user_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+        is_successful: Optional[bool] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[VoiceInteraction]:
+        """Get voice interactions with filtering and pagination"""
+        query = select(VoiceInteraction)
+        
+        if user_id:
+            query = query.where(VoiceInteraction.user_id == user_id)
+        if session_id:
+            query = query.where(VoiceInteraction.session_id == session_id)
+        if is_successful is not None:
+            query = query.where(VoiceInteraction.is_successful == is_successful)
+        if start_date:
+            query = query.where(VoiceInteraction.timestamp >= start_date)
+        if end_date:
+            query = query.where(VoiceInteraction.timestamp <= end_date)
+        
+        result = await db.scalars(
+            query.order_by(desc(VoiceInteraction.timestamp)).offset(skip).limit(limit)
+        )
+        return list(result)
+    
+    @staticmethod
+    async def get_interaction_metrics(
+        db: AsyncSession, 
+        *, 
+        days: int = 30,
+        user_id: Optional[int] = None
+    ) -> VoiceInteractionMetrics:
+        """Get metrics for voice interactions"""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        day = _day(VoiceInteraction.timestamp)
+        
+        # Aggregated in the database instead of loading every interaction
+        totals = select(
+            func.count(VoiceInteraction.id),
+            func.count(VoiceInteraction.id).filter(VoiceInteraction.is_successful == True),
+            func.avg(func.length(VoiceInteraction.query)),
+        ).where(VoiceInteraction.timestamp >= start_date)
+        by_day = select(day, func.count(VoiceInteraction.id)).where(VoiceInteraction.timestamp >= start_date)
+        if user_id:
+            totals = totals.where(VoiceInteraction.user_id == user_id)
+            by_day = by_day.where(VoiceInteraction.user_id == user_id)
+        
+        total, successful, avg_query_length = (await db.execute(totals)).one()
+        by_day_result = await db.execute(by_day.group_by(day))
+        
+        return VoiceInteractionMetrics(
+            total_interactions=total,
+            successful_interactions=successful,
+            average_query_length=float(avg_query_length or 0),
+            interactions_by_day={_day_key(day): count for day, count in by_day_result}
+        )
+
+
+class AsyncUserSessionRepository:
+    """UserSessionRepository for AsyncSession"""
+    
+    @staticmethod
+    async def create_session(db: AsyncSession, *, obj_in: UserSessionCreate) -> UserSession:
+        """Create a new user session"""
+        db_obj = UserSession(
+            session_id=obj_in.session_id,
+            user_id=obj_in.user_id,
+            is_active=True,
+            device_info=obj_in.device_info,
+            ip_address=obj_in.ip_address,
+            started_at=datetime.utcnow(),
+            ended_at=None
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_cache_tags("user_sessions")
+        return db_obj
+    
+    @staticmethod
+    async def end_session(db: AsyncSession, *, session_id: str, obj_in: UserSessionUpdate) -> Optional[UserSession]:
+        """End a user session"""
+        session = await AsyncUserSessionRepository.get_session_by_id(db, session_id=session_id)
+        if not session:
+            return None
+        
+        session.ended_at = obj_in.ended_at or datetime.utcnow()
+        session.is_active = False
+        
+        db.add(session)
+        await db.commit()
+        await db.refresh(session)
+        invalidate_cache_tags("user_sessions")
+        return session
+    
+    @staticmethod
+    async def get_active_sessions(
+        db: AsyncSession, 
+        *, 
+        user_id: Optional[int] = None
+    ) -> List[UserSession]:
+        """Get active user sessions"""
+        query = select(UserSession).where(UserSession.is_active == True)
+        if user_id:
+            query = query.where(UserSession.user_id == user_id)
+        return list(await db.scalars(query))
+    
+    @staticmethod
+    async def get_session_by_id(db: AsyncSession, *, session_id: str) -> Optional[UserSession]:
+        """Get a session by its ID"""
+        return await db.scalar(session_by_session_id.statement, {"value": session_id})
+    
+    @staticmethod
+    async def get_user_sessions(
+        db: AsyncSession, 
+        *, 
+        user_id: int, 
+        skip: int = 0, 
+        limit: int = 100
+    ) -> List[UserSession]:
+        """Get all sessions for a user"""
+        result = await db.scalars(
+            select(UserSession)
+            .where(UserSession.user_id == user_id)
+            .order_by(desc(UserSession.started_at))
+            .offset(skip)
+            .limit(limit)
+        )
+        return list(result)
+    
+    @staticmethod
+    async def get_session_stats(
+        db: AsyncSession, 
+        *, 
+        days: int = 30
+    ) -> Tuple[int, int, float]:
+        """Get session statistics: total, active, and average duration"""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        result = await db.execute(
+            select(UserSession.is_active, UserSession.started_at, UserSession.ended_at)
+            .where(UserSession.started_at >= start_date)
+        )
+        sessions = result.all()
+        
+        total_sessions = len(sessions)
+        active_sessions = sum(1 for s in sessions if s.is_active)
+        durations = [
+            (s.ended_at - s.started_at).total_seconds()
+            for s in sessions
+            if not s.is_active and s.ended_at
+        ]
+        avg_duration = sum(durations) / len(durations) if durations else 0
+        
+        return total_sessions, active_sessions, avg_duration
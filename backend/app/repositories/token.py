@@ -0,0 +1,72 @@
+"""
+Repository for revoked tokens
+"""
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.token import RevokedToken
+
+
+class RevokedTokenRepository:
+    """Repository for RevokedToken model"""
+
+    @staticmethod
+    def revoke(
+        db: Session, *, jti: str, expires_at: datetime, user_id: Optional[int] = None
+    ) -> RevokedToken:
+        """Record a token as revoked until its expiry"""
+        db_obj = db.get(RevokedToken, jti)
+        if db_obj is None:
+            db_obj = RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at)
+            db.add(db_obj)
+            db.commit()
+            db.refresh(db_obj)
+        return db_obj
+
+    @staticmethod
+    def is_revoked(db: Session, *, jti: str, now: Optional[datetime] = None) -> bool:
+        """Check a single token against the table"""
+        now = now or datetime.utcnow()
+        return (
+            db.query(RevokedToken.jti)
+            .filter(RevokedToken.jti == jti, RevokedToken.expires_at > now)
+            .first()
+            is not None
+        )
+
+    @staticmethod
+    def iter_active_jtis(
+        db: Session, *, now: Optional[datetime] = None, batch_size: int = 10_000
+    ) -> Iterator[str]:
+        """
+        Stream the IDs of every revocation whose token has not expired yet,
+        fetching ``batch_size`` rows at a time instead of loading them all
+        """
+        now = now or datetime.utcnow()
+        statement = (
+            select(RevokedToken.jti)
+            .where(RevokedToken.expires_at > now)
+            .execution_options(yield_per=batch_size)
+        )
+        return db.execute(statement).scalars()
+
+    @staticmethod
+    def get_since(db: Session, *, since: datetime) -> List[RevokedToken]:
+        """Get revocations recorded at or after a point in time"""
+        return (
+            db.query(RevokedToken)
+            .filter(RevokedToken.revoked_at >= since)
+            .order_by(RevokedToken.revoked_at)
+            .all()
+        )
+
+    @staticmethod
+    def purge_expired(db: Session, *, now: Optional[datetime] = None) -> int:
+        """Delete revocations of tokens that have expired anyway"""
+        now = now or datetime.utcnow()
+        deleted = db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete()
+        db.commit()
+        return deleted
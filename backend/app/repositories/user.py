@@ -3,11 +3,27 @@ Repository for User model to handle database operations
 """
 from typing import List, Optional, Dict, Any
 
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.db.lookups import PointLookup
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash, verify_password
+from app.core.metrics import PASSWORD_REHASHES
+from app.core.password_hashing import hash_cost
+from app.core.principal_cache import invalidate_principal
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    password_needs_rehash,
+    verify_password,
+    verify_password_async,
+)
+from app.core.cache_invalidation import invalidate_cache_tags
+
+user_by_id = PointLookup(User, User.id)
+user_by_email = PointLookup(User, User.email)
 
 
 class UserRepository:
@@ -16,12 +32,12 @@ class UserRepository:
     @staticmethod
     def get(db: Session, user_id: int) -> Optional[User]:
         """Get user by ID"""
-        return db.query(User).filter(User.id == user_id).first()
+        return user_by_id(db, user_id)
     
     @staticmethod
     def get_by_email(db: Session, email: str) -> Optional[User]:
         """Get user by email"""
-        return db.query(User).filter(User.email == email).first()
+        return user_by_email(db, email)
     
     @staticmethod
     def get_multi(db: Session, *, skip: int = 0, limit: int = 100) -> List[User]:
@@ -42,6 +58,7 @@ class UserRepository:
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        invalidate_cache_tags("users")
         return db_obj
     
     @staticmethod
@@ -61,6 +78,8 @@ class UserRepository:
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        invalidate_cache_tags(f"user:{db_obj.id}", "users")
         return db_obj
     
     @staticmethod
@@ -70,18 +89,40 @@ class UserRepository:
         if user:
             db.delete(user)
             db.commit()
+            invalidate_principal(user_id)
+            invalidate_cache_tags(f"user:{user_id}", "users")
         return user
     
     @staticmethod
     def authenticate(db: Session, *, email: str, password: str) -> Optional[User]:
-        """Authenticate a user"""
+        """
+        Authenticate a user.
+        A hash with another cost than BCRYPT_ROUNDS is replaced while the
+        plain password is at hand, so the cost can change without a migration.
+        """
         user = UserRepository.get_by_email(db, email=email)
         if not user:
             return None
         if not verify_password(password, user.hashed_password):
             return None
+        if password_needs_rehash(user.hashed_password):
+            PASSWORD_REHASHES.labels(hash_cost(user.hashed_password)).inc()
+            user.hashed_password = get_password_hash(password)
+            db.add(user)
+            db.commit()
         return user
     
+    @staticmethod
+    def get_hash_costs(db: Session) -> Dict[str, int]:
+        """Count users per password hash scheme and cost, e.g. {"bcrypt:12": 40}"""
+        # The scheme and cost are encoded in the first 7 characters ("$2b$12$")
+        prefix = func.substr(User.hashed_password, 1, 7)
+        costs: Dict[str, int] = {}
+        for hash_prefix, count in db.query(prefix, func.count(User.id)).group_by(prefix):
+            cost = hash_cost(hash_prefix)
+            costs[cost] = costs.get(cost, 0) + count
+        return costs
+    
     @staticmethod
     def is_active(user: User) -> bool:
         """Check if user is active"""
@@ -107,4 +148,118 @@ class UserRepository:
         db.add(user)
         db.commit()
         db.refresh(user)
+        invalidate_principal(user_id)
+        invalidate_cache_tags(f"user:{user_id}")
+        return user
+
+
+class AsyncUserRepository:
+    """UserRepository for AsyncSession, for use in async def endpoints"""
+    
+    @staticmethod
+    async def get(db: AsyncSession, user_id: int) -> Optional[User]:
+        """Get user by ID"""
+        return await db.get(User, user_id)
+    
+    @staticmethod
+    async def get_by_email(db: AsyncSession, email: str) -> Optional[User]:
+        """Get user by email"""
+        return await db.scalar(user_by_email.statement, {"value": email})
+    
+    @staticmethod
+    async def get_multi(db: AsyncSession, *, skip: int = 0, limit: int = 100) -> List[User]:
+        """Get multiple users with pagination"""
+        result = await db.scalars(select(User).order_by(User.id).offset(skip).limit(limit))
+        return list(result)
+    
+    @staticmethod
+    async def create(db: AsyncSession, *, obj_in: UserCreate) -> User:
+        """Create a new user"""
+        db_obj = User(
+            email=obj_in.email,
+            hashed_password=await get_password_hash_async(obj_in.password),
+            full_name=obj_in.full_name,
+            is_active=obj_in.is_active,
+            is_superuser=obj_in.is_superuser,
+            preferences={}
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_cache_tags("users")
+        return db_obj
+    
+    @staticmethod
+    async def update(db: AsyncSession, *, db_obj: User, obj_in: UserUpdate) -> User:
+        """Update a user"""
+        update_data = obj_in.dict(exclude_unset=True)
+        
+        if update_data.get("password"):
+            update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
+            
+        for field in update_data:
+            setattr(db_obj, field, update_data[field])
+                
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        invalidate_cache_tags(f"user:{db_obj.id}", "users")
+        return db_obj
+    
+    @staticmethod
+    async def delete(db: AsyncSession, *, user_id: int) -> Optional[User]:
+        """Delete a user"""
+        user = await db.get(User, user_id)
+        if user:
+            await db.delete(user)
+            await db.commit()
+            invalidate_principal(user_id)
+            invalidate_cache_tags(f"user:{user_id}", "users")
+        return user
+    
+    @staticmethod
+    async def authenticate(db: AsyncSession, *, email: str, password: str) -> Optional[User]:
+        """Authenticate a user, rehashing to BCRYPT_ROUNDS like UserRepository.authenticate"""
+        user = await AsyncUserRepository.get_by_email(db, email=email)
+        if not user:
+            return None
+        if not await verify_password_async(password, user.hashed_password):
+            return None
+        if password_needs_rehash(user.hashed_password):
+            PASSWORD_REHASHES.labels(hash_cost(user.hashed_password)).inc()
+            user.hashed_password = await get_password_hash_async(password)
+            db.add(user)
+            await db.commit()
+        return user
+    
+    @staticmethod
+    async def get_hash_costs(db: AsyncSession) -> Dict[str, int]:
+        """Count users per password hash scheme and cost"""
+        prefix = func.substr(User.hashed_password, 1, 7)
+        costs: Dict[str, int] = {}
+        result = await db.execute(select(prefix, func.count(User.id)).group_by(prefix))
+        for hash_prefix, count in result:
+            cost = hash_cost(hash_prefix)
+            costs[cost] = costs.get(cost, 0) + count
+        return costs
+    
+    is_active = UserRepository.is_active
+    is_superuser = UserRepository.is_superuser
+    
+    @staticmethod
+    async def update_preferences(db: AsyncSession, *, user_id: int, preferences: Dict[str, Any]) -> User:
+        """Update user preferences"""
+        user = await db.get(User, user_id)
+        if not user:
+            return None
+            
+        # Assign a new dict so the JSON column is flagged as changed
+        user.preferences = {**(user.preferences or {}), **preferences}
+        
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        invalidate_principal(user_id)
+        invalidate_cache_tags(f"user:{user_id}")
         return user
@@ -4,7 +4,7 @@ Pydantic schemas for analytics models
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, constr
 
 
 class AnalyticsEventBase(BaseModel):
@@ -19,6 +19,27 @@ class AnalyticsEventCreate(AnalyticsEventBase):
     pass
 
 
+class AnalyticsEventBatchItem(AnalyticsEventCreate):
+    """One line of an NDJSON batch of events"""
+    # Bounded by the column, so one event cannot fail the batch insert
+    event_type: constr(min_length=1, max_length=50)
+    # When the client recorded the event, the time of ingestion if missing
+    timestamp: Optional[datetime] = None
+
+
+class AnalyticsBatchError(BaseModel):
+    """A rejected line of an NDJSON batch, numbered from 1"""
+    line: int
+    error: str
+
+
+class AnalyticsBatchResult(BaseModel):
+    """Outcome of an NDJSON batch of events"""
+    accepted: int
+    rejected: int
+    errors: List[AnalyticsBatchError] = []
+
+
 class AnalyticsEventInDB(AnalyticsEventBase):
     """Schema for AnalyticsEvent in DB"""
     id: int
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Events per second: one create_event call per event against NDJSON batches.
+
+The single-event path is AnalyticsRepository.create_event, which commits
+and refreshes every event. The batch path posts NDJSON to
+POST /api/v1/analytics/events:batch, plain and gzip-encoded, through the
+in-process ASGI transport. Both write to the same SQLite file, or to
+--database-url.
+
+Usage:
+    python benchmarks/analytics_ingest_benchmark.py [--events 20000] [--batch-size 1000] [--single-events 2000]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401 - registers every table on Base
+from app.api.api_v1.endpoints import analytics
+from app.db.session import Base, create_db_engine, get_db
+from app.repositories.analytics import AnalyticsRepository
+from app.schemas.analytics import AnalyticsEventCreate
+
+
+def event(i: int) -> dict:
+    return {"event_type": "page_view", "event_data": {"page": f"/products/{i % 500}", "session_id": f"s{i % 97}"}}
+
+
+def single_event_rate(sessions, count: int) -> float:
+    with sessions() as db:
+        started = time.perf_counter()
+        for i in range(count):
+            AnalyticsRepository.create_event(db, obj_in=AnalyticsEventCreate(**event(i)))
+        return count / (time.perf_counter() - started)
+
+
+async def batch_rate(app: FastAPI, count: int, batch_size: int, compress: bool) -> float:
+    batches = []
+    for start in range(0, count, batch_size):
+        body = "\n".join(json.dumps(event(i)) for i in range(start, min(start + batch_size, count))).encode()
+        batches.append(gzip.compress(body) if compress else body)
+    headers = {"Content-Type": "application/x-ndjson"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for body in batches:
+            response = await client.post("/analytics/events:batch", content=body, headers=headers)
+            response.raise_for_status()
+        return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20_000, help="events sent through the batch endpoint")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--single-events", type=int, default=2000, help="events sent one at a time")
+    parser.add_argument("--database-url", help="a scratch database to write the events to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(args.database_url or f"sqlite:///{directory}/ingest.db", name="bench")
+        Base.metadata.create_all(engine)
+        sessions = sessionmaker(bind=engine)
+
+        def bench_db():
+            with sessions() as db:
+                yield db
+
+        app = FastAPI()
+        app.include_router(analytics.router, prefix="/analytics")
+        app.dependency_overrides[get_db] = bench_db
+
+        single = single_event_rate(sessions, args.single_events)
+        print(f"create_event per event  {single:10.0f} events/s")
+        for compress in [False, True]:
+            rate = asyncio.run(batch_rate(app, args.events, args.batch_size, compress))
+            label = f"batch of {args.batch_size}{' gzip' if compress else ''}"
+            print(f"{label:<23} {rate:10.0f} events/s  ({rate / single:.0f}x)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
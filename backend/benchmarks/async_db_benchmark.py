@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Throughput of an I/O-bound endpoint on the sync and async database layers.
+
+Serves the same user lookup from a `def` endpoint using Session (run in the
+threadpool) and from an `async def` endpoint using AsyncSession, against a
+SQLite file. Every request also runs a SQL function that sleeps, standing in
+for network and server time of a real database. Both engines get the same
+pool size, so the sync endpoint is limited by the 40 threadpool threads and
+the async one by the pool. With short latencies the CPU cost of the
+in-process client dominates and both modes look alike.
+
+Usage:
+    python benchmarks/async_db_benchmark.py [--requests 1000] [--concurrency 200] [--latency-ms 250]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+import app.models  # noqa: F401 - registers every table on Base
+from app.db.session import Base, create_async_db_engine, create_db_engine
+from app.models.user import User
+from app.repositories.user import AsyncUserRepository, UserRepository
+
+
+def sleep_ms(ms: int) -> int:
+    time.sleep(ms / 1000)
+    return ms
+
+
+def register_sleep(engine) -> None:
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("sleep_ms", 1, sleep_ms)
+
+
+def build_app(url: str, pool_size: int, latency_ms: int):
+    options = dict(pool_size=pool_size, max_overflow=0)
+    sync_engine = create_db_engine(url, name="bench-sync", **options)
+    async_engine = create_async_db_engine(url, name="bench-async", **options)
+    register_sleep(sync_engine)
+    register_sleep(async_engine.sync_engine)
+    sync_sessions = sessionmaker(bind=sync_engine)
+    async_sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+    latency = text("SELECT sleep_ms(:ms)").bindparams(ms=latency_ms)
+
+    def get_db():
+        with sync_sessions() as db:
+            yield db
+
+    async def get_async_db():
+        async with async_sessions() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync/{user_id}")
+    def sync_user(user_id: int, db: Session = Depends(get_db)):
+        db.execute(latency)
+        return {"email": UserRepository.get(db, user_id).email}
+
+    @app.get("/async/{user_id}")
+    async def async_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+        await db.execute(latency)
+        return {"email": (await AsyncUserRepository.get(db, user_id)).email}
+
+    return app, async_engine
+
+
+async def drive(app: FastAPI, path: str, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        pending = iter(range(requests))
+
+        async def worker():
+            for i in pending:
+                started = time.perf_counter()
+                response = await client.get(f"{path}/{i % 100 + 1}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    return requests / elapsed, latencies[len(latencies) // 2] * 1000, p99
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=int, default=250, help="simulated database time per request")
+    parser.add_argument("--pool-size", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{directory}/bench.db"
+        setup_engine = create_db_engine(url, name="bench-setup")
+        Base.metadata.create_all(setup_engine)
+        with Session(setup_engine) as db:
+            db.add_all(User(email=f"user{i}@example.com", hashed_password="x") for i in range(1, 101))
+            db.commit()
+
+        app, async_engine = build_app(url, args.pool_size, args.latency_ms)
+
+        async def run():
+            for mode in ["sync", "async"]:
+                # Open the pool's connections before timing
+                await drive(app, f"/{mode}", args.concurrency, args.concurrency)
+                throughput, p50, p99 = await drive(app, f"/{mode}", args.requests, args.concurrency)
+                print(f"{mode:<6} {throughput:>8.1f} req/s  p50 {p50:>7.1f} ms  p99 {p99:>7.1f} ms")
+            # aiosqlite connections each hold a thread until closed
+            await async_engine.dispose()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Recommend a bcrypt cost (BCRYPT_ROUNDS) for a target login latency.
+
+Times bcrypt hashing at increasing costs on this machine and prints the
+highest cost within the target. Run it on the production hardware. With
+--report it also counts the hash costs stored in the database; users on
+another cost than BCRYPT_ROUNDS are rehashed on their next login.
+
+Usage:
+    python benchmarks/bcrypt_calibration.py [--target-ms 250] [--samples 3] [--report]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.password_hashing import calibrate_rounds
+
+
+def report_hash_costs() -> None:
+    from app.db.session import SessionLocal
+    from app.repositories.user import UserRepository
+
+    db = SessionLocal()
+    try:
+        costs = UserRepository.get_hash_costs(db)
+    finally:
+        db.close()
+    total = sum(costs.values())
+    print(f"\nStored password hashes ({total} users):")
+    for cost, count in sorted(costs.items()):
+        share = count / total if total else 0.0
+        print(f"  {cost:12s} {count:8d}  {share:6.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target-ms", type=float, default=250.0, help="hash time budget per login")
+    parser.add_argument("--samples", type=int, default=3, help="hashes timed per cost")
+    parser.add_argument("--min-rounds", type=int, default=4)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    parser.add_argument("--report", action="store_true", help="count stored hash costs")
+    args = parser.parse_args()
+
+    rounds, timings = calibrate_rounds(
+        args.target_ms / 1000,
+        min_rounds=args.min_rounds,
+        max_rounds=args.max_rounds,
+        samples=args.samples,
+    )
+    for cost, seconds in timings.items():
+        marker = " <- recommended" if cost == rounds else ""
+        print(f"rounds={cost:2d}  {seconds * 1000:9.1f} ms{marker}")
+    print(f"\nBCRYPT_ROUNDS={rounds}  (currently {settings.BCRYPT_ROUNDS})")
+    # bcrypt is CPU bound, so this is the ceiling of one PASSWORD_HASH_WORKERS thread
+    print(f"about {1 / timings[rounds]:.1f} logins/s per core at this cost")
+
+    if args.report:
+        report_hash_costs()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark of bearer token verification per request.
+
+Compares verifying a token with python-jose on every request, as
+get_current_user used to, with the verified token cache, over a working
+set of tokens presented repeatedly.
+
+Usage:
+    python benchmarks/jwt_cache_benchmark.py [--requests 100000] [--tokens 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jose import jwt
+
+from app.core import auth
+from app.core.auth import TokenPayload, create_access_token, decode_access_token
+from app.core.config import settings
+from app.core.token_cache import VerifiedTokenCache
+
+
+def uncached(token: str) -> dict:
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    TokenPayload(**payload)
+    return payload
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=1000, help="distinct tokens in use")
+    args = parser.parse_args()
+
+    tokens = [create_access_token(str(i)) for i in range(args.tokens)]
+    auth.token_cache = VerifiedTokenCache(max_entries=settings.JWT_CACHE_SIZE)
+
+    for name, decode in [("jose.decode", uncached), ("cached", decode_access_token)]:
+        start = time.perf_counter()
+        for i in range(args.requests):
+            decode(tokens[i % args.tokens])
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12} {elapsed / args.requests * 1e6:>8.2f} us/request")
+
+    cache = auth.token_cache
+    print(f"cache hits {cache.hits}, misses {cache.misses}")
+
+
+if __name__ == "__main__":
+    main()
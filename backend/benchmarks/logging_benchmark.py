@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark of log-heavy request throughput.
+
+Compares synchronous logging on the event loop (a StreamHandler writing each
+record as it is logged, as with logging.basicConfig) with the queued logging
+pipeline, in text and JSON format. The endpoint logs several records per
+request and output goes to a temporary file, or to a sink that blocks for
+--write-delay ms per write, like a stdout pipe whose reader is falling behind.
+
+With a fast local file, logging is CPU bound and the queue's writer thread
+competes with the event loop for the GIL, so queued logging costs some
+throughput. Its benefit is that slow log I/O no longer stalls every request.
+
+Usage:
+    python benchmarks/logging_benchmark.py [--requests 5000] [--concurrency 50] [--records 10] [--write-delay 0.2]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.structured_logging import TEXT_FORMAT, configure_logging, shutdown_logging
+from app.middleware.logging import setup_logging
+
+
+class SlowStream:
+    """File wrapper whose writes block, releasing the GIL like real I/O"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data: str) -> int:
+        time.sleep(self.delay)
+        return self.stream.write(data)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def build_app(records: int) -> FastAPI:
+    app = FastAPI()
+    setup_logging(app)
+    logger = logging.getLogger("app.bench")
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        for i in range(records):
+            logger.info("Processing item %s step %d", item_id, i)
+        return {"id": item_id}
+
+    return app
+
+
+def configure(mode: str, stream):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if mode == "sync":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        return None
+    return configure_logging(level="INFO", log_format=mode.split("-")[1], stream=stream)
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(requests))
+
+        async def worker():
+            for i in queue:
+                start = time.perf_counter_ns()
+                response = await client.get(f"/items/{i}")
+                latencies.append(time.perf_counter_ns() - start)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] / 1e6
+    return requests / elapsed, p99
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--records", type=int, default=10, help="log records per request")
+    parser.add_argument("--write-delay", type=float, default=0.2, help="ms per write of the slow sink")
+    args = parser.parse_args()
+
+    for sink, delay in [("file", 0.0), (f"slow {args.write_delay}ms", args.write_delay / 1000)]:
+        for mode in ["sync", "queue-text", "queue-json"]:
+            with tempfile.TemporaryFile("w+") as stream:
+                handler = configure(mode, SlowStream(stream, delay) if delay else stream)
+                rps, p99 = asyncio.run(drive(build_app(args.records), args.requests, args.concurrency))
+                dropped = handler.dropped if handler else 0
+                shutdown_logging()
+                print(f"{sink:<12} {mode:<12} {rps:>10.0f} req/s {p99:>8.2f} ms p99 {dropped:>8} dropped")
+
+
+if __name__ == "__main__":
+    main()
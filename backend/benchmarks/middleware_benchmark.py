@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the middleware stack on / and /api/v1/health/.
+
+Compares the previous three BaseHTTPMiddleware layers (request logging,
+rate limiting, Azure monitoring) with the fused pure-ASGI request pipeline,
+reporting requests/sec and p99 latency driven in-process through httpx.
+
+Usage:
+    python benchmarks/middleware_benchmark.py [--requests 5000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.api.api_v1.endpoints import health
+from app.core.config import settings
+from app.core.monitoring import AzureMonitoring, log_request_telemetry
+from app.middleware.logging import setup_logging
+from app.middleware.pipeline import get_request_pipeline
+from app.middleware.limiter_store import MemoryLimiterStore
+from app.middleware.rate_limit_policies import RateLimitPolicy
+from app.middleware.rate_limiter import add_rate_limiter
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = str(uuid.uuid4())
+        request.state.request_id = request_id
+        start_time = time.time()
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Process-Time"] = str(time.time() - start_time)
+        return response
+
+
+class LegacyRateLimiter(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        self.policy = RateLimitPolicy(prefix="/", limit=10 ** 9)
+        self.store = MemoryLimiterStore()
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path.startswith("/api/v1/health"):
+            return await call_next(request)
+        self.store.gcra(request.client.host, self.policy.emission_interval, self.policy.delay_tolerance)
+        return await call_next(request)
+
+
+class LegacyAzureMonitoringMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request.state.request_id = os.urandom(8).hex()
+        start_time = time.time()
+        response = await call_next(request)
+        AzureMonitoring.log_api_request(
+            request_id=request.state.request_id,
+            method=request.method,
+            path=request.url.path,
+            status_code=response.status_code,
+            duration_ms=(time.time() - start_time) * 1000,
+        )
+        return response
+
+
+def build_app(fused: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    def read_root() -> dict:
+        return {"message": "Welcome to Pravis Boutique API", "version": "1.0.0"}
+
+    app.include_router(health.router, prefix=f"{settings.API_V1_STR}/health")
+
+    if fused:
+        setup_logging(app)
+        add_rate_limiter(app, rate_limit=10 ** 9)
+        get_request_pipeline(app).on_response.append(log_request_telemetry)
+    else:
+        app.add_middleware(LegacyRequestLoggingMiddleware)
+        app.add_middleware(LegacyRateLimiter)
+        app.add_middleware(LegacyAzureMonitoringMiddleware)
+    return app
+
+
+async def drive(app: FastAPI, path: str, requests: int, concurrency: int):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(requests))
+
+        async def worker():
+            for _ in queue:
+                start = time.perf_counter_ns()
+                response = await client.get(path)
+                latencies.append(time.perf_counter_ns() - start)
+                assert response.status_code == 200
+
+        # Warm up routing and the event loop before timing
+        for _ in range(100):
+            await client.get(path)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] / 1e6
+    return requests / elapsed, p99
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    for path in ["/", f"{settings.API_V1_STR}/health/"]:
+        for name, fused in [("basehttp", False), ("pure-asgi", True)]:
+            rps, p99 = asyncio.run(
+                drive(build_app(fused), path, args.requests, args.concurrency)
+            )
+            print(f"{path:<20} {name:<10} {rps:>10.0f} req/s {p99:>8.2f} ms p99")
+
+
+if __name__ == "__main__":
+    main()
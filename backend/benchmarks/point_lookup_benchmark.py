@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Per-call cost of the hot point lookups: ORM Query against PointLookup.
+
+Runs the same lookups of users by ID and by email through
+``db.query(User).filter(...).first()``, as the repositories did before,
+and through app.db.lookups.PointLookup. On in-memory SQLite the database
+time is negligible, so the difference is the Python overhead per call.
+With --database-url pointing at PostgreSQL, also run with
+DB_PREPARED_STATEMENTS=true to include server-side prepared statements.
+
+Usage:
+    python benchmarks/point_lookup_benchmark.py [--lookups 100000] [--users 1000] [--database-url URL]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401 - registers every table on Base
+from app.core.config import settings
+from app.db.session import Base, create_db_engine
+from app.models.user import User
+from app.repositories.user import user_by_email, user_by_id
+
+
+def query_by_id(db: Session, user_id: int):
+    return db.query(User).filter(User.id == user_id).first()
+
+
+def query_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+
+def measure(engine, lookup, keys, lookups: int) -> float:
+    """Microseconds per call, in a fresh session per pass"""
+    with Session(engine) as db:
+        for key in keys:
+            lookup(db, key)
+        started = time.perf_counter()
+        for i in range(lookups):
+            lookup(db, keys[i % len(keys)])
+        return (time.perf_counter() - started) / lookups * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--database-url", help="a scratch database; bench users are added to its users table")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_db_engine(args.database_url, name="bench")
+    else:
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[User.__table__])
+    emails = [f"bench-{os.getpid()}-{i}@example.com" for i in range(args.users)]
+    with Session(engine) as db:
+        users = [User(email=email, hashed_password="x", preferences={}) for email in emails]
+        db.add_all(users)
+        db.commit()
+        ids = [user.id for user in users]
+
+    print(f"{args.lookups} lookups on {engine.dialect.name}, prepared statements {settings.DB_PREPARED_STATEMENTS}")
+    for label, before, after, keys in [
+        ("by id", query_by_id, user_by_id, ids),
+        ("by email", query_by_email, user_by_email, emails),
+    ]:
+        query_us = measure(engine, before, keys, args.lookups)
+        lookup_us = measure(engine, after, keys, args.lookups)
+        print(
+            f"{label:<9} Query {query_us:7.1f} us/call  PointLookup {lookup_us:7.1f} us/call"
+            f"  ({query_us / lookup_us:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
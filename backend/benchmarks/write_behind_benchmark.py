@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Analytics events written with one commit each against the write-behind buffer.
+
+The direct path is AnalyticsRepository.create_event, which commits and
+refreshes every event before returning. The write-behind path hands each
+event to a WriteBehindBuffer and returns; the time until the last event is
+committed is reported as well. Both write to the same SQLite file, or to
+--database-url.
+
+Usage:
+    python benchmarks/write_behind_benchmark.py [--events 5000] [--flush-rows 500] [--spill]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401 - registers every table on Base
+from app.db.session import Base, create_db_engine
+from app.db.write_behind import WriteBehindBuffer
+from app.repositories.analytics import AnalyticsRepository
+from app.schemas.analytics import AnalyticsEventCreate
+
+
+def event(i: int) -> AnalyticsEventCreate:
+    return AnalyticsEventCreate(event_type="page_view", event_data={"page": f"/products/{i % 500}"})
+
+
+def direct(sessions, count: int) -> float:
+    with sessions() as db:
+        started = time.perf_counter()
+        for i in range(count):
+            AnalyticsRepository.create_event(db, obj_in=event(i))
+        return time.perf_counter() - started
+
+
+def write_behind(buffer: WriteBehindBuffer, count: int):
+    started = time.perf_counter()
+    for i in range(count):
+        obj_in = event(i)
+        buffer.submit("analytics_event", {
+            "event_type": obj_in.event_type,
+            "user_id": obj_in.user_id,
+            "event_data": obj_in.event_data,
+            "timestamp": datetime.utcnow(),
+        })
+    accepted = time.perf_counter() - started
+    buffer.shutdown()
+    return accepted, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--flush-rows", type=int, default=500)
+    parser.add_argument("--flush-interval-ms", type=int, default=200)
+    parser.add_argument("--spill", action="store_true", help="journal accepted rows to a spill directory")
+    parser.add_argument("--database-url", help="a scratch database to write the events to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(args.database_url or f"sqlite:///{directory}/write_behind.db", name="bench")
+        Base.metadata.create_all(engine)
+        sessions = sessionmaker(bind=engine)
+
+        elapsed = direct(sessions, args.events)
+        print(f"create_event         {elapsed * 1e6 / args.events:8.1f} µs/event  {args.events / elapsed:10.0f} events/s")
+
+        buffer = WriteBehindBuffer(
+            sessions,
+            max_rows=args.events,
+            flush_rows=args.flush_rows,
+            flush_interval=args.flush_interval_ms / 1000,
+            spill_dir=f"{directory}/spill" if args.spill else None,
+        )
+        accepted, written = write_behind(buffer, args.events)
+        print(f"write-behind submit  {accepted * 1e6 / args.events:8.1f} µs/event  {args.events / written:10.0f} events/s written")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, Query
 from sqlalchemy.sql.expression import select, delete, update
 
+from app.db.lookups import PointLookup
 from app.db.session import SessionLocal, Base
 
 # Define a type variable for models
@@ -28,10 +29,11 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         """Initialize with SQLAlchemy model"""
         self.model = model
+        self._by_id = PointLookup(model, model.id)
 
     def get(self, db: Session, id: Any) -> Optional[ModelType]:
         """Get a single record by ID"""
-        return db.query(self.model).filter(self.model.id == id).first()
+        return self._by_id(db, id)
     
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100
@@ -1,21 +1,22 @@
-import logging
-
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
+from app.core.structured_logging import configure_logging, shutdown_logging
+from app.core.metrics import setup_metrics
 from app.core.monitoring import setup_azure_monitoring
 from app.api.api_v1.api import api_router
 from app.middleware.error_handlers import register_exception_handlers
 from app.middleware.logging import setup_logging
 from app.middleware.rate_limiter import add_rate_limiter
-# from app.middleware.cache import CacheMiddleware  # Temporarily disabled for Python 3.12
+from app.middleware.sampling import setup_sampling
+from app.middleware.cache import CacheMiddleware, close_response_cache
+from app.db.instrumentation import setup_sql_instrumentation
+from app.db.session import dispose_async_engine
+from app.db.write_behind import replay_write_behind, shutdown_write_behind_buffer
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Configure logging: records are written by a background thread
+configure_logging()
 
 # Create FastAPI application
 app = FastAPI(
@@ -24,6 +25,18 @@ app = FastAPI(
     version="1.0.0",
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
+# Write rows a crashed process left in the spill directory, and flush the
+# buffered ones before exiting
+app.add_event_handler("startup", replay_write_behind)
+app.add_event_handler("shutdown", shutdown_write_behind_buffer)
+app.add_event_handler("shutdown", shutdown_logging)
+app.add_event_handler("shutdown", dispose_async_engine)
+
+# Add response caching for GET requests. Added before CORS so that cached
+# responses never carry another origin's CORS headers.
+if settings.CACHE_ENABLED:
+    app.add_middleware(CacheMiddleware)
+    app.add_event_handler("shutdown", close_response_cache)
 
 # Configure CORS
 if settings.BACKEND_CORS_ORIGINS:
@@ -48,14 +61,22 @@ def read_root() -> dict:
 # Register exception handlers
 register_exception_handlers(app)
 
-# Setup logging middleware
+# Setup request logging (installs the request pipeline middleware:
+# request IDs, timing headers and telemetry hooks)
 setup_logging(app)
 
-# Add rate limiting middleware
+# Count SQL statements and their time per request, flag suspected N+1 queries
+setup_sql_instrumentation(app)
+
+# Add rate limiting to the request pipeline
 add_rate_limiter(app)
 
-# Add Redis caching middleware (temporarily disabled)
-# app.add_middleware(CacheMiddleware, ttl=300)  # Cache GET responses for 5 minutes
+# Decide after each response whether its logs and telemetry are kept
+setup_sampling(app)
+
+# Record request latency histograms and serve them at /metrics
+if settings.METRICS_ENABLED:
+    setup_metrics(app)
 
 # Setup Azure monitoring (Application Insights and Log Analytics)
 if settings.ENVIRONMENT != "development":
@@ -0,0 +1,95 @@
+import gzip
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.models.analytics import AnalyticsEvent
+from app.models.user import User
+from app.repositories.analytics import _copy_events
+
+URL = "/api/v1/analytics/events:batch"
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+def ndjson(*lines):
+    return "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode()
+
+
+def test_batch_inserts_valid_lines_and_reports_the_rest(client, db_session):
+    user = User(email="events@example.com", hashed_password="x", preferences={})
+    db_session.add(user)
+    db_session.commit()
+
+    body = ndjson(
+        {"event_type": "page_view", "event_data": {"page": "/"}},
+        "{not json",
+        {"event_type": "add_to_cart", "user_id": user.id, "event_data": {"sku": "A1"}},
+        {"event_data": {}},
+        "",
+        {"event_type": "x" * 51},
+        {"event_type": "purchase", "user_id": 999999},
+        {"event_type": "checkout", "timestamp": "2024-05-01T12:00:00+02:00"},
+    )
+
+    response = client.post(URL, content=body, headers=NDJSON)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (3, 4)
+    assert [error["line"] for error in result["errors"]] == [2, 4, 6, 7]
+    assert result["errors"][1]["error"] == "event_type: field required"
+    assert result["errors"][3]["error"] == "user_id: unknown user 999999"
+
+    events = {e.event_type: e for e in db_session.query(AnalyticsEvent)}
+    assert set(events) == {"page_view", "add_to_cart", "checkout"}
+    assert events["add_to_cart"].user_id == user.id
+    assert events["add_to_cart"].event_data == {"sku": "A1"}
+    assert events["checkout"].timestamp == datetime(2024, 5, 1, 10, 0)
+
+
+def test_gzip_body(client, db_session):
+    body = gzip.compress(ndjson(*({"event_type": "view", "event_data": {"i": i}} for i in range(500))))
+
+    response = client.post(URL, content=body, headers={**NDJSON, "Content-Encoding": "gzip"})
+
+    assert response.json() == {"accepted": 500, "rejected": 0, "errors": []}
+    assert db_session.query(AnalyticsEvent).filter_by(event_type="view").count() == 500
+
+
+def test_rejected_batches(client, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_BATCH_MAX_EVENTS", 2)
+    body = ndjson({"event_type": "a"}, {"event_type": "b"}, {"event_type": "c"})
+
+    assert client.post(URL, content=body, headers=NDJSON).status_code == 413
+    assert client.post(URL, content=b"plain", headers={"Content-Encoding": "gzip"}).status_code == 400
+    assert client.post(URL, content=gzip.compress(body)[:-10], headers={"Content-Encoding": "gzip"}).status_code == 400
+    assert client.post(URL, content=body, headers={"Content-Encoding": "br"}).status_code == 415
+
+    monkeypatch.setattr(settings, "ANALYTICS_BATCH_MAX_BYTES", 16)
+    assert client.post(URL, content=body, headers=NDJSON).status_code == 413
+
+
+class RecordingCursor:
+    def copy_expert(self, sql, file):
+        self.sql, self.data = sql, file.read()
+
+    def close(self):
+        pass
+
+
+def test_copy_writes_missing_user_ids_as_null():
+    cursor = RecordingCursor()
+    connection = SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor))
+    db = SimpleNamespace(connection=lambda: connection)
+
+    _copy_events(db, [
+        {"event_type": "page_view", "user_id": None, "event_data": {}, "timestamp": datetime(2024, 5, 1, 12)},
+        {"event_type": "purchase", "user_id": 7, "event_data": {"sku": "A1"}, "timestamp": datetime(2024, 5, 1, 13)},
+    ])
+
+    # An unquoted empty field, not an empty string
+    assert cursor.data.splitlines() == [
+        "page_view,,{},2024-05-01T12:00:00",
+        'purchase,7,"{""sku"": ""A1""}",2024-05-01T13:00:00',
+    ]
@@ -79,6 +79,23 @@ def test_get_current_user(client, db_session):
     
     assert response.status_code == 401
 
+def test_login_token_resolves_to_the_signed_in_user(client, db_session):
+    """The token subject is the id of the user who logged in"""
+    for email in ("first@example.com", "second@example.com"):
+        db_session.add(User(email=email, hashed_password=get_password_hash("password123"), is_active=True))
+    db_session.commit()
+
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "second@example.com", "password": "password123"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    me = client.get("/api/v1/auth/me", headers=headers)
+
+    assert me.status_code == 200
+    assert me.json()["email"] == "second@example.com"
+    assert str(me.json()["id"]) == response.json()["user_id"]
+
 def test_password_reset_request(client, db_session):
     """Test password reset request endpoint"""
     # Create a test user
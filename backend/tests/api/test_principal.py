@@ -0,0 +1,109 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.api.deps import get_current_active_superuser, get_current_admin_user, get_current_user
+from app.core.principal_cache import principal_cache
+from app.core.revocation import RevocationList
+from app.core.security import create_access_token
+from app.db.session import get_db
+from app.models.user import User
+from app.repositories.user import UserRepository
+from app.schemas.user import UserUpdate
+
+
+@pytest.fixture
+def principal_app(db_session, monkeypatch):
+    principal_cache.clear()
+    opened = []
+    # A loaded revocation list that will not refresh during the test
+    revocations = RevocationList(capacity=1000, refresh_interval=3600, rebuild_interval=3600)
+    revocations.refresh(db_session, full=True)
+    monkeypatch.setattr(deps, "revocation_list", revocations)
+
+    def override_get_db():
+        opened.append(1)
+        yield db_session
+
+    app = FastAPI()
+    app.dependency_overrides[get_db] = override_get_db
+
+    @app.get("/me")
+    async def me(user=Depends(get_current_user)):
+        return user
+
+    @app.get("/admin")
+    async def admin(
+        admin=Depends(get_current_admin_user),
+        superuser=Depends(get_current_active_superuser),
+    ):
+        return admin
+
+    yield TestClient(app), opened
+    principal_cache.clear()
+
+
+def make_user(db_session, email="shopper@example.com", is_superuser=False):
+    user = User(email=email, hashed_password="x", is_active=True, is_superuser=is_superuser)
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def auth_headers(user):
+    return {"Authorization": f"Bearer {create_access_token(subject=str(user.id))}"}
+
+
+def test_principal_is_loaded_once_then_cached(principal_app, db_session):
+    """Only the first request for a user opens a database session"""
+    client, opened = principal_app
+    user = make_user(db_session)
+
+    for _ in range(3):
+        response = client.get("/me", headers=auth_headers(user))
+        assert response.status_code == 200
+
+    assert response.json() == {
+        "id": user.id,
+        "email": "shopper@example.com",
+        "is_active": True,
+        "is_superuser": False,
+        "role": "user",
+    }
+    assert len(opened) == 1
+
+
+def test_chained_dependencies_resolve_principal_once(principal_app, db_session):
+    """Role checks stacked on get_current_user share one resolution"""
+    client, opened = principal_app
+    user = make_user(db_session, email="admin@example.com", is_superuser=True)
+
+    response = client.get("/admin", headers=auth_headers(user))
+
+    assert response.status_code == 200
+    assert response.json()["role"] == "admin"
+    assert len(opened) == 1
+
+
+def test_repository_writes_invalidate_principal(principal_app, db_session):
+    """Updating or deleting a user is visible on the next request"""
+    client, opened = principal_app
+    user = make_user(db_session)
+    headers = auth_headers(user)
+    client.get("/me", headers=headers)
+
+    UserRepository.update(db_session, db_obj=user, obj_in=UserUpdate(is_active=False))
+    assert client.get("/me", headers=headers).json()["is_active"] is False
+
+    UserRepository.delete(db_session, user_id=user.id)
+    assert client.get("/me", headers=headers).status_code == 401
+    assert len(opened) == 3
+
+
+def test_invalid_tokens_never_reach_the_database(principal_app):
+    client, opened = principal_app
+
+    assert client.get("/me", headers={"Authorization": "Bearer invalid"}).status_code == 401
+    assert client.get("/me").status_code == 401
+    assert opened == []
@@ -13,6 +13,7 @@ from app.db.session import get_db
 # Import all models to ensure they are registered with the Base metadata
 from app.models.user import User
 from app.models.analytics import AnalyticsEvent, VoiceInteraction, UserSession
+from app.models.token import RevokedToken
 
 # Create a test database using SQLite in-memory database
 TEST_SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
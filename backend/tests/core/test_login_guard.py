@@ -0,0 +1,139 @@
+import asyncio
+
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api_v1.endpoints import auth as auth_endpoints
+from app.core.login_guard import LoginGuard, LoginThrottled
+from app.db.session import get_db
+from app.middleware.error_handlers import register_exception_handlers
+from app.middleware.limiter_store import MemoryLimiterStore, RedisLimiterStore
+from app.repositories.user import UserRepository
+
+
+def test_failures_lock_with_exponential_backoff():
+    """Three failures per 30s: the third locks for 1s, then 2s, then 4s"""
+    store = MemoryLimiterStore()
+    fail = lambda now: store.record_failure("key", 10.0, 30.0, 1.0, 60.0, now=now)
+
+    assert [fail(0.0), fail(0.0)] == [0, 0]
+    assert fail(0.0) == 1
+    assert store.blocked_for("key", now=0.5) == 1
+    assert store.blocked_for("key", now=1.0) == 0
+    assert fail(1.0) == 2
+    assert fail(3.0) == 4
+    assert store.blocked_for("key", now=5.0) == 2
+
+
+def test_failures_leak_out_of_the_window():
+    store = MemoryLimiterStore()
+    fail = lambda now: store.record_failure("key", 10.0, 30.0, 1.0, 60.0, now=now)
+
+    fail(0.0)
+    fail(0.0)
+    # One failure leaked out after 10s, so a third one is still allowed
+    assert fail(10.0) == 0
+    assert fail(10.0) == 1
+    # Once every failure has leaked out the backoff starts over
+    assert fail(100.0) == 0
+    assert len(store._failures) == 1
+
+
+def test_backoff_is_capped():
+    store = MemoryLimiterStore()
+    locks = [store.record_failure("key", 1.0, 1.0, 1.0, 8.0, now=0.0) for _ in range(6)]
+
+    assert locks == [1, 2, 4, 8, 8, 8]
+
+
+def guard_for(store):
+    return LoginGuard(store, max_failures_per_user=3, max_failures_per_ip=5, window=60)
+
+
+def test_guard_locks_username_and_ip_separately():
+    async def run():
+        guard = guard_for(MemoryLimiterStore())
+        for _ in range(3):
+            await guard.check("Shopper@example.com", "10.0.0.1")
+            await guard.failure("Shopper@example.com", "10.0.0.1")
+        with pytest.raises(LoginThrottled) as user_locked:
+            await guard.check("shopper@example.com ", "10.0.0.2")
+
+        # Spraying other usernames from one IP hits the IP limit
+        await guard.failure("a@example.com", "10.0.0.1")
+        await guard.failure("b@example.com", "10.0.0.1")
+        with pytest.raises(LoginThrottled) as ip_locked:
+            await guard.check("c@example.com", "10.0.0.1")
+        await guard.check("c@example.com", "10.0.0.3")
+        return user_locked.value, ip_locked.value
+
+    user_locked, ip_locked = asyncio.run(run())
+    assert user_locked.scope == "user"
+    assert user_locked.retry_after == 1
+    assert ip_locked.scope == "ip"
+
+
+def test_success_clears_username_failures_only():
+    async def run():
+        guard = guard_for(MemoryLimiterStore())
+        for _ in range(2):
+            await guard.failure("shopper", "10.0.0.1")
+        await guard.success("shopper", "10.0.0.1")
+        # Two more failures would lock the account without the reset
+        await guard.failure("shopper", "10.0.0.1")
+        await guard.failure("shopper", "10.0.0.1")
+        await guard.check("shopper", "10.0.0.2")
+        # The IP still counts all four
+        return await guard.failure("other", "10.0.0.1")
+
+    assert asyncio.run(run()) == 1
+
+
+def test_redis_store_shares_failures_between_workers():
+    async def run():
+        server = fakeredis.FakeServer()
+        worker_a = guard_for(RedisLimiterStore(fakeredis.FakeAsyncRedis(server=server)))
+        worker_b = guard_for(RedisLimiterStore(fakeredis.FakeAsyncRedis(server=server)))
+        await worker_a.failure("shopper", "10.0.0.1")
+        await worker_b.failure("shopper", "10.0.0.2")
+        lock = await worker_a.failure("shopper", "10.0.0.3")
+        with pytest.raises(LoginThrottled):
+            await worker_b.check("shopper", "10.0.0.4")
+        await worker_b.success("shopper", "10.0.0.4")
+        await worker_a.check("shopper", "10.0.0.4")
+        return lock
+
+    assert asyncio.run(run()) == 1
+
+
+@pytest.fixture
+def login_app(monkeypatch):
+    verified = []
+
+    def authenticate(db, *, email, password):
+        verified.append(password)
+        return None
+
+    monkeypatch.setattr(auth_endpoints, "login_guard", guard_for(MemoryLimiterStore()))
+    monkeypatch.setattr(UserRepository, "authenticate", authenticate)
+    app = FastAPI()
+    register_exception_handlers(app)
+    app.include_router(auth_endpoints.router)
+    app.dependency_overrides[get_db] = lambda: None
+    return TestClient(app), verified
+
+
+def test_throttled_logins_skip_password_verification(login_app):
+    client, verified = login_app
+    credentials = {"username": "testuser", "password": "wrong"}
+
+    statuses = [client.post("/login/json", json=credentials).status_code for _ in range(5)]
+
+    assert statuses == [401, 401, 401, 429, 429]
+    assert len(verified) == 3
+    response = client.post("/login", data=credentials)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["code"] == "login_throttled"
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from app.core.metrics import instrument_engine, render_metrics, setup_metrics
+from app.middleware.rate_limiter import RateLimiter
+from app.middleware.pipeline import get_request_pipeline
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def make_app():
+    app = FastAPI()
+    setup_metrics(app)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    return app
+
+
+def test_latency_is_recorded_per_route_template():
+    """Requests are grouped by route template, method and status class"""
+    client = TestClient(make_app())
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "2xx"}
+    before = sample("http_request_duration_seconds_count", **labels)
+
+    for item_id in range(3):
+        client.get(f"/items/{item_id}")
+    client.get("/items/not-a-number")
+    client.get("/nowhere")
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 3
+    assert sample(
+        "http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="4xx"
+    ) >= 1
+    assert sample(
+        "http_request_duration_seconds_count", method="GET", route="<unmatched>", status="4xx"
+    ) >= 1
+
+
+def test_rejected_requests_are_labelled_by_template_and_counted():
+    """Rate limited requests never reach the router but keep their route label"""
+    app = make_app()
+    get_request_pipeline(app).rate_limiter = RateLimiter(rate_limit_per_minute=1, policies=[])
+    client = TestClient(app)
+    before = sample("rate_limit_rejections_total", policy="/")
+
+    client.get("/items/1")
+    response = client.get("/items/1")
+
+    assert response.status_code == 429
+    assert sample("rate_limit_rejections_total", policy="/") == before + 1
+    assert sample(
+        "http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="4xx"
+    ) >= 1
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    """/metrics renders the registry in the Prometheus exposition format"""
+    client = TestClient(make_app())
+    client.get("/items/1")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/items/{item_id}",status="2xx"}' in response.text
+
+
+def test_engine_pool_usage_is_tracked():
+    """Checked out connections are tracked through pool events"""
+    engine = create_engine("sqlite://", poolclass=QueuePool)
+    instrument_engine(engine, name="test")
+    in_use = sample("db_pool_connections_in_use", pool="test")
+    checkouts = sample("db_pool_checkouts_total", pool="test")
+
+    with engine.connect() as connection:
+        connection.execute(text("select 1"))
+        assert sample("db_pool_connections_in_use", pool="test") == in_use + 1
+    assert sample("db_pool_connections_in_use", pool="test") == in_use
+    assert sample("db_pool_checkouts_total", pool="test") == checkouts + 1
+
+
+WORKER = """
+from app.core.metrics import REQUEST_LATENCY, DB_POOL_IN_USE
+for _ in range({count}):
+    REQUEST_LATENCY.labels("GET", "/items/{{item_id}}", "2xx").observe(0.002)
+DB_POOL_IN_USE.labels("primary").inc(2)
+"""
+
+
+def test_multiprocess_directory_aggregates_workers(tmp_path):
+    """Values written by separate worker processes are summed on scrape"""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for count in (2, 3):
+        subprocess.run(
+            [sys.executable, "-c", WORKER.format(count=count)],
+            cwd=BACKEND_DIR, env=env, check=True,
+        )
+
+    output = render_metrics(str(tmp_path)).decode()
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="2xx"} 5.0' in output
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.password_hashing import PasswordHasher, PasswordHashingBusy, calibrate_rounds, hash_cost
+from app.core.security import password_needs_rehash
+from app.middleware.error_handlers import register_exception_handlers
+from app.models.user import User
+from app.repositories.user import UserRepository
+
+
+class BlockingContext:
+    """Stands in for CryptContext, verifying only once released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def verify(self, password, hashed_password):
+        self.release.wait(5)
+        return password == hashed_password
+
+    def hash(self, password):
+        self.release.wait(5)
+        return password
+
+
+def test_hash_and_verify_round_trip():
+    """Passwords hashed in the pool verify in the pool"""
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+
+    async def run():
+        hashed = await hasher.hash("s3cret")
+        return await hasher.verify("s3cret", hashed), await hasher.verify("wrong", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    assert hasher.verify_sync("s3cret", hasher.hash_sync("s3cret"))
+    assert hasher.pending == 0
+
+
+def test_saturated_pool_rejects():
+    """Operations beyond workers + queue fail fast instead of waiting"""
+    context = BlockingContext()
+    hasher = PasswordHasher(context, max_workers=1, max_queue=1)
+
+    async def run():
+        running = [asyncio.ensure_future(hasher.verify("a", "a")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHashingBusy):
+            await hasher.verify("a", "a")
+        context.release.set()
+        return await asyncio.gather(*running)
+
+    assert asyncio.run(run()) == [True, True]
+    assert hasher.pending == 0
+
+
+def test_event_loop_keeps_running_during_verification():
+    """Other coroutines make progress while a verification is running"""
+    context = BlockingContext()
+    hasher = PasswordHasher(context)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while not context.release.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        verification = asyncio.ensure_future(hasher.verify("a", "a"))
+        ticking = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0.2)
+        context.release.set()
+        await ticking
+        assert await verification
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+
+def test_saturation_is_answered_with_503():
+    """PasswordHashingBusy becomes a 503 with Retry-After"""
+    context = BlockingContext()
+    hasher = PasswordHasher(context, max_workers=1, max_queue=0)
+    app = FastAPI()
+    register_exception_handlers(app)
+
+    @app.post("/login")
+    async def login():
+        return {"ok": await hasher.verify("a", "a")}
+
+    blocked = threading.Thread(target=hasher.verify_sync, args=("a", "a"))
+    blocked.start()
+    time.sleep(0.05)
+    try:
+        response = TestClient(app).post("/login")
+    finally:
+        context.release.set()
+        blocked.join()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["code"] == "password_hashing_busy"
+
+
+def test_hash_cost_parses_the_hash_prefix():
+    assert hash_cost("$2b$12$" + "x" * 53) == "bcrypt:12"
+    assert hash_cost("$2a$04$" + "x" * 53) == "bcrypt:4"
+    assert hash_cost("plaintext") == "unknown"
+    assert hash_cost(None) == "unknown"
+
+
+def test_calibration_recommends_the_highest_cost_within_target():
+    """Each cost doubles the time: 4 -> 10ms, 8 -> 160ms, 9 -> 320ms"""
+    measured = []
+
+    def measure(rounds, samples):
+        measured.append(rounds)
+        return 0.01 * 2 ** (rounds - 4)
+
+    rounds, timings = calibrate_rounds(0.25, min_rounds=4, max_rounds=16, measure=measure)
+
+    assert rounds == 8
+    # Stops at the first cost over the target, after one warm-up hash
+    assert list(timings) == [4, 5, 6, 7, 8, 9]
+    assert measured[0] == 4 and len(measured) == 7
+
+
+def test_authenticate_rehashes_to_the_configured_cost(db_session):
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    user = User(email="shopper@example.com", hashed_password=old_context.hash("secret"), is_active=True)
+    db_session.add(user)
+    db_session.commit()
+    assert UserRepository.get_hash_costs(db_session) == {"bcrypt:4": 1}
+
+    assert UserRepository.authenticate(db_session, email=user.email, password="wrong") is None
+    assert hash_cost(user.hashed_password) == "bcrypt:4"
+
+    assert UserRepository.authenticate(db_session, email=user.email, password="secret") is user
+    assert hash_cost(user.hashed_password) == f"bcrypt:{settings.BCRYPT_ROUNDS}"
+    assert not password_needs_rehash(user.hashed_password)
+    assert UserRepository.get_hash_costs(db_session) == {f"bcrypt:{settings.BCRYPT_ROUNDS}": 1}
+
+
+def test_login_rehashes_to_the_configured_cost(client, db_session):
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    user = User(email="login@example.com", hashed_password=old_context.hash("secret"), is_active=True)
+    db_session.add(user)
+    db_session.commit()
+
+    response = client.post("/api/v1/auth/login/json", json={"username": user.email, "password": "secret"})
+
+    assert response.status_code == 200
+    assert response.json()["user_id"] == str(user.id)
+    db_session.refresh(user)
+    assert hash_cost(user.hashed_password) == f"bcrypt:{settings.BCRYPT_ROUNDS}"
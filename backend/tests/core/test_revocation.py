@@ -0,0 +1,183 @@
+import asyncio
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.api.api_v1.endpoints import auth as auth_endpoints
+from app.core.auth import decode_access_token
+from app.core.principal_cache import principal_cache
+from app.core.revocation import BloomFilter, RevocationList
+from app.core.security import create_access_token
+from app.db.session import get_db
+from app.models.user import User
+from app.repositories.token import RevokedTokenRepository
+
+
+def test_bloom_filter_sizing():
+    """A million entries at 0.1% take about 1.8 MB and 10 hashes"""
+    bloom = BloomFilter(1_000_000, 0.001)
+
+    assert 1_700_000 < bloom.nbytes < 1_900_000
+    assert bloom.hashes == 10
+    assert bloom.expected_false_positive_rate(1_000_000) == pytest.approx(0.001, rel=0.05)
+
+
+def test_revocation_list_memory_for_one_million_tokens(db_session):
+    """A full rebuild over a million revocations streams them into about 1.8 MB"""
+    # Inserted through the driver: a million ORM inserts would dominate the test
+    expires_at = (datetime.utcnow() + timedelta(hours=1)).isoformat(" ")
+    db_session.connection().exec_driver_sql(
+        "INSERT INTO revoked_tokens (jti, expires_at, revoked_at) VALUES (?, ?, ?)",
+        [(f"revoked-{i}", expires_at, expires_at) for i in range(1_000_000)],
+    )
+    revocations = RevocationList(capacity=1_000_000, error_rate=0.001)
+
+    tracemalloc.start()
+    try:
+        revocations.refresh(db_session, full=True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert revocations.bloom.count == 1_000_000
+    # The filter plus one fetched batch of jtis, not a million ORM objects
+    assert peak < 8 * 1024 * 1024
+    assert all(revocations.check(f"revoked-{i}") is None for i in range(0, 1_000_000, 997))
+    false_positives = sum(f"valid-{i}" in revocations.bloom for i in range(100_000))
+    assert false_positives / 100_000 < 0.002
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(20_000, 0.01)
+    members = [f"revoked-{i}" for i in range(20_000)]
+    for jti in members:
+        bloom.add(jti)
+
+    assert all(jti in bloom for jti in members)
+    false_positives = sum(f"valid-{i}" in bloom for i in range(50_000))
+    assert false_positives / 50_000 < 0.02
+
+
+class CountingScope:
+    """Session factory for RevocationList that counts database round trips"""
+
+    def __init__(self, db):
+        self.db = db
+        self.opened = 0
+
+    @contextmanager
+    def __call__(self):
+        self.opened += 1
+        yield self.db
+
+
+def revoke(db, jti, expires_in=timedelta(minutes=30)):
+    RevokedTokenRepository.revoke(db, jti=jti, expires_at=datetime.utcnow() + expires_in)
+
+
+def test_delta_refresh_picks_up_new_revocations(db_session):
+    revocations = RevocationList(capacity=1000)
+    revocations.refresh(db_session, full=True)
+    revoke(db_session, "from-another-worker")
+
+    assert revocations.check("from-another-worker") is False
+    revocations.refresh(db_session)
+    assert revocations.check("from-another-worker") is True
+
+
+def test_unrevoked_tokens_are_answered_from_memory(db_session):
+    revocations = RevocationList(capacity=1000, refresh_interval=3600)
+    scope = CountingScope(db_session)
+
+    async def check_many():
+        return [await revocations.is_revoked(f"valid-{i}", scope) for i in range(100)]
+
+    assert not any(asyncio.run(check_many()))
+    # Only the initial load touched the database
+    assert scope.opened == 1
+
+
+def test_rebuild_drops_expired_and_confirms_older_entries(db_session):
+    revoke(db_session, "still-active")
+    revoke(db_session, "already-expired", expires_in=timedelta(minutes=-1))
+    revocations = RevocationList(capacity=1000, refresh_interval=3600)
+    revocations.refresh(db_session, full=True)
+    scope = CountingScope(db_session)
+
+    assert revocations.check("already-expired") is False
+    # Loaded by a rebuild, so only the filter knows it: confirmed once, then cached
+    assert revocations.check("still-active") is None
+    assert asyncio.run(revocations.is_revoked("still-active", scope)) is True
+    assert asyncio.run(revocations.is_revoked("still-active", scope)) is True
+    assert scope.opened == 1
+
+
+def test_recent_entries_expire_with_their_token():
+    revocations = RevocationList(capacity=1000)
+    revocations.add("expired", time.time() - 1)
+    revocations.add("active", time.time() + 60)
+
+    assert revocations.check("expired") is False
+    assert revocations.check("active") is True
+
+
+def test_revocations_added_during_a_rebuild_are_kept(db_session, monkeypatch):
+    """A logout on this worker while a rebuild reads its snapshot is not lost"""
+    revoke(db_session, "before-rebuild")
+    revocations = RevocationList(capacity=1000, refresh_interval=3600)
+    iter_active_jtis = RevokedTokenRepository.iter_active_jtis
+
+    def snapshot_then_logout(db, **kwargs):
+        jtis = list(iter_active_jtis(db, **kwargs))
+        revocations.add("during-rebuild", time.time() + 60)
+        return iter(jtis)
+
+    monkeypatch.setattr(RevokedTokenRepository, "iter_active_jtis", snapshot_then_logout)
+    revocations.refresh(db_session, full=True)
+
+    assert revocations.check("during-rebuild") is True
+    assert revocations.check("before-rebuild") is None
+    assert revocations.bloom.count == 2
+
+
+@pytest.fixture
+def logout_app(db_session, monkeypatch):
+    principal_cache.clear()
+    revocations = RevocationList(capacity=1000, refresh_interval=3600)
+    monkeypatch.setattr(deps, "revocation_list", revocations)
+    monkeypatch.setattr(auth_endpoints, "revocation_list", revocations)
+
+    def override_get_db():
+        yield db_session
+
+    app = FastAPI()
+    app.include_router(auth_endpoints.router)
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    principal_cache.clear()
+
+
+def test_logout_revokes_the_token(logout_app, db_session):
+    user = User(email="shopper@example.com", hashed_password="x", is_active=True)
+    db_session.add(user)
+    db_session.commit()
+    token = create_access_token(subject=str(user.id))
+    other_token = create_access_token(subject=str(user.id))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert logout_app.get("/me", headers=headers).status_code == 200
+    assert logout_app.post("/logout", headers=headers).status_code == 204
+
+    assert logout_app.get("/me", headers=headers).status_code == 401
+    assert logout_app.get("/me", headers={"Authorization": f"Bearer {other_token}"}).status_code == 200
+    # Another worker sees the revocation after its next refresh
+    other_worker = RevocationList(capacity=1000)
+    other_worker.refresh(db_session, full=True)
+    other_worker.refresh(db_session)
+    assert other_worker.check(decode_access_token(token)["jti"]) is True
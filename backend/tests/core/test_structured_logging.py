@@ -0,0 +1,121 @@
+import io
+import json
+import logging
+import random
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.structured_logging import (
+    BoundedQueueHandler,
+    JsonFormatter,
+    configure_logging,
+    shutdown_logging,
+)
+from app.middleware.logging import setup_logging
+from app.middleware.sampling import setup_sampling
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    shutdown_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_json_records_carry_request_fields(restore_root_logger):
+    """Records logged while handling a request include its fields"""
+    stream = io.StringIO()
+    configure_logging(level="INFO", log_format="json", stream=stream)
+    app = FastAPI()
+    setup_logging(app)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        logging.getLogger("app.test").info("Loading item %s", item_id)
+        return {"id": item_id}
+
+    response = TestClient(app).get("/items/abc")
+    shutdown_logging()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    completed = next(r for r in records if r["message"].startswith("Request completed"))
+    assert completed["request_id"] == response.headers["X-Request-ID"]
+    assert completed["route"] == "/items/{item_id}"
+    assert completed["status_code"] == 422
+    assert completed["latency_ms"] > 0
+    assert completed["level"] == "INFO"
+    assert completed["sample_weight"] == 1.0
+
+
+def test_sampled_records_carry_their_weight(restore_root_logger):
+    """Records kept at a sampling rate carry 1 / rate so counts can be re-scaled"""
+    stream = io.StringIO()
+    configure_logging(level="INFO", log_format="json", stream=stream)
+    app = FastAPI()
+    setup_logging(app)
+    sampler = setup_sampling(app, rules=[{"prefix": "/items", "rate": 0.25}])
+    sampler.random = random.Random(3).random
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    for _ in range(40):
+        client.get("/items/abc")
+    shutdown_logging()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    completed = [r for r in records if r["message"].startswith("Request completed")]
+    assert len(completed) == sampler.kept > 0
+    assert {r["sample_weight"] for r in completed} == {4.0}
+
+
+def test_arguments_are_merged_when_queued(restore_root_logger):
+    """Mutable arguments are captured at log time, not when written"""
+    stream = io.StringIO()
+    configure_logging(level="INFO", log_format="json", stream=stream)
+    items = ["a"]
+    logging.getLogger("app.test").info("Items: %s", items, extra={"order_id": 7})
+    items.append("b")
+    shutdown_logging()
+
+    record = json.loads(stream.getvalue())
+    assert record["message"] == "Items: ['a']"
+    assert record["order_id"] == 7
+
+
+def test_full_queue_drops_and_counts():
+    """Records are dropped instead of blocking when the queue is full"""
+    handler = BoundedQueueHandler(maxsize=2)
+    logger = logging.getLogger("app.test.overflow")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning("record %d", i)
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+    assert handler.dropped == 3
+    assert handler.queue.qsize() == 2
+
+
+def test_exceptions_are_formatted():
+    """Tracebacks are rendered into the exception field"""
+    try:
+        raise ValueError("bad value")
+    except ValueError:
+        record = logging.getLogger("app.test").makeRecord(
+            "app.test", logging.ERROR, __file__, 1, "Failed", None, sys.exc_info()
+        )
+
+    data = json.loads(JsonFormatter().format(record))
+    assert "ValueError: bad value" in data["exception"]
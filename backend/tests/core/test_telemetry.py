@@ -0,0 +1,283 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core import monitoring, telemetry
+from app.core.telemetry import (
+    AppInsightsSink,
+    LogAnalyticsSink,
+    TelemetryExporter,
+    TelemetrySink,
+    is_retryable,
+)
+from app.middleware.pipeline import get_request_pipeline
+
+
+class RecordingSink(TelemetrySink):
+    def __init__(self):
+        self.batches = []
+
+    def post(self, stream, payload):
+        self.batches.append((stream, [json.loads(line) for line in payload.splitlines()]))
+
+
+@pytest.fixture
+def slow_collector():
+    """Local stand-in for the ingestion endpoint that takes 0.5s per request"""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            time.sleep(0.5)
+            received.append(body)
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v2/track", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_latency_is_independent_of_exporter(slow_collector, monkeypatch):
+    """A slow telemetry endpoint does not slow down requests"""
+    endpoint, received = slow_collector
+    exporter = TelemetryExporter(
+        {"app_insights": AppInsightsSink(endpoint)}, max_batch_records=5, flush_interval=60
+    )
+    monkeypatch.setattr(telemetry, "_exporter", exporter)
+    monkeypatch.setattr(monitoring, "AZURE_APP_INSIGHTS_ENABLED", True)
+
+    app = FastAPI()
+    get_request_pipeline(app).on_response.append(monitoring.log_request_telemetry)
+
+    @app.get("/items")
+    def items():
+        return {"ok": True}
+
+    client = TestClient(app)
+    durations = []
+    for _ in range(20):
+        start = time.perf_counter()
+        assert client.get("/items").status_code == 200
+        durations.append(time.perf_counter() - start)
+
+    # Four full batches were handed to a collector taking 0.5s each
+    assert sum(durations) < 0.5
+
+    telemetry.shutdown_telemetry_exporter()
+    records = [json.loads(line) for body in received for line in body.splitlines()]
+    assert len(records) == 20
+    assert all(record["name"] == "APIRequest" for record in records)
+    assert exporter.exported == 20 and exporter.dropped == 0
+
+
+def test_shutdown_keeps_the_event_loop_running(monkeypatch):
+    """The final upload runs in the threadpool, not on the event loop"""
+    class SlowSink(RecordingSink):
+        def post(self, stream, payload):
+            time.sleep(0.3)
+            super().post(stream, payload)
+
+    sink = SlowSink()
+    exporter = TelemetryExporter({"app_insights": sink}, flush_interval=60)
+    monkeypatch.setattr(telemetry, "_exporter", exporter)
+    exporter.submit("app_insights", "events", {"name": "last"})
+
+    async def run():
+        ticks = 0
+        shutdown = asyncio.ensure_future(monitoring.shutdown_telemetry())
+        while not shutdown.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    assert asyncio.run(run()) > 10
+    assert sink.batches == [("events", [{"name": "last"}])]
+
+
+def test_full_queue_drops_oldest():
+    """Records beyond the queue size displace the oldest ones and are counted"""
+    sink = RecordingSink()
+    exporter = TelemetryExporter({"sink": sink}, max_queue=3, flush_interval=60)
+
+    for i in range(5):
+        exporter.submit("sink", "events", {"n": i})
+    exporter.shutdown()
+
+    assert exporter.dropped == 2
+    assert sink.batches == [("events", [{"n": 2}, {"n": 3}, {"n": 4}])]
+
+
+def test_batches_are_split_by_count_and_bytes():
+    """Batches are cut per stream at the record and byte limits"""
+    sink = RecordingSink()
+    exporter = TelemetryExporter(
+        {"sink": sink}, max_batch_records=3, max_batch_bytes=40, flush_interval=60
+    )
+
+    for i in range(4):
+        exporter.submit("sink", "small", {"n": i})
+    exporter.submit("sink", "large", {"text": "x" * 20})
+    exporter.submit("sink", "large", {"text": "y" * 20})
+    exporter.shutdown()
+
+    sizes = [(stream, len(records)) for stream, records in sink.batches]
+    assert sizes == [("small", 3), ("small", 1), ("large", 1), ("large", 1)]
+
+
+def test_failed_export_is_counted():
+    """Failed batches are logged and counted without reaching the caller"""
+
+    class FailingSink(TelemetrySink):
+        def post(self, stream, payload):
+            raise requests.ConnectionError("unreachable")
+
+    exporter = TelemetryExporter(
+        {"sink": FailingSink()}, flush_interval=60, max_retries=2, retry_backoff=0.001
+    )
+    exporter.submit("sink", "events", {"n": 1})
+    exporter.shutdown()
+
+    assert exporter.failed == 1 and exporter.exported == 0
+    assert exporter.stats["sink"].retries == 2
+    assert exporter.stats["sink"].failed_batches == 1
+
+
+def test_export_stats_are_published_as_metrics():
+    """Per-sink batches, records, bytes, retries, failures and drops reach /metrics"""
+
+    class FlakySink(RecordingSink):
+        failures = 1
+
+        def post(self, stream, payload):
+            if self.failures:
+                self.failures -= 1
+                raise requests.ConnectionError("reset")
+            super().post(stream, payload)
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"sink": "metrics_sink", **labels}) or 0
+
+    before = {
+        "exported": sample("telemetry_records_total", result="exported"),
+        "dropped": sample("telemetry_records_total", result="dropped"),
+        "batches": sample("telemetry_batches_total", result="exported"),
+        "retries": sample("telemetry_retries_total"),
+        "latencies": sample("telemetry_export_seconds_count"),
+    }
+    exporter = TelemetryExporter(
+        {"metrics_sink": FlakySink()}, max_queue=3, flush_interval=60, retry_backoff=0.001
+    )
+    for i in range(4):
+        exporter.submit("metrics_sink", "events", {"n": i})
+    exporter.shutdown()
+
+    assert exporter.stats["metrics_sink"].dropped == 1
+    assert sample("telemetry_records_total", result="exported") - before["exported"] == 3
+    assert sample("telemetry_records_total", result="dropped") - before["dropped"] == 1
+    assert sample("telemetry_batches_total", result="exported") - before["batches"] == 1
+    assert sample("telemetry_retries_total") - before["retries"] == 1
+    assert sample("telemetry_export_seconds_count") - before["latencies"] == 1
+    assert sample("telemetry_bytes_total") == exporter.stats["metrics_sink"].bytes
+
+
+@pytest.fixture
+def log_analytics_collector():
+    """Local stand-in for the Data Collector API answering with queued status codes"""
+    received = []
+    statuses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((dict(self.headers), body))
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/logs", received, statuses
+    server.shutdown()
+    server.server_close()
+
+
+def test_log_analytics_batch_is_one_signed_array(log_analytics_collector):
+    """A batch is posted as a single JSON array signed with the shared key"""
+    endpoint, received, _ = log_analytics_collector
+    key = base64.b64encode(b"secret").decode()
+    sink = LogAnalyticsSink("workspace", key, endpoint=endpoint)
+    exporter = TelemetryExporter({"log_analytics": sink}, flush_interval=60)
+
+    for i in range(3):
+        exporter.submit("log_analytics", "PravisBoutiqueAPI_Requests", {"n": i})
+    exporter.shutdown()
+
+    assert len(received) == 1
+    headers, body = received[0]
+    assert json.loads(body) == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert headers["Log-Type"] == "PravisBoutiqueAPI_Requests"
+    signature_string = f"POST\n{len(body)}\napplication/json\nx-ms-date:{headers['x-ms-date']}\n/api/logs"
+    expected = base64.b64encode(
+        hmac.new(b"secret", signature_string.encode(), digestmod=hashlib.sha256).digest()
+    ).decode()
+    assert headers["Authorization"] == f"SharedKey workspace:{expected}"
+
+    stats = exporter.stats["log_analytics"]
+    assert (stats.batches, stats.records, stats.bytes) == (1, 3, len(body))
+
+
+def test_rejected_batch_is_retried_once_per_failure(log_analytics_collector):
+    """Throttled batches are resent whole and counted once"""
+    endpoint, received, statuses = log_analytics_collector
+    statuses.extend([503, 429])
+    sink = LogAnalyticsSink("workspace", base64.b64encode(b"secret").decode(), endpoint=endpoint)
+    exporter = TelemetryExporter({"log_analytics": sink}, flush_interval=60, retry_backoff=0.001)
+
+    exporter.submit("log_analytics", "Logs", {"n": 1})
+    exporter.submit("log_analytics", "Logs", {"n": 2})
+    exporter.shutdown()
+
+    assert [json.loads(body) for _, body in received] == [[{"n": 1}, {"n": 2}]] * 3
+    stats = exporter.stats["log_analytics"]
+    assert stats.retries == 2 and stats.records == 2 and stats.failed_batches == 0
+
+
+def test_client_errors_and_read_timeouts_are_not_retried(log_analytics_collector):
+    """Only failures where the batch was certainly not ingested are retried"""
+    endpoint, received, statuses = log_analytics_collector
+    statuses.append(400)
+    sink = LogAnalyticsSink("workspace", base64.b64encode(b"secret").decode(), endpoint=endpoint)
+    exporter = TelemetryExporter({"log_analytics": sink}, flush_interval=60, retry_backoff=0.001)
+
+    exporter.submit("log_analytics", "Logs", {"n": 1})
+    exporter.shutdown()
+
+    assert len(received) == 1
+    assert exporter.stats["log_analytics"].failed_records == 1
+    assert not is_retryable(requests.ReadTimeout())
+    assert is_retryable(requests.ConnectTimeout())
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import pytest
+from jose import JWTError
+
+from app.core import auth
+from app.core.auth import create_access_token, decode_access_token
+from app.core.config import settings
+from app.core.token_cache import VerifiedTokenCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = VerifiedTokenCache(max_entries=100)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    return cache
+
+
+def test_repeated_tokens_are_served_from_cache(fresh_cache):
+    """Only the first presentation of a token is verified"""
+    token = create_access_token("42")
+
+    assert decode_access_token(token)["sub"] == "42"
+    assert decode_access_token(token)["sub"] == "42"
+    assert (fresh_cache.hits, fresh_cache.misses) == (1, 1)
+
+
+def test_entries_expire_with_the_token():
+    """Cached claims are not returned past the token's exp"""
+    cache = VerifiedTokenCache()
+    claims = {"sub": "42", "exp": 1000}
+    cache.set("token", claims, "key", "HS256")
+
+    assert cache.get("token", "key", "HS256", now=999) == claims
+    assert cache.get("token", "key", "HS256", now=1000) is None
+    assert len(cache) == 0
+
+
+def test_tokens_without_expiry_are_not_cached():
+    cache = VerifiedTokenCache()
+    cache.set("token", {"sub": "42"}, "key", "HS256")
+    assert len(cache) == 0
+
+
+def test_rotating_secret_key_invalidates_cache(fresh_cache, monkeypatch):
+    """Tokens signed with a retired key are rejected even if cached"""
+    token = create_access_token("42")
+    decode_access_token(token)
+
+    monkeypatch.setattr(settings, "SECRET_KEY", "rotated-key")
+
+    with pytest.raises(JWTError):
+        decode_access_token(token)
+    assert len(fresh_cache) == 0
+
+
+def test_tampered_token_is_verified_again(fresh_cache):
+    """A modified token never matches the cache entry of the original"""
+    token = create_access_token("42", expires_delta=timedelta(minutes=5))
+    decode_access_token(token)
+    header, payload, signature = token.split(".")
+
+    with pytest.raises(JWTError):
+        decode_access_token(f"{header}.{payload}.{signature[:-2]}AA")
+
+
+def test_cache_is_bounded():
+    """The least recently used token is evicted first"""
+    cache = VerifiedTokenCache(max_entries=2)
+    for name in ("a", "b"):
+        cache.set(name, {"exp": 2e9}, "key", "HS256")
+    cache.get("a", "key", "HS256")
+    cache.set("c", {"exp": 2e9}, "key", "HS256")
+
+    assert cache.get("b", "key", "HS256") is None
+    assert cache.get("a", "key", "HS256") is not None
+    assert len(cache) == 2
+
+
+def test_changing_returned_claims_does_not_change_the_cache():
+    token = create_access_token(subject="42")
+    decode_access_token(token)["sub"] = "changed"
+    decode_access_token(token)["role"] = "admin"
+
+    claims = decode_access_token(token)
+    assert claims["sub"] == "42"
+    assert "role" not in claims
@@ -0,0 +1,158 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.session import Base, create_async_db_engine, get_async_db
+from app.repositories import (
+    AsyncAnalyticsRepository,
+    AsyncUserRepository,
+    AsyncUserSessionRepository,
+    AsyncVoiceInteractionRepository,
+    VoiceInteractionRepository,
+)
+from app.schemas.analytics import AnalyticsEventCreate, UserSessionCreate, UserSessionUpdate, VoiceInteractionCreate
+from app.schemas.user import UserCreate, UserUpdate
+
+
+@pytest.fixture
+def run_with_session(tmp_path):
+    """Run a coroutine function with an AsyncSession on a fresh aiosqlite database"""
+    url = f"sqlite:///{tmp_path}/async.db"
+
+    def run(test):
+        async def main():
+            engine = create_async_db_engine(url, name="async-test")
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            sessions = async_sessionmaker(engine, expire_on_commit=False)
+            try:
+                async with sessions() as db:
+                    return await test(db)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
+
+
+def test_user_repository_round_trip(run_with_session):
+    async def test(db: AsyncSession):
+        user = await AsyncUserRepository.create(
+            db, obj_in=UserCreate(email="shopper@example.com", password="secret123", full_name="Shopper")
+        )
+        assert (await AsyncUserRepository.get(db, user.id)).email == "shopper@example.com"
+        assert (await AsyncUserRepository.get_by_email(db, "shopper@example.com")).id == user.id
+        assert [u.id for u in await AsyncUserRepository.get_multi(db)] == [user.id]
+
+        assert await AsyncUserRepository.authenticate(db, email=user.email, password="wrong") is None
+        assert await AsyncUserRepository.authenticate(db, email=user.email, password="secret123") is user
+
+        await AsyncUserRepository.update(db, db_obj=user, obj_in=UserUpdate(full_name="Renamed"))
+        await AsyncUserRepository.update_preferences(db, user_id=user.id, preferences={"theme": "dark"})
+        await AsyncUserRepository.update_preferences(db, user_id=user.id, preferences={"lang": "fr"})
+        stored = await AsyncUserRepository.get(db, user.id)
+        assert stored.full_name == "Renamed"
+        assert stored.preferences == {"theme": "dark", "lang": "fr"}
+        assert AsyncUserRepository.is_active(stored)
+
+        await AsyncUserRepository.delete(db, user_id=user.id)
+        return await AsyncUserRepository.get(db, user.id)
+
+    assert run_with_session(test) is None
+
+
+def test_analytics_repository_aggregates(run_with_session):
+    async def test(db: AsyncSession):
+        for event_type in ["view", "view", "purchase"]:
+            await AsyncAnalyticsRepository.create_event(
+                db, obj_in=AnalyticsEventCreate(event_type=event_type, event_data={"sku": "A1"})
+            )
+        events = await AsyncAnalyticsRepository.get_events(db, event_type="view")
+        report = await AsyncAnalyticsRepository.get_analytics_report(db, days=7)
+        return events, report
+
+    events, report = run_with_session(test)
+    assert len(events) == 2
+    assert report.total_events == 3
+    assert report.events_by_type == {"view": 2, "purchase": 1}
+    assert sum(report.events_by_day.values()) == 3
+
+
+def test_voice_interaction_repository(run_with_session):
+    async def test(db: AsyncSession):
+        for query, ok in [("find red dresses", True), ("track order", False)]:
+            await AsyncVoiceInteractionRepository.create_interaction(
+                db,
+                obj_in=VoiceInteractionCreate(
+                    query=query, response="...", metadata={"lang": "en"}, is_successful=ok, session_id="s1"
+                ),
+            )
+        interactions = await AsyncVoiceInteractionRepository.get_interactions(db, session_id="s1")
+        metrics = await AsyncVoiceInteractionRepository.get_interaction_metrics(db)
+        return interactions, metrics
+
+    interactions, metrics = run_with_session(test)
+    assert [i.interaction_metadata for i in interactions] == [{"lang": "en"}, {"lang": "en"}]
+    assert metrics.total_interactions == 2
+    assert metrics.successful_interactions == 1
+    assert metrics.average_query_length == pytest.approx((16 + 11) / 2)
+
+
+def test_user_session_repository(run_with_session):
+    async def test(db: AsyncSession):
+        for session_id in ["s1", "s2"]:
+            await AsyncUserSessionRepository.create_session(
+                db, obj_in=UserSessionCreate(session_id=session_id, device_info={"os": "ios"})
+            )
+        ended_at = datetime.utcnow() + timedelta(minutes=5)
+        await AsyncUserSessionRepository.end_session(
+            db, session_id="s1", obj_in=UserSessionUpdate(ended_at=ended_at)
+        )
+        active = await AsyncUserSessionRepository.get_active_sessions(db)
+        stats = await AsyncUserSessionRepository.get_session_stats(db)
+        missing = await AsyncUserSessionRepository.end_session(db, session_id="nope", obj_in=UserSessionUpdate())
+        return active, stats, missing
+
+    active, (total, active_count, avg_duration), missing = run_with_session(test)
+    assert [s.session_id for s in active] == ["s2"]
+    assert (total, active_count) == (2, 1)
+    assert avg_duration == pytest.approx(300, abs=5)
+    assert missing is None
+
+
+def test_sync_create_interaction_stores_metadata(db_session):
+    interaction = VoiceInteractionRepository.create_interaction(
+        db_session, obj_in=VoiceInteractionCreate(query="hi", response="hello", metadata={"lang": "en"})
+    )
+
+    assert interaction.interaction_metadata == {"lang": "en"}
+
+
+def test_get_async_db_dependency(tmp_path):
+    engine = create_async_db_engine(f"sqlite:///{tmp_path}/dep.db", name="async-dep")
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.dependency_overrides[get_async_db] = override_get_async_db
+
+    @app.on_event("startup")
+    async def create_tables():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    @app.get("/users/{email}")
+    async def read_user(email: str, db: AsyncSession = Depends(get_async_db)):
+        user = await AsyncUserRepository.get_by_email(db, email)
+        return {"found": user is not None}
+
+    with TestClient(app) as client:
+        assert client.get("/users/nobody@example.com").json() == {"found": False}
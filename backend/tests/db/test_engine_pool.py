@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.core.metrics import TimedQueuePool
+from app.db.session import create_db_engine
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_engine_uses_pool_settings(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/pool.db", name="settings")
+
+    assert isinstance(engine.pool, TimedQueuePool)
+    assert engine.pool.size() == 5
+    assert engine.pool._max_overflow == 10
+    assert engine.pool._pre_ping is True
+
+
+def test_in_memory_sqlite_keeps_its_default_pool():
+    engine = create_db_engine("sqlite://", name="memory")
+
+    assert not isinstance(engine.pool, TimedQueuePool)
+    with engine.connect() as connection:
+        assert connection.execute(text("select 1")).scalar() == 1
+
+
+def hold_connections(engine, workers, hold):
+    """Check out a connection in each of ``workers`` threads at once"""
+    start = threading.Barrier(workers)
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker():
+        start.wait()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("select 1"))
+                time.sleep(hold)
+            outcome = "ok"
+        except PoolTimeoutError:
+            outcome = "timeout"
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+@pytest.mark.parametrize("pool_timeout, expected_timeouts", [(0.1, 3), (5.0, 0)])
+def test_concurrency_beyond_pool_capacity(tmp_path, pool_timeout, expected_timeouts):
+    """
+    Six threads share 2 + 1 overflow connections. Three wait; with a short
+    pool_timeout they fail, with a long one they get a connection once one
+    is returned.
+    """
+    name = f"stress-{pool_timeout}"
+    engine = create_db_engine(
+        f"sqlite:///{tmp_path}/stress.db",
+        name=name,
+        pool_size=2,
+        max_overflow=1,
+        pool_timeout=pool_timeout,
+    )
+
+    outcomes = hold_connections(engine, workers=6, hold=0.3)
+
+    assert outcomes.count("timeout") == expected_timeouts
+    assert outcomes.count("ok") == 6 - expected_timeouts
+    assert sample("db_pool_timeouts_total", pool=name) == expected_timeouts
+    assert sample("db_pool_wait_seconds_count", pool=name) == 6
+    if expected_timeouts == 0:
+        # The waiting checkouts were served after a held connection came back
+        assert sample("db_pool_wait_seconds_bucket", pool=name, le="0.1") == 3
+    assert sample("db_pool_connections_created_total", pool=name) == 3
+    assert sample("db_pool_connections_in_use", pool=name) == 0
+    # The overflow connection was closed when it came back
+    assert sample("db_pool_overflow", pool=name) == 0
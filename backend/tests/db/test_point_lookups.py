@@ -0,0 +1,45 @@
+from db_utils import CRUDBase
+from app.core.config import settings
+from app.db.lookups import PointLookup
+from app.models.user import User
+from app.repositories.analytics import UserSessionRepository
+from app.repositories.user import UserRepository
+from app.schemas.analytics import UserSessionCreate
+
+
+def add_user(db, email):
+    user = User(email=email, hashed_password="x", preferences={})
+    db.add(user)
+    db.flush()
+    return user
+
+
+def test_repository_lookups(db_session):
+    user = add_user(db_session, "lookup@example.com")
+    UserSessionRepository.create_session(db_session, obj_in=UserSessionCreate(session_id="s-1", user_id=user.id))
+
+    assert UserRepository.get(db_session, user.id) is user
+    assert UserRepository.get_by_email(db_session, "lookup@example.com") is user
+    assert UserSessionRepository.get_session_by_id(db_session, session_id="s-1").user_id == user.id
+    assert CRUDBase(User).get(db_session, user.id) is user
+
+    assert UserRepository.get(db_session, user.id + 1000) is None
+    assert UserRepository.get_by_email(db_session, "missing@example.com") is None
+    assert UserSessionRepository.get_session_by_id(db_session, session_id="missing") is None
+
+
+def test_postgres_prepared_statement():
+    lookup = PointLookup(User, User.email)
+
+    assert lookup.name == "users_by_email"
+    assert lookup.prepare_sql.startswith("PREPARE users_by_email AS SELECT users.id,")
+    assert lookup.prepare_sql.endswith("WHERE users.email = $1 \n LIMIT $2")
+    assert str(lookup.prepared_statement) == "EXECUTE users_by_email(:value, :p1)"
+    assert lookup._prepared_params == {"p1": 1}
+
+
+def test_prepared_statements_setting_is_ignored_off_postgres(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "DB_PREPARED_STATEMENTS", True)
+    user = add_user(db_session, "sqlite@example.com")
+
+    assert UserRepository.get(db_session, user.id) is user
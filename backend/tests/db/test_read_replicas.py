@@ -0,0 +1,91 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import session as db_session_module
+from app.db.replicas import Replica, ReplicaRouter
+from app.db.session import READ_YOUR_WRITES_COOKIE, SessionLocal, create_db_engine, get_read_db, get_write_db
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """A primary and a replica SQLite file; the replica holds a stale copy"""
+    engines = {}
+    for name in ["primary", "replica"]:
+        engine = create_db_engine(f"sqlite:///{tmp_path}/{name}.db", name=f"rw-{name}")
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE items (name TEXT)"))
+            connection.execute(text("INSERT INTO items VALUES ('replicated')"))
+        engines[name] = engine
+    return engines
+
+
+def names(db: Session):
+    return [row[0] for row in db.execute(text("SELECT name FROM items ORDER BY rowid"))]
+
+
+def test_weighted_round_robin(databases):
+    a = Replica("a", databases["replica"], weight=3)
+    b = Replica("b", create_db_engine(str(databases["replica"].url), name="rw-b"), weight=1)
+    router = ReplicaRouter(databases["primary"], [a, b], probe=lambda connection: 0.0)
+
+    chosen = [router.choose(now=0) for _ in range(8)]
+
+    assert chosen == [a.engine, a.engine, b.engine, a.engine] * 2
+
+
+def test_lagging_or_failing_replica_falls_back_to_primary(databases):
+    lag = {"seconds": 30.0}
+
+    def probe(connection):
+        if lag["seconds"] is None:
+            raise ConnectionError("replica down")
+        return lag["seconds"]
+
+    replica = Replica("replica", databases["replica"])
+    router = ReplicaRouter(databases["primary"], [replica], max_lag=5, check_interval=10, probe=probe)
+
+    assert router.choose(now=0) is databases["primary"]
+    assert replica.lag == 30.0
+
+    # The next measurement is only taken once check_interval has passed
+    lag["seconds"] = 1.0
+    assert router.choose(now=5) is databases["primary"]
+    assert router.choose(now=10) is databases["replica"]
+
+    lag["seconds"] = None
+    assert router.choose(now=20) is databases["primary"]
+    assert replica.lag is None
+    assert router.choose(use_primary=True, now=20) is databases["primary"]
+
+
+def test_read_your_writes(databases, monkeypatch):
+    router = ReplicaRouter(databases["primary"], [Replica("replica", databases["replica"])], probe=lambda c: 0.0)
+    monkeypatch.setattr(db_session_module, "read_router", router)
+    monkeypatch.setitem(SessionLocal.kw, "bind", databases["primary"])
+
+    app = FastAPI()
+
+    @app.post("/items/{name}")
+    def create_item(name: str, db: Session = Depends(get_write_db)):
+        db.execute(text("INSERT INTO items VALUES (:name)"), {"name": name})
+        db.commit()
+        return {"created": name}
+
+    @app.get("/items")
+    def list_items(db: Session = Depends(get_read_db)):
+        return names(db)
+
+    with TestClient(app) as client:
+        # Reads are served by the replica, which has not seen the new row
+        assert client.get("/items").json() == ["replicated"]
+
+        response = client.post("/items/new")
+        assert READ_YOUR_WRITES_COOKIE in response.cookies
+        # The writing client reads from the primary while the cookie is valid
+        assert client.get("/items").json() == ["replicated", "new"]
+
+    with TestClient(app) as other_client:
+        assert other_client.get("/items").json() == ["replicated"]
@@ -0,0 +1,107 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.instrumentation import normalize_statement, setup_sql_instrumentation
+from app.db.session import create_db_engine
+from app.middleware.pipeline import get_request_pipeline
+
+
+@pytest.mark.parametrize(
+    "statement, shape",
+    [
+        ("SELECT * FROM users WHERE id = ?", "SELECT * FROM users WHERE id = ?"),
+        ("SELECT * FROM users\n WHERE email = %(email_1)s LIMIT %(param_1)s", "SELECT * FROM users WHERE email = ? LIMIT ?"),
+        ("SELECT * FROM t WHERE a = $1 AND b = 'it''s' AND c > 42", "SELECT * FROM t WHERE a = ? AND b = ? AND c > ?"),
+        ("SELECT * FROM t WHERE id IN (:id_1, :id_2, :id_3)", "SELECT * FROM t WHERE id IN (?)"),
+        ("SELECT x::text FROM anon_1", "SELECT x::text FROM anon_1"),
+    ],
+)
+def test_normalize_statement(statement, shape):
+    assert normalize_statement(statement) == shape
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/sql.db", name="instrumented")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO items VALUES (1, 'a'), (2, 'b'), (3, 'c')"))
+
+    def make(environment="development"):
+        monkeypatch.setattr(settings, "ENVIRONMENT", environment)
+        app = FastAPI()
+        completed = []
+        get_request_pipeline(app).on_response.append(completed.append)
+        setup_sql_instrumentation(app)
+
+        @app.get("/items")
+        def items():
+            # One query per row: the N+1 shape
+            with engine.connect() as connection:
+                ids = connection.execute(text("SELECT id FROM items")).scalars().all()
+                return [
+                    connection.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i}).scalar()
+                    for i in ids
+                ]
+
+        return TestClient(app), completed
+
+    return make
+
+
+def test_request_statistics_and_headers(make_client):
+    client, completed = make_client()
+
+    response = client.get("/items")
+
+    assert response.json() == ["a", "b", "c"]
+    assert response.headers["X-DB-Queries"] == "4"
+    assert float(response.headers["X-DB-Time"]) > 0
+    context = completed[0]
+    assert context.db_queries == 4
+    assert context.db_statement_counts == {
+        "SELECT id FROM items": 1,
+        "SELECT name FROM items WHERE id = ?": 3,
+    }
+    assert context.db_slowest_statement in context.db_statement_counts
+
+
+def test_no_headers_in_production(make_client):
+    client, completed = make_client("production")
+
+    response = client.get("/items")
+
+    assert "X-DB-Queries" not in response.headers
+    assert completed[0].db_queries == 4
+
+
+def test_repeated_statement_shape_is_flagged(make_client, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "DB_N_PLUS_ONE_THRESHOLD", 3)
+    client, _ = make_client()
+
+    with caplog.at_level(logging.WARNING, logger="app.db.instrumentation"):
+        client.get("/items")
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "Suspected N+1 query: GET /items ran 3 times: SELECT name FROM items WHERE id = ?"
+    ]
+
+
+def test_slow_query_log_with_plan(make_client, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_MS", 1e-6)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_EXPLAIN", True)
+    client, completed = make_client()
+
+    with caplog.at_level(logging.WARNING, logger="app.db.slow_queries"):
+        client.get("/items")
+
+    lookups = [r for r in caplog.records if r.statement == "SELECT name FROM items WHERE id = ?"]
+    assert len(lookups) == 3
+    assert "USING INTEGER PRIMARY KEY" in lookups[0].plan
+    # EXPLAIN runs outside the instrumentation
+    assert completed[0].db_queries == 4
@@ -0,0 +1,217 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401 - registers every table on Base
+from app.core import cache_invalidation
+from app.db import write_behind
+from app.db.session import Base, create_db_engine
+from app.db.write_behind import BufferFull, WriteBehindBuffer
+from app.middleware.cache import CacheMiddleware, LRUCacheTier, ResponseCache
+from app.models.analytics import AnalyticsEvent, UserSession
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/write_behind.db", name="write_behind")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def spill_dir(tmp_path):
+    return str(tmp_path / "spill")
+
+
+def broken_sessions():
+    return sessionmaker(bind=create_db_engine("sqlite:////nonexistent/dir/down.db", name="down"))()
+
+
+class FlakySessions:
+    """Session factory whose first ``failures`` sessions cannot connect"""
+
+    def __init__(self, sessions, failures):
+        self.sessions = sessions
+        self.failures = failures
+
+    def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            return broken_sessions()
+        return self.sessions()
+
+
+def event(i, **row):
+    return {"event_type": "page_view", "user_id": None, "event_data": {"i": i}, "timestamp": datetime(2024, 5, 1, 12, i), **row}
+
+
+def count_rows(sessions, model):
+    with sessions() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+
+def wait_for_rows(sessions, model, expected, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while count_rows(sessions, model) < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return count_rows(sessions, model)
+
+
+def test_flushes_when_flush_rows_are_waiting(sessions):
+    buffer = WriteBehindBuffer(sessions, flush_rows=3, flush_interval=60)
+    for i in range(3):
+        buffer.submit("analytics_event", event(i))
+
+    assert wait_for_rows(sessions, AnalyticsEvent, 3) == 3
+    buffer.shutdown()
+
+
+def test_flushes_on_the_interval(sessions):
+    buffer = WriteBehindBuffer(sessions, flush_rows=1000, flush_interval=0.05)
+    buffer.submit("analytics_event", event(0))
+
+    assert wait_for_rows(sessions, AnalyticsEvent, 1) == 1
+    buffer.shutdown()
+
+
+def test_shutdown_flushes_buffered_rows(sessions):
+    buffer = WriteBehindBuffer(sessions, flush_rows=1000, flush_interval=60)
+    buffer.submit("analytics_event", event(0))
+    buffer.submit("user_session", {"session_id": "s-1", "is_active": True, "started_at": datetime.utcnow()})
+
+    buffer.shutdown()
+
+    assert len(buffer) == 0
+    assert count_rows(sessions, AnalyticsEvent) == 1
+    assert count_rows(sessions, UserSession) == 1
+
+
+def test_full_buffer_rejects_with_429(client, sessions, monkeypatch):
+    buffer = WriteBehindBuffer(sessions, max_rows=2, flush_rows=1000, flush_interval=60)
+    monkeypatch.setattr(write_behind, "_buffer", buffer)
+    for i in range(2):
+        response = client.post("/api/v1/analytics/events", json={"event_type": "page_view", "event_data": {"i": i}})
+        assert response.status_code == 202
+
+    response = client.post("/api/v1/analytics/events", json={"event_type": "page_view"})
+
+    assert response.status_code == 429
+    assert response.json()["code"] == "write_behind_full"
+    assert response.headers["Retry-After"] == "60"
+    with pytest.raises(BufferFull):
+        buffer.submit("analytics_event", event(2))
+    buffer.shutdown()
+    assert count_rows(sessions, AnalyticsEvent) == 2
+
+
+def test_failed_flush_is_retried_with_backoff(sessions):
+    flaky = FlakySessions(sessions, failures=2)
+    buffer = WriteBehindBuffer(flaky, flush_rows=1000, flush_interval=0.01, retry_backoff=0.01)
+    buffer.submit("analytics_event", event(1))
+    buffer.submit("analytics_event", event(2))
+
+    assert wait_for_rows(sessions, AnalyticsEvent, 2) == 2
+    assert flaky.failures == 0
+    buffer.shutdown()
+
+
+def test_rows_are_dropped_after_max_retries():
+    buffer = WriteBehindBuffer(broken_sessions, flush_rows=1000, flush_interval=60, max_retries=1)
+    buffer.submit("analytics_event", event(1))
+
+    buffer.flush()
+    # Requeued at the head for one more attempt
+    assert len(buffer) == 1
+    buffer.flush()
+    assert len(buffer) == 0
+    buffer.shutdown()
+
+
+def test_worker_replays_spill_files_without_new_rows(sessions, spill_dir):
+    down = WriteBehindBuffer(broken_sessions, flush_rows=1000, flush_interval=60, spill_dir=spill_dir)
+    down.submit("analytics_event", event(1))
+    down.shutdown()
+
+    buffer = WriteBehindBuffer(sessions, flush_interval=0.01, spill_dir=spill_dir)
+    buffer.start()
+
+    assert wait_for_rows(sessions, AnalyticsEvent, 1) == 1
+    buffer.shutdown()
+    assert os.listdir(spill_dir) == []
+
+
+def test_failed_flush_spills_and_is_replayed(sessions, spill_dir):
+    down = WriteBehindBuffer(broken_sessions, flush_rows=1000, flush_interval=60, spill_dir=spill_dir)
+    down.submit("analytics_event", event(1))
+    down.submit("analytics_event", event(2))
+    down.shutdown()
+    assert count_rows(sessions, AnalyticsEvent) == 0
+
+    assert WriteBehindBuffer(sessions, spill_dir=spill_dir).replay() == 2
+
+    with sessions() as db:
+        timestamps = db.scalars(select(AnalyticsEvent.timestamp).order_by(AnalyticsEvent.id)).all()
+    assert timestamps == [datetime(2024, 5, 1, 12, 1), datetime(2024, 5, 1, 12, 2)]
+    assert os.listdir(spill_dir) == []
+
+
+def test_journal_of_a_crashed_process_is_replayed(sessions, spill_dir):
+    crashed = WriteBehindBuffer(sessions, flush_rows=1000, flush_interval=60, spill_dir=spill_dir)
+    crashed.submit("analytics_event", event(1))
+    crashed._journal.write('{"kind": "analytics_event", "row": {"event_')
+    crashed._journal.flush()
+    restarted = WriteBehindBuffer(sessions, spill_dir=spill_dir)
+
+    # The segment of a live buffer is locked and skipped
+    assert restarted.replay() == 0
+
+    # The process dies: its lock goes with it, and the torn last line is dropped
+    crashed._journal.close()
+    assert restarted.replay() == 1
+    assert count_rows(sessions, AnalyticsEvent) == 1
+
+
+def test_rows_rejected_by_the_database_are_dropped(sessions):
+    buffer = WriteBehindBuffer(sessions, flush_rows=1000, flush_interval=60)
+    for session_id in ["s-1", "s-1", "s-2"]:
+        buffer.submit("user_session", {"session_id": session_id, "is_active": True, "started_at": datetime.utcnow()})
+    buffer.submit("analytics_event", event(0))
+
+    buffer.shutdown()
+
+    with sessions() as db:
+        assert db.scalars(select(UserSession.session_id).order_by(UserSession.id)).all() == ["s-1", "s-2"]
+    assert count_rows(sessions, AnalyticsEvent) == 1
+
+
+def test_shutdown_does_not_block_the_cache_invalidation(sessions, monkeypatch, caplog):
+    """The final flush invalidates through the event loop the shutdown handler runs on"""
+    cache = ResponseCache(LRUCacheTier(1024))
+    monkeypatch.setattr(cache_invalidation, "_invalidator", cache.invalidate)
+    buffer = WriteBehindBuffer(sessions, flush_rows=1000, flush_interval=60)
+    monkeypatch.setattr(write_behind, "_buffer", buffer)
+
+    app = FastAPI()
+    app.add_middleware(CacheMiddleware, cache=cache)
+    app.add_event_handler("shutdown", write_behind.shutdown_write_behind_buffer)
+
+    @app.get("/items")
+    def items():
+        return []
+
+    with TestClient(app) as client:
+        # Attaches the cache to the application's event loop
+        client.get("/items")
+        buffer.submit("analytics_event", event(0))
+        started = time.perf_counter()
+
+    assert time.perf_counter() - started < 0.5
+    assert "did not complete" not in caplog.text
+    assert count_rows(sessions, AnalyticsEvent) == 1
@@ -0,0 +1,223 @@
+import asyncio
+import time
+from contextvars import ContextVar
+
+import fakeredis
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+from app.middleware.cache import (
+    CacheMiddleware,
+    CachedResponse,
+    LRUCacheTier,
+    RedisCacheTier,
+    ResponseCache,
+)
+
+
+def make_app(rules=None, max_entry_bytes=1024):
+    app = FastAPI()
+    calls = {"items": 0, "large": 0, "private": 0}
+
+    @app.get("/items")
+    def items():
+        calls["items"] += 1
+        return {"version": calls["items"]}
+
+    @app.get("/large")
+    def large():
+        calls["large"] += 1
+        return PlainTextResponse("x" * 4096)
+
+    @app.get("/private")
+    def private():
+        calls["private"] += 1
+        return Response("secret", headers={"Cache-Control": "private"})
+
+    @app.get("/tagged")
+    def tagged():
+        return PlainTextResponse("x" * 4096, headers={"X-Cache-Tags": "products"})
+
+    cache = ResponseCache(LRUCacheTier(max_bytes=1024 * 1024))
+    app.add_middleware(
+        CacheMiddleware,
+        ttl=60,
+        rules=rules or [],
+        cache=cache,
+        max_entry_bytes=max_entry_bytes,
+    )
+    return app, cache, calls
+
+
+def test_hit_after_miss():
+    """A second GET is served from the cache"""
+    app, _, calls = make_app()
+    client = TestClient(app)
+
+    first = client.get("/items")
+    second = client.get("/items")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert calls["items"] == 1
+
+
+def test_conditional_request_returns_304():
+    """If-None-Match with the current ETag gets an empty 304"""
+    app, _, _ = make_app()
+    client = TestClient(app)
+
+    etag = client.get("/items").headers["ETag"]
+    response = client.get("/items", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_uncacheable_responses_are_not_stored():
+    """Private responses and bypassed routes always reach the handler"""
+    app, _, calls = make_app(rules=[{"prefix": "/items", "bypass": True}])
+    client = TestClient(app)
+
+    client.get("/private")
+    client.get("/private")
+    client.get("/items")
+    client.get("/items")
+
+    assert calls["private"] == 2
+    assert calls["items"] == 2
+
+
+def test_large_responses_stream_through():
+    """Responses above the entry size limit are neither buffered nor cached"""
+    app, cache, calls = make_app(max_entry_bytes=1024)
+    client = TestClient(app)
+
+    response = client.get("/large")
+    client.get("/large")
+
+    assert response.headers["X-Cache"] == "BYPASS"
+    assert len(response.content) == 4096
+    assert calls["large"] == 2
+    assert len(cache.local) == 0
+
+
+def test_stale_while_revalidate():
+    """Stale entries are served while a background refresh updates them"""
+    app, cache, calls = make_app(
+        rules=[{"prefix": "/items", "ttl": 1, "stale_while_revalidate": 60}]
+    )
+
+    with TestClient(app) as client:
+        client.get("/items")
+        entry = next(iter(cache.local._entries.values()))
+        entry.stored_at -= 5
+
+        stale = client.get("/items")
+        assert stale.headers["X-Cache"] == "STALE"
+        assert stale.json() == {"version": 1}
+
+        for _ in range(50):
+            if calls["items"] == 2:
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)
+        fresh = client.get("/items")
+
+    assert fresh.headers["X-Cache"] == "HIT"
+    assert fresh.json() == {"version": 2}
+
+
+def test_requests_with_credentials_are_not_cached():
+    """Cookie and Authorization requests reach the handler on routes not keyed by them"""
+    app, cache, calls = make_app()
+    client = TestClient(app)
+
+    for headers in ({"Cookie": "session=alice"}, {"Authorization": "Bearer alice"}):
+        client.get("/items", headers=headers)
+        client.get("/items", headers=headers)
+
+    assert calls["items"] == 4
+    assert len(cache.local) == 0
+
+
+def test_cache_tags_header_is_never_sent():
+    """The internal X-Cache-Tags header is stripped from bypassed responses too"""
+    app, _, _ = make_app(max_entry_bytes=1024)
+    client = TestClient(app)
+
+    streamed = client.get("/tagged")
+    bypassed = client.get("/tagged", headers={"Cache-Control": "no-store"})
+
+    assert streamed.headers["X-Cache"] == "BYPASS"
+    assert "x-cache-tags" not in streamed.headers
+    assert "x-cache-tags" not in bypassed.headers
+
+
+def test_revalidation_runs_outside_the_request_context():
+    """Background refreshes do not inherit the stale request's context variables"""
+    request_id = ContextVar("request_id", default=None)
+    seen = []
+    cache = ResponseCache(LRUCacheTier(max_bytes=1024 * 1024))
+    app = FastAPI()
+
+    @app.get("/items")
+    def items():
+        seen.append(request_id.get())
+        return {"version": len(seen)}
+
+    app.add_middleware(
+        CacheMiddleware,
+        rules=[{"prefix": "/items", "ttl": 1, "stale_while_revalidate": 60}],
+        cache=cache,
+    )
+
+    async def with_request_id(scope, receive, send):
+        request_id.set("request")
+        await app(scope, receive, send)
+
+    with TestClient(with_request_id) as client:
+        client.get("/items")
+        next(iter(cache.local._entries.values())).stored_at -= 5
+        assert client.get("/items").headers["X-Cache"] == "STALE"
+        for _ in range(50):
+            if len(seen) == 2:
+                break
+            time.sleep(0.01)
+
+    # Sync handlers run in the threadpool with a copy of the caller's context
+    assert seen == ["request", None]
+
+
+def test_lru_tier_is_bounded_by_size():
+    """The local tier evicts least recently used entries past its byte budget"""
+    tier = LRUCacheTier(max_bytes=300)
+    for i in range(5):
+        tier.set(str(i), CachedResponse(200, [], b"x" * 100, '"e"', time.time(), 60))
+
+    assert len(tier) == 3
+    assert tier.current_bytes == 300
+    assert tier.get("0") is None
+    assert tier.get("4") is not None
+
+
+def test_shared_tier_is_visible_to_other_workers():
+    """An entry stored by one worker is served to another through Redis"""
+    async def run():
+        server = fakeredis.FakeServer()
+        worker_a = ResponseCache(
+            LRUCacheTier(1024), RedisCacheTier(fakeredis.FakeAsyncRedis(server=server))
+        )
+        worker_b = ResponseCache(
+            LRUCacheTier(1024), RedisCacheTier(fakeredis.FakeAsyncRedis(server=server))
+        )
+        await worker_a.set("key", CachedResponse(200, [(b"content-type", b"text/plain")], b"body", '"e"', time.time(), 60))
+        return await worker_b.get("key")
+
+    entry = asyncio.run(run())
+    assert entry.body == b"body"
+    assert entry.headers == [(b"content-type", b"text/plain")]
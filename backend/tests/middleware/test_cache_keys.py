@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import fakeredis
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.cache import (
+    CacheMiddleware,
+    CachedResponse,
+    LRUCacheTier,
+    RedisCacheTier,
+    ResponseCache,
+)
+from app.middleware.cache_keys import build_cache_key
+
+
+def scope(path="/items", query=b"", headers=()):
+    return {"path": path, "query_string": query, "headers": list(headers)}
+
+
+def test_query_parameter_order_does_not_split_keys():
+    """Equivalent query strings map to the same key"""
+    assert build_cache_key(scope(query=b"b=2&a=1")) == build_cache_key(scope(query=b"a=1&b=2"))
+    assert build_cache_key(scope(query=b"a=1")) != build_cache_key(scope(query=b"a=2"))
+
+
+def test_accept_encoding_is_always_part_of_the_key():
+    """Compressed and uncompressed bodies never share a key"""
+    gzip = scope(headers=[(b"accept-encoding", b"gzip, br")])
+    same_gzip = scope(headers=[(b"accept-encoding", b"br,gzip")])
+    identity = scope()
+
+    assert build_cache_key(gzip) == build_cache_key(same_gzip)
+    assert build_cache_key(gzip) != build_cache_key(identity)
+
+
+def test_declared_vary_headers_split_keys():
+    """Headers a route varies on are part of its key"""
+    alice = scope(headers=[(b"authorization", b"Bearer alice")])
+    bob = scope(headers=[(b"authorization", b"Bearer bob")])
+
+    assert build_cache_key(alice) == build_cache_key(bob)
+    assert build_cache_key(alice, vary=["Authorization"]) != build_cache_key(bob, vary=["Authorization"])
+
+
+def make_app(cache):
+    app = FastAPI()
+    calls = {"me": 0}
+
+    @app.get("/me")
+    def me(request: Request):
+        calls["me"] += 1
+        user = request.headers["authorization"].split()[-1]
+        return JSONResponse(
+            {"user": user},
+            headers={"Cache-Control": "private, max-age=60", "X-Cache-Tags": f"user:{user}"},
+        )
+
+    @app.post("/users/{user}")
+    def update(user: str):
+        cache.invalidate(f"user:{user}")
+        return {}
+
+    app.add_middleware(
+        CacheMiddleware,
+        rules=[{"prefix": "/me", "vary": ["authorization"]}],
+        cache=cache,
+    )
+    return app, calls
+
+
+def test_per_user_responses_are_cached_per_user():
+    """Routes varying on Authorization cache each user's response separately"""
+    app, calls = make_app(ResponseCache(LRUCacheTier(1024 * 1024)))
+    client = TestClient(app)
+
+    alice = client.get("/me", headers={"Authorization": "Bearer alice"})
+    bob = client.get("/me", headers={"Authorization": "Bearer bob"})
+    alice_again = client.get("/me", headers={"Authorization": "Bearer alice"})
+
+    assert alice.json() == {"user": "alice"}
+    assert bob.json() == {"user": "bob"}
+    assert alice_again.json() == {"user": "alice"}
+    assert alice_again.headers["X-Cache"] == "HIT"
+    assert "x-cache-tags" not in alice_again.headers
+    assert "authorization" in alice_again.headers["Vary"]
+    assert calls["me"] == 2
+
+
+def test_write_paths_invalidate_tags_from_worker_threads():
+    """Invalidating a tag from a sync endpoint drops only the tagged entries"""
+    cache = ResponseCache(LRUCacheTier(1024 * 1024))
+    app, calls = make_app(cache)
+
+    with TestClient(app) as client:
+        client.get("/me", headers={"Authorization": "Bearer alice"})
+        client.get("/me", headers={"Authorization": "Bearer bob"})
+        client.post("/users/alice")
+        alice = client.get("/me", headers={"Authorization": "Bearer alice"})
+        bob = client.get("/me", headers={"Authorization": "Bearer bob"})
+
+    assert alice.headers["X-Cache"] == "MISS"
+    assert bob.headers["X-Cache"] == "HIT"
+    assert calls["me"] == 3
+
+
+def test_shared_tier_invalidates_tags():
+    """Tag invalidation removes entries from the shared tier for every worker"""
+    async def run():
+        server = fakeredis.FakeServer()
+        worker_a = ResponseCache(LRUCacheTier(1024), RedisCacheTier(fakeredis.FakeAsyncRedis(server=server)))
+        worker_b = ResponseCache(LRUCacheTier(1024), RedisCacheTier(fakeredis.FakeAsyncRedis(server=server)))
+
+        def entry(tags):
+            return CachedResponse(200, [], b"body", '"e"', time.time(), 60, tags=tags)
+
+        await worker_a.set("events", entry(("analytics_events",)))
+        await worker_a.set("user", entry(("user:42",)))
+        await worker_b.invalidate_tags(["analytics_events"])
+        worker_a.local.clear()
+        return await worker_a.get("events"), await worker_a.get("user")
+
+    events, user = asyncio.run(run())
+    assert events is None
+    assert user is not None and user.tags == ("user:42",)
+
+
+def test_invalidation_reaches_other_workers_local_tier():
+    """A fresh entry in one worker's LRU is dropped when another worker invalidates its tag"""
+    async def run():
+        server = fakeredis.FakeServer()
+        worker_a = ResponseCache(LRUCacheTier(1024), RedisCacheTier(fakeredis.FakeAsyncRedis(server=server)))
+        worker_b = ResponseCache(LRUCacheTier(1024), RedisCacheTier(fakeredis.FakeAsyncRedis(server=server)))
+        await worker_a.get("warm-up")
+        while not worker_a.subscribed:
+            await asyncio.sleep(0.01)
+
+        await worker_a.set("user", CachedResponse(200, [], b"body", '"e"', time.time(), 60, tags=("user:42",)))
+        await worker_b.invalidate_tags(["user:42"])
+        for _ in range(100):
+            if worker_a.local.get("user") is None:
+                break
+            await asyncio.sleep(0.01)
+        user = await worker_a.get("user")
+        await worker_a.close()
+        await worker_b.close()
+        return user
+
+    assert asyncio.run(run()) is None
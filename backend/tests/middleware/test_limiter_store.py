@@ -0,0 +1,59 @@
+import asyncio
+
+import fakeredis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.middleware.limiter_store import MemoryLimiterStore, RedisLimiterStore
+
+
+class UnreachableRedis:
+    """Stand-in client whose scripts always fail to connect"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, script):
+        async def run(keys=None, args=None):
+            self.calls += 1
+            raise RedisConnectionError("Connection refused")
+        return run
+
+    async def close(self):
+        pass
+
+
+def test_redis_store_shares_limits_between_workers():
+    """Two stores on the same server share a single budget"""
+    async def run():
+        server = fakeredis.FakeServer()
+        worker_a = RedisLimiterStore(fakeredis.FakeAsyncRedis(server=server))
+        worker_b = RedisLimiterStore(fakeredis.FakeAsyncRedis(server=server))
+
+        # 1 request per second with a burst of 2
+        results = [
+            await worker_a.hit("client", 1.0, 2.0),
+            await worker_b.hit("client", 1.0, 2.0),
+            await worker_a.hit("client", 1.0, 2.0),
+            await worker_b.hit("client", 1.0, 2.0),
+        ]
+        return results
+
+    results = asyncio.run(run())
+    assert results[0] == (False, 0)
+    assert results[1] == (False, 0)
+    assert results[2] == (True, 1)
+    assert results[3] == (True, 1)
+
+
+def test_redis_store_falls_back_when_unreachable():
+    """An unreachable store degrades to local limits without retrying every call"""
+    async def run():
+        client = UnreachableRedis()
+        store = RedisLimiterStore(client, fallback=MemoryLimiterStore(), retry_interval=60)
+        results = [await store.hit("client", 1.0, 1.0) for _ in range(3)]
+        return client, store, results
+
+    client, store, results = asyncio.run(run())
+    assert results == [(False, 0), (True, 1), (True, 1)]
+    assert client.calls == 1
+    assert not store.available
@@ -0,0 +1,69 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.pipeline import get_request_context, get_request_pipeline
+from app.middleware.rate_limiter import RateLimiter
+
+
+def make_app():
+    app = FastAPI()
+    pipeline = get_request_pipeline(app)
+    completed = []
+    pipeline.on_response.append(completed.append)
+
+    @app.get("/items")
+    def items(request: Request):
+        return {
+            "request_id": request.state.request_id,
+            "context_id": get_request_context().request_id,
+        }
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a", b"b", b"c"]), media_type="text/plain")
+
+    return app, pipeline, completed
+
+
+def test_request_id_and_timing_headers():
+    """Every response carries the request ID and processing time"""
+    app, _, completed = make_app()
+    client = TestClient(app)
+
+    response = client.get("/items")
+
+    assert response.status_code == 200
+    request_id = response.headers["X-Request-ID"]
+    assert response.json() == {"request_id": request_id, "context_id": request_id}
+    assert float(response.headers["X-Process-Time"]) >= 0
+    assert completed[0].request_id == request_id
+    assert completed[0].status_code == 200
+    assert completed[0].duration_ms > 0
+
+
+def test_streaming_responses_pass_through():
+    """Streamed bodies are forwarded chunk by chunk"""
+    app, _, completed = make_app()
+    client = TestClient(app)
+
+    with client.stream("GET", "/stream") as response:
+        chunks = list(response.iter_raw())
+
+    assert b"".join(chunks) == b"abc"
+    assert "X-Request-ID" in response.headers
+    assert completed[0].status_code == 200
+
+
+def test_rate_limited_requests_are_rejected_in_pipeline():
+    """Rejections come from the pipeline and still carry pipeline headers"""
+    app, pipeline, completed = make_app()
+    pipeline.rate_limiter = RateLimiter(rate_limit_per_minute=1)
+    client = TestClient(app)
+
+    assert client.get("/items").status_code == 200
+    response = client.get("/items")
+
+    assert response.status_code == 429
+    assert "X-Request-ID" in response.headers
+    assert [c.status_code for c in completed] == [200, 429]
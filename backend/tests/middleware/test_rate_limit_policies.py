@@ -0,0 +1,85 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.auth import create_access_token
+from app.middleware.rate_limit_policies import PolicyTable, RateLimitPolicy
+from app.middleware.rate_limiter import RateLimiter
+
+
+def make_table():
+    return PolicyTable(
+        [
+            RateLimitPolicy(prefix="/api/v1/health", limit=0),
+            RateLimitPolicy(prefix="/api/v1/auth", limit=30),
+            RateLimitPolicy(prefix="/api/v1/auth/login", limit=5, key="ip"),
+        ],
+        default=RateLimitPolicy(prefix="/", limit=60),
+    )
+
+
+def test_longest_prefix_wins():
+    """The most specific matching prefix decides the policy"""
+    table = make_table()
+
+    assert table.match("/api/v1/auth/login").limit == 5
+    assert table.match("/api/v1/auth/login/json").limit == 5
+    assert table.match("/api/v1/auth/me").limit == 30
+    assert table.match("/api/v1/health/").exempt
+    assert table.match("/").limit == 60
+    assert table.match("/api/v1/items").limit == 60
+
+
+def test_prefixes_match_whole_segments():
+    """A prefix does not match a longer segment that merely starts with it"""
+    table = make_table()
+
+    assert table.match("/api/v1/healthz").limit == 60
+
+
+def test_policies_have_separate_budgets():
+    """Each route policy limits callers independently"""
+    app = FastAPI()
+
+    @app.get("/api/v1/auth/login")
+    def login():
+        return {}
+
+    @app.get("/api/v1/items")
+    def items():
+        return {}
+
+    app.add_middleware(
+        RateLimiter,
+        rate_limit_per_minute=60,
+        policies=[{"prefix": "/api/v1/auth/login", "limit": 2, "key": "ip"}],
+    )
+    client = TestClient(app)
+
+    assert client.get("/api/v1/auth/login").status_code == 200
+    assert client.get("/api/v1/auth/login").status_code == 200
+    response = client.get("/api/v1/auth/login")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+    assert client.get("/api/v1/items").status_code == 200
+
+
+def test_jwt_subject_key():
+    """Policies keyed by JWT subject give each user their own budget"""
+    app = FastAPI()
+
+    @app.get("/api/v1/reports")
+    def reports():
+        return {}
+
+    app.add_middleware(
+        RateLimiter,
+        policies=[{"prefix": "/api/v1/reports", "limit": 1, "key": "jwt_sub"}],
+    )
+    client = TestClient(app)
+    alice = {"Authorization": f"Bearer {create_access_token(subject='1')}"}
+    bob = {"Authorization": f"Bearer {create_access_token(subject='2')}"}
+
+    assert client.get("/api/v1/reports", headers=alice).status_code == 200
+    assert client.get("/api/v1/reports", headers=alice).status_code == 429
+    assert client.get("/api/v1/reports", headers=bob).status_code == 200
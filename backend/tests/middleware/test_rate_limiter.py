@@ -0,0 +1,60 @@
+from app.middleware.limiter_store import MemoryLimiterStore
+from app.middleware.rate_limit_policies import RateLimitPolicy
+
+
+def gcra(limit, max_clients=100_000):
+    """A fresh in-process store and a GCRA step at a per-minute policy's rate"""
+    store = MemoryLimiterStore(max_clients=max_clients)
+    policy = RateLimitPolicy(prefix="/", limit=limit)
+
+    def hit(client_id, now):
+        return store.gcra(client_id, policy.emission_interval, policy.delay_tolerance, now)
+
+    return store, hit
+
+
+def test_allows_burst_then_limits():
+    """A client may use its full burst before being limited"""
+    _, hit = gcra(60)
+
+    for _ in range(60):
+        assert hit("client", now=100.0) == (False, 0)
+
+    is_rate_limited, retry_after = hit("client", now=100.0)
+    assert is_rate_limited
+    assert retry_after == 1
+
+    # One emission interval later a single request is allowed again
+    assert hit("client", now=101.0) == (False, 0)
+    assert hit("client", now=101.0)[0]
+
+
+def test_clients_are_independent():
+    """Limiting one client does not affect another"""
+    _, hit = gcra(2)
+
+    assert not hit("a", now=0.0)[0]
+    assert not hit("a", now=0.0)[0]
+    assert hit("a", now=0.0)[0]
+    assert not hit("b", now=0.0)[0]
+
+
+def test_idle_clients_are_evicted():
+    """Clients whose state has fully decayed are dropped"""
+    store, hit = gcra(60)
+
+    hit("idle", now=0.0)
+    assert len(store) == 1
+
+    hit("active", now=10.0)
+    assert len(store) == 1
+
+
+def test_tracked_clients_are_capped():
+    """The number of tracked clients never exceeds max_clients"""
+    store, hit = gcra(60, max_clients=100)
+
+    for i in range(1000):
+        hit(f"client-{i}", now=0.0)
+
+    assert len(store) == 100
@@ -0,0 +1,98 @@
+import asyncio
+
+import fakeredis
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core.singleflight import SingleFlight
+from app.middleware.cache import CacheMiddleware, LRUCacheTier, RedisCacheTier, ResponseCache
+
+
+def make_app(cache):
+    app = FastAPI()
+    calls = {"count": 0}
+
+    @app.get("/popular")
+    async def popular():
+        calls["count"] += 1
+        await asyncio.sleep(0.05)
+        return {"items": [1, 2, 3]}
+
+    app.add_middleware(CacheMiddleware, ttl=60, rules=[], cache=cache)
+    return app, calls
+
+
+async def fire(app, path, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(path) for _ in range(requests)))
+
+
+def test_concurrent_misses_run_handler_once():
+    """500 concurrent identical requests on a cold key run the handler once"""
+    app, calls = make_app(ResponseCache(LRUCacheTier(1024 * 1024)))
+
+    responses = asyncio.run(fire(app, "/popular", 500))
+
+    assert calls["count"] == 1
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json() == {"items": [1, 2, 3]} for r in responses)
+    assert sum(r.headers["X-Cache"] == "MISS" for r in responses) == 1
+
+
+def test_workers_coordinate_through_shared_tier():
+    """Two workers sharing a Redis tier fill a cold key once between them"""
+    server = fakeredis.FakeServer()
+
+    def worker():
+        return make_app(ResponseCache(
+            LRUCacheTier(1024 * 1024),
+            RedisCacheTier(fakeredis.FakeAsyncRedis(server=server), timeout=1.0),
+        ))
+
+    (app_a, calls_a), (app_b, calls_b) = worker(), worker()
+
+    async def run():
+        return await asyncio.gather(fire(app_a, "/popular", 50), fire(app_b, "/popular", 50))
+
+    responses_a, responses_b = asyncio.run(run())
+
+    assert calls_a["count"] + calls_b["count"] == 1
+    assert all(r.status_code == 200 for r in responses_a + responses_b)
+
+
+def test_waiters_share_errors():
+    """An exception in the computation is raised to every waiter"""
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            *(flights.do("key", failing) for _ in range(10)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(flights) == 0
+
+
+def test_waiters_time_out_without_cancelling_leader():
+    """A waiter's timeout does not cancel the running computation"""
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def run():
+        leader = asyncio.create_task(flights.do("key", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do("key", slow, timeout=0.01)
+        return await leader
+
+    assert asyncio.run(run()) == ("done", False)
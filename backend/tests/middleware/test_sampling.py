@@ -0,0 +1,84 @@
+import random
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.middleware.pipeline import RequestContext, get_request_pipeline
+from app.middleware.sampling import TailSampler, setup_sampling
+
+
+def make_context(path="/api/v1/items", status_code=200, duration_ms=5.0, error=None):
+    return RequestContext(
+        request_id="id", method="GET", path=path, scope={}, status_code=status_code,
+        duration_ms=duration_ms, error=error, route=path,
+    )
+
+
+def test_errors_and_rejections_are_always_kept():
+    """Failures are kept at full weight whatever the sampling rate"""
+    sampler = TailSampler(rate=0.0)
+
+    assert sampler.decide(make_context(status_code=500)) == 1.0
+    assert sampler.decide(make_context(status_code=429)) == 1.0
+    assert sampler.decide(make_context(error=RuntimeError("boom"))) == 1.0
+    assert sampler.decide(make_context(status_code=200)) is None
+    assert sampler.decide(make_context(status_code=404)) is None
+
+
+def test_rest_is_kept_at_rate_with_weight():
+    """Ordinary requests are kept at the configured rate and weighted by 1 / rate"""
+    sampler = TailSampler(rate=0.25, rng=random.Random(7))
+
+    weights = [sampler.decide(make_context()) for _ in range(4000)]
+    kept = [weight for weight in weights if weight is not None]
+
+    assert 850 < len(kept) < 1150
+    assert set(kept) == {4.0}
+    # Re-scaled counts estimate the real request count
+    assert 3400 < sum(kept) < 4600
+
+
+def test_per_route_overrides():
+    """The longest matching rule prefix sets the rate"""
+    sampler = TailSampler(
+        rate=0.0,
+        rules=[{"prefix": "/api/v1/auth", "rate": 1.0}, {"prefix": "/api/v1/health", "rate": 0.0}],
+    )
+
+    assert sampler.decide(make_context(path="/api/v1/auth/login")) == 1.0
+    assert sampler.decide(make_context(path="/api/v1/health/")) is None
+    assert sampler.decide(make_context(path="/api/v1/items")) is None
+
+
+def test_requests_above_latency_percentile_are_kept():
+    """Once a route has enough samples, its slowest requests are always kept"""
+    sampler = TailSampler(rate=0.0, latency_percentile=95)
+    for i in range(1024):
+        sampler.decide(make_context(duration_ms=float(i % 100)))
+
+    assert sampler.decide(make_context(duration_ms=99.0)) == 1.0
+    assert sampler.decide(make_context(duration_ms=50.0)) is None
+    # Other routes have their own threshold
+    assert sampler.decide(make_context(path="/api/v1/other", duration_ms=99.0)) is None
+
+
+def test_pipeline_marks_dropped_requests():
+    """Response hooks see sample_weight None for requests that were not kept"""
+    app = FastAPI()
+    completed = []
+    get_request_pipeline(app).on_response.append(completed.append)
+    setup_sampling(app, rules=[{"prefix": "/ok", "rate": 0.0}])
+
+    @app.get("/ok")
+    def ok():
+        return {"ok": True}
+
+    @app.get("/fail")
+    def fail():
+        raise HTTPException(status_code=503)
+
+    client = TestClient(app)
+    client.get("/ok")
+    client.get("/fail")
+
+    assert [(c.route, c.sample_weight) for c in completed] == [("/ok", None), ("/fail", 1.0)]
@@ -1,41 +1,62 @@
 /**
  * API endpoint for receiving analytics events from the client
  * Only processes events when user has given consent
+ *
+ * Accepts one event or an array of events and forwards them to the backend
+ * as one NDJSON batch (POST /api/v1/analytics/events:batch)
  */
 export default defineEventHandler(async (event) => {
   try {
     // Get request body
     const body = await readBody(event);
-    
+    const events = Array.isArray(body) ? body : [body];
+
     // Basic validation
-    if (!body || !body.type || !body.sessionId || !body.timestamp) {
+    if (!events.length || events.some(item => !item || !item.type || !item.sessionId || !item.timestamp)) {
       throw createError({
-        statusCode: 400, 
+        statusCode: 400,
         statusMessage: 'Invalid analytics event data'
       });
     }
-    
+
     // Log analytics event to server console in development
     if (process.env.NODE_ENV === 'development') {
-      console.log('[Analytics]', body.type, JSON.stringify(body));
+      events.forEach(item => console.log('[Analytics]', item.type, JSON.stringify(item)));
     }
-    
-    // In production, you would:
-    // 1. Save the analytics event to a database
-    // 2. Forward to analytics services if needed
-    // 3. Process for real-time dashboards
-    
-    // For this implementation, we'll just log it
-    // TODO: Add database storage when analytics DB is set up
-    
-    return { 
+
+    // One line per event in the backend's AnalyticsEventCreate shape
+    const ndjson = events
+      .map(({ type, timestamp, ...data }) => JSON.stringify({
+        event_type: type,
+        timestamp,
+        event_data: data
+      }))
+      .join('\n');
+
+    const { backendUrl } = useRuntimeConfig();
+    const result = await $fetch(`${backendUrl}/api/v1/analytics/events:batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/x-ndjson' },
+      body: ndjson
+    });
+
+    if (result.rejected && process.env.NODE_ENV === 'development') {
+      console.warn('[Analytics] rejected events', result.errors);
+    }
+
+    return {
       success: true,
-      message: 'Analytics event received'
+      message: 'Analytics event received',
+      accepted: result.accepted,
+      rejected: result.rejected
     };
   } catch (error) {
+    if (error.statusCode === 400) {
+      throw error;
+    }
     console.error('Analytics event error:', error);
     throw createError({
-      statusCode: 500, 
+      statusCode: 500,
       statusMessage: 'Failed to process analytics event'
     });
   }